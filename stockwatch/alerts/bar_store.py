@@ -0,0 +1,306 @@
+# alerts/bar_store.py
+
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .cache import INTERVAL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+OHLCV_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+# yfinance periods ordered by how much history they cover
+PERIOD_RANK = ['1d', '5d', '1mo', '3mo', '6mo', 'ytd', '1y', '2y', '5y', '10y', 'max']
+
+PERIOD_OFFSETS = {
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10),
+}
+
+
+def period_rank(period):
+    return PERIOD_RANK.index(period) if period in PERIOD_RANK else len(PERIOD_RANK)
+
+
+def slice_period(frame, period):
+    """
+    Returns the tail of `frame` covering a yfinance `period`, anchored on the last bar.
+
+    Day periods count trading sessions like yfinance does ('1d' is the latest session), longer periods are
+    calendar offsets.
+    """
+    if frame.empty or period == 'max':
+        return frame
+    last = frame.index[-1]
+    if period.endswith('d') and period[:-1].isdigit():
+        sessions = frame.index.normalize().unique()
+        return frame[frame.index >= sessions[-int(period[:-1]):][0]]
+    if period == 'ytd':
+        return frame[frame.index >= last.normalize().replace(month=1, day=1)]
+    offset = PERIOD_OFFSETS.get(period)
+    if offset is None:
+        return frame
+    return frame[frame.index > last - offset]
+
+
+class BarStore:
+    """
+    Append-only on-disk OHLCV history per (symbol, interval).
+
+    Each series is two raw files read through np.memmap: int64 UTC nanosecond timestamps and an (n, 5)
+    float64 OHLCV matrix, plus a small JSON metadata file. Refreshes only download bars newer than the
+    last stored one and append them, re-writing the last stored bar since it may have been in progress.
+
+    A refreshed series is only served while its last bar is less than `stale_after_bars` bars old. Alerts
+    on closed markets are deferred before any fetch (alerts.calendars), so a refresh that brings no recent
+    bar means the provider failed, not that nothing traded.
+
+    Args:
+        root (str): Directory of the series files.
+        max_bars (int): Bars kept per (symbol, interval).
+        stale_after_bars (int): Age in bars after which a series that could not be refreshed is not served.
+        now (callable): now() -> tz-aware Timestamp, the current time by default.
+    """
+
+    def __init__(self, root, max_bars=200000, stale_after_bars=3, now=None):
+        self.root = root
+        self.max_bars = max_bars
+        self.stale_after_bars = stale_after_bars
+        self._now = now or (lambda: pd.Timestamp.now(tz='UTC'))
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _paths(self, symbol, interval):
+        directory = os.path.join(self.root, interval)
+        base = os.path.join(directory, symbol.replace('/', '_'))
+        return directory, f"{base}.ts", f"{base}.ohlcv", f"{base}.json", f"{base}.lock"
+
+    @contextmanager
+    def _series_lock(self, symbol, interval):
+        # Thread lock for this process, flock for the other worker processes sharing the store
+        with self._locks_guard:
+            lock = self._locks.setdefault((symbol, interval), threading.Lock())
+        directory, _, _, _, lock_path = self._paths(symbol, interval)
+        os.makedirs(directory, exist_ok=True)
+        with lock, open(lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self, meta_path):
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_arrays(self, ts_path, ohlcv_path):
+        """Memory-maps the stored series, ignoring a trailing partial row left by an interrupted write."""
+        try:
+            ts_rows = os.path.getsize(ts_path) // 8
+            ohlcv_rows = os.path.getsize(ohlcv_path) // (8 * len(OHLCV_FIELDS))
+        except OSError:
+            return None, None
+        rows = min(ts_rows, ohlcv_rows)
+        if rows == 0:
+            return None, None
+        ts = np.memmap(ts_path, dtype=np.int64, mode='r', shape=(rows,))
+        values = np.memmap(ohlcv_path, dtype=np.float64, mode='r', shape=(rows, len(OHLCV_FIELDS)))
+        return ts, values
+
+    def read(self, symbol, interval):
+        """Returns the stored series as a DataFrame in the exchange timezone, or an empty DataFrame."""
+        _, ts_path, ohlcv_path, meta_path, _ = self._paths(symbol, interval)
+        meta = self._read_meta(meta_path)
+        ts, values = self._read_arrays(ts_path, ohlcv_path)
+        if meta is None or ts is None:
+            return pd.DataFrame()
+        index = pd.DatetimeIndex(np.asarray(ts).astype('datetime64[ns]'), tz='UTC').tz_convert(meta['tz'])
+        return pd.DataFrame(np.array(values), index=index, columns=OHLCV_FIELDS)
+
+    def last_timestamp(self, symbol, interval):
+        _, ts_path, ohlcv_path, _, _ = self._paths(symbol, interval)
+        ts, _ = self._read_arrays(ts_path, ohlcv_path)
+        if ts is None:
+            return None
+        return pd.Timestamp(int(ts[-1]), unit='ns', tz='UTC')
+
+    def _to_arrays(self, frame):
+        index = frame.index
+        if index.tz is None:
+            index = index.tz_localize('UTC')
+        ts = index.tz_convert('UTC').as_unit('ns').asi8.astype(np.int64)
+        values = frame.reindex(columns=OHLCV_FIELDS).to_numpy(dtype=np.float64)
+        return ts, np.ascontiguousarray(values)
+
+    def write(self, symbol, interval, frame, period):
+        """Replaces the stored series with `frame`, recording the period it was fetched for."""
+        _, ts_path, ohlcv_path, meta_path, _ = self._paths(symbol, interval)
+        ts, values = self._to_arrays(frame)
+        with open(ts_path, 'wb') as f:
+            f.write(ts.tobytes())
+        with open(ohlcv_path, 'wb') as f:
+            f.write(values.tobytes())
+        tz = str(frame.index.tz) if frame.index.tz is not None else 'UTC'
+        with open(meta_path, 'w') as f:
+            json.dump({'tz': tz, 'period': period}, f)
+
+    def append(self, symbol, interval, frame):
+        """
+        Appends bars from `frame` that are at or after the last stored bar.
+
+        Returns:
+            int: Number of rows written.
+        """
+        _, ts_path, ohlcv_path, _, _ = self._paths(symbol, interval)
+        ts, values = self._to_arrays(frame)
+        stored_ts, _ = self._read_arrays(ts_path, ohlcv_path)
+        rows = 0 if stored_ts is None else len(stored_ts)
+
+        if rows:
+            last = int(stored_ts[-1])
+            keep = ts >= last
+            ts, values = ts[keep], values[keep]
+            if len(ts) == 0:
+                return 0
+            # Drop stored rows the new frame supersedes (normally just the in-progress last bar)
+            rows = int(np.searchsorted(np.asarray(stored_ts), ts[0], side='left'))
+            del stored_ts
+
+        with open(ts_path, 'r+b' if os.path.exists(ts_path) else 'wb') as f:
+            f.truncate(rows * 8)
+            f.seek(0, os.SEEK_END)
+            f.write(ts.tobytes())
+        with open(ohlcv_path, 'r+b' if os.path.exists(ohlcv_path) else 'wb') as f:
+            f.truncate(rows * 8 * len(OHLCV_FIELDS))
+            f.seek(0, os.SEEK_END)
+            f.write(values.tobytes())
+        return len(ts)
+
+    def _compact(self, symbol, interval, meta):
+        """Trims the series to the newest `max_bars` bars once it outgrows the cap."""
+        _, ts_path, _, _, _ = self._paths(symbol, interval)
+        if os.path.getsize(ts_path) // 8 <= self.max_bars:
+            return
+        stored = self.read(symbol, interval)
+        self.write(symbol, interval, stored.iloc[-self.max_bars:], meta['period'])
+
+    def is_stale(self, last, interval):
+        """Whether a series whose last bar opened at `last` is `stale_after_bars` bars behind."""
+        bar = pd.Timedelta(seconds=INTERVAL_SECONDS.get(interval, 60))
+        return self._now() - last > bar * self.stale_after_bars
+
+    def load(self, symbol, interval, period, fetch):
+        """
+        Refreshes the series incrementally and returns the slice covering `period`.
+
+        Args:
+            symbol (str): Ticker symbol.
+            interval (str): yfinance interval.
+            period (str): yfinance period to return.
+            fetch (callable): fetch(symbol, interval, period=None, start=None) -> DataFrame of new bars.
+
+        Returns:
+            pd.DataFrame: OHLCV bars with lower-cased columns, empty if nothing could be fetched or the stored
+                series is stale.
+        """
+        def fetch_many(symbols, interval, period=None, start=None):
+            return {symbol: fetch(symbol, interval, period=period, start=start) for symbol in symbols}
+
+        return self.load_many([symbol], interval, period, fetch_many)[symbol]
+
+    def load_many(self, symbols, interval, period, fetch_many):
+        """
+        Same as load() for many symbols of one interval, with at most two downloads: one for the symbols that
+        need their full `period`, one for the bars newer than the oldest last stored bar of the others.
+
+        Args:
+            symbols (iterable): Ticker symbols.
+            interval (str): yfinance interval.
+            period (str): yfinance period to return.
+            fetch_many (callable): fetch_many(symbols, interval, period=None, start=None) -> dict of
+                symbol -> DataFrame of new bars, leaving out symbols without any.
+
+        Returns:
+            dict: symbol -> OHLCV bars, empty for symbols nothing could be fetched for or whose stored series
+                is stale.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        with ExitStack() as locks:
+            # Always taken in the same order, so two batches sharing symbols cannot deadlock
+            for symbol in sorted(symbols):
+                locks.enter_context(self._series_lock(symbol, interval))
+
+            full, incremental = [], {}
+            for symbol in symbols:
+                _, _, _, meta_path, _ = self._paths(symbol, interval)
+                meta = self._read_meta(meta_path)
+                last = self.last_timestamp(symbol, interval)
+                if meta is None or last is None or period_rank(period) > period_rank(meta.get('period')):
+                    # Nothing stored yet, or the request reaches further back than we ever fetched
+                    full.append(symbol)
+                else:
+                    incremental[symbol] = (last, meta)
+
+            loaded = set()
+            if full:
+                for symbol, frame in fetch_many(full, interval, period=period).items():
+                    if symbol in full and not frame.empty:
+                        self.write(symbol, interval, frame, period)
+                        loaded.add(symbol)
+            if incremental:
+                start = min(last for last, _ in incremental.values())
+                fetched = fetch_many(list(incremental), interval, start=start)
+                for symbol, (_, meta) in incremental.items():
+                    frame = fetched.get(symbol)
+                    if frame is not None and not frame.empty:
+                        appended = self.append(symbol, interval, frame)
+                        logger.debug(f"Appended {appended} bars to {symbol} {interval}")
+                        self._compact(symbol, interval, meta)
+                    last = self.last_timestamp(symbol, interval)
+                    if self.is_stale(last, interval):
+                        # Served as fresh, the old bars would be cached and evaluated as current
+                        logger.warning(f"No bars for {symbol} {interval} since {last}, not serving the stale series")
+                        continue
+                    loaded.add(symbol)
+
+            return {
+                symbol: slice_period(self.read(symbol, interval), period) if symbol in loaded else pd.DataFrame()
+                for symbol in symbols
+            }
+
+
+_bar_store = None
+_bar_store_lock = threading.Lock()
+
+
+def get_bar_store():
+    """Returns the process-wide BarStore, or None when BAR_STORE_ENABLED is off."""
+    global _bar_store
+    if not getattr(settings, 'BAR_STORE_ENABLED', False):
+        return None
+    if _bar_store is None:
+        with _bar_store_lock:
+            if _bar_store is None:
+                _bar_store = BarStore(
+                    root=settings.BAR_STORE_ROOT,
+                    max_bars=getattr(settings, 'BAR_STORE_MAX_BARS', 200000),
+                    stale_after_bars=getattr(settings, 'BAR_STORE_STALE_AFTER_BARS', 3),
+                )
+    return _bar_store
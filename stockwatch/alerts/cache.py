@@ -0,0 +1,243 @@
+# alerts/cache.py
+
+import json
+import logging
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Bar length in seconds for each yfinance interval
+INTERVAL_SECONDS = {
+    '1m': 60,
+    '2m': 120,
+    '5m': 300,
+    '15m': 900,
+    '30m': 1800,
+    '60m': 3600,
+    '90m': 5400,
+    '1h': 3600,
+    '240m': 14400,
+    '1d': 86400,
+    '5d': 432000,
+    '1wk': 604800,
+    '1mo': 2592000,
+    '3mo': 7776000,
+}
+
+
+def interval_ttl(interval, now=None, max_ttl=None):
+    """
+    Returns how many seconds bars of `interval` stay valid: until the next bar boundary.
+
+    The in-progress bar of coarse intervals keeps changing until it closes, so the TTL is capped at
+    `max_ttl` (BAR_CACHE_MAX_TTL by default) to keep e.g. daily closes fresh during the session.
+    """
+    now = time.time() if now is None else now
+    max_ttl = getattr(settings, 'BAR_CACHE_MAX_TTL', 60) if max_ttl is None else max_ttl
+    bar_seconds = INTERVAL_SECONDS.get(interval, 60)
+    until_boundary = bar_seconds - (now % bar_seconds)
+    return max(1, min(int(until_boundary), max_ttl))
+
+
+def frame_size(frame):
+    try:
+        return int(frame.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+# First byte of every frame stored in Redis, bumped when the encoding changes
+FRAME_FORMAT = 1
+
+
+def encode_frame(frame):
+    """
+    Serializes a frame with a DatetimeIndex and numeric columns for Redis: a JSON header (timezone, columns,
+    dtypes) followed by the raw int64 UTC nanosecond timestamps and a float64 value matrix. Unlike pickle,
+    decoding cannot run code.
+
+    Returns:
+        bytes: The payload, or None for frames the format cannot hold.
+    """
+    index = frame.index
+    if not isinstance(index, pd.DatetimeIndex) or not all(
+            pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype) for dtype in frame.dtypes):
+        return None
+    header = json.dumps({
+        'tz': str(index.tz) if index.tz is not None else None,
+        'name': index.name,
+        'unit': index.unit,
+        'columns': [str(column) for column in frame.columns],
+        'dtypes': [str(dtype) for dtype in frame.dtypes],
+    }).encode()
+    utc = index.tz_convert('UTC') if index.tz is not None else index
+    ts = utc.as_unit('ns').asi8.astype('<i8')
+    values = np.ascontiguousarray(frame.to_numpy(dtype='<f8'))
+    return struct.pack('<BII', FRAME_FORMAT, len(header), len(frame)) + header + ts.tobytes() + values.tobytes()
+
+
+def decode_frame(payload):
+    """Rebuilds a frame serialized by encode_frame(). Raises ValueError on payloads of another format."""
+    version, header_size, rows = struct.unpack_from('<BII', payload)
+    if version != FRAME_FORMAT:
+        raise ValueError(f"Unknown bar cache frame format {version}")
+    offset = struct.calcsize('<BII')
+    header = json.loads(payload[offset:offset + header_size])
+    offset += header_size
+    ts = np.frombuffer(payload, dtype='<i8', count=rows, offset=offset)
+    offset += ts.nbytes
+    values = np.frombuffer(payload, dtype='<f8', count=rows * len(header['columns']), offset=offset)
+
+    index = pd.DatetimeIndex(ts.astype('datetime64[ns]'), name=header['name']).as_unit(header['unit'])
+    if header['tz'] is not None:
+        index = index.tz_localize('UTC').tz_convert(header['tz'])
+    frame = pd.DataFrame(values.reshape(rows, len(header['columns'])).copy(), index=index,
+                         columns=header['columns'])
+    return frame.astype(dict(zip(header['columns'], header['dtypes'])))
+
+
+class BarCache:
+    """
+    Process-wide OHLCV cache keyed by (symbol, interval, period), optionally backed by Redis.
+
+    Lookups try the local LRU first, then Redis, so the web and worker containers share fetched bars.
+    Frames are stored in Redis with encode_frame(). Cached frames are shared between callers and must be
+    treated as read-only.
+
+    Args:
+        max_bytes (int): Memory cap of the local LRU.
+        redis_url (str): Redis backing the LRU, none if omitted.
+        key_prefix (str): Prefix of the Redis keys.
+        timeout (float): Connect and read timeout of Redis calls in seconds.
+        client (redis.Redis): Client to use instead of connecting to `redis_url`.
+    """
+
+    def __init__(self, max_bytes, redis_url=None, key_prefix='stockwatch:bars', timeout=None, client=None):
+        self.max_bytes = max_bytes
+        self.key_prefix = key_prefix
+        self._entries = OrderedDict()  # key -> (expires_at, frame, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._redis = client
+        if client is None and redis_url:
+            self._redis = redis.Redis.from_url(redis_url, socket_connect_timeout=timeout, socket_timeout=timeout)
+
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+        self.evictions = 0
+
+    def _redis_key(self, key):
+        return f"{self.key_prefix}:{':'.join(key)}"
+
+    def get(self, symbol, interval, period):
+        key = (symbol, interval, period)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, frame, size = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return frame
+                self._remove(key)
+
+        if self._redis is not None:
+            try:
+                payload = self._redis.get(self._redis_key(key))
+                if payload is not None:
+                    frame = decode_frame(payload)
+                    ttl = self._redis.ttl(self._redis_key(key))
+                    self._store(key, frame, max(ttl, 1), now)
+                    with self._lock:
+                        self.hits += 1
+                        self.redis_hits += 1
+                    return frame
+            except (redis.RedisError, ValueError, struct.error) as e:
+                logger.warning(f"Bar cache Redis lookup failed for {key}: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def contains(self, symbol, interval, period):
+        """Whether the local LRU holds a current frame for the key. Redis is not consulted."""
+        with self._lock:
+            entry = self._entries.get((symbol, interval, period))
+            return entry is not None and entry[0] > time.time()
+
+    def set(self, symbol, interval, period, frame, ttl=None):
+        key = (symbol, interval, period)
+        ttl = interval_ttl(interval) if ttl is None else ttl
+        self._store(key, frame, ttl, time.time())
+
+        payload = encode_frame(frame) if self._redis is not None else None
+        if payload is not None:
+            try:
+                self._redis.setex(self._redis_key(key), ttl, payload)
+            except redis.RedisError as e:
+                logger.warning(f"Bar cache Redis store failed for {key}: {e}")
+
+    def _store(self, key, frame, ttl, now):
+        size = frame_size(frame)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (now + ttl, frame, size)
+            self._bytes += size
+            # Evict least recently used entries until we are back under the memory cap
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'redis_hits': self.redis_hits,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+
+_bar_cache = None
+_bar_cache_lock = threading.Lock()
+
+
+def get_bar_cache():
+    """Returns the process-wide BarCache, built from settings on first use."""
+    global _bar_cache
+    if _bar_cache is None:
+        with _bar_cache_lock:
+            if _bar_cache is None:
+                _bar_cache = BarCache(
+                    max_bytes=getattr(settings, 'BAR_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+                    redis_url=getattr(settings, 'BAR_CACHE_REDIS_URL', None),
+                    timeout=getattr(settings, 'BAR_CACHE_REDIS_TIMEOUT', 0.5),
+                )
+    return _bar_cache
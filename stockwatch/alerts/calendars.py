@@ -0,0 +1,196 @@
+# alerts/calendars.py
+
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+
+# Days searched for the next session; longer than any run of weekends and holidays
+MAX_CLOSED_DAYS = 14
+
+MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY, SATURDAY, SUNDAY = range(7)
+SUNDAY_TO_THURSDAY = (SUNDAY, MONDAY, TUESDAY, WEDNESDAY, THURSDAY)
+
+
+def nth_weekday(year, month, weekday, n):
+    """Date of the `n`th `weekday` of the month, counting from the end for negative `n`."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7 + 7 * (-n - 1))
+
+
+def easter_sunday(year):
+    """Gregorian Easter (anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    return date(year, month, (h + l - 7 * m + 33 * month + 19) % 32)
+
+
+def observed(day):
+    """Weekday a fixed-date holiday is observed on: Friday before a Saturday, Monday after a Sunday."""
+    if day.weekday() == SATURDAY:
+        return day - timedelta(days=1)
+    if day.weekday() == SUNDAY:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year):
+    """Full-day closures of the US equity markets (NYSE rules) in `year`."""
+    holidays = {
+        nth_weekday(year, 1, MONDAY, 3),  # Martin Luther King Jr. Day
+        nth_weekday(year, 2, MONDAY, 3),  # Washington's Birthday
+        easter_sunday(year) - timedelta(days=2),  # Good Friday
+        nth_weekday(year, 5, MONDAY, -1),  # Memorial Day
+        observed(date(year, 7, 4)),  # Independence Day
+        nth_weekday(year, 9, MONDAY, 1),  # Labor Day
+        nth_weekday(year, 11, THURSDAY, 4),  # Thanksgiving
+        observed(date(year, 12, 25)),  # Christmas
+    }
+    # New Year's Day falling on a Saturday is not observed on the Friday before
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != SATURDAY:
+        holidays.add(observed(new_year))
+    if year >= 2022:
+        holidays.add(observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holidays)
+
+
+@lru_cache(maxsize=None)
+def nyse_early_closes(year):
+    """Days the US equity markets close at 13:00 in `year`."""
+    candidates = {
+        date(year, 7, 3),  # Before Independence Day
+        nth_weekday(year, 11, THURSDAY, 4) + timedelta(days=1),  # Day after Thanksgiving
+        date(year, 12, 24),  # Christmas Eve
+    }
+    holidays = nyse_holidays(year)
+    # July 3rd is a regular session when the holiday is observed on Monday the 5th
+    if date(year, 7, 4).weekday() == SUNDAY:
+        candidates.discard(date(year, 7, 3))
+    return frozenset(day for day in candidates if day.weekday() < SATURDAY and day not in holidays)
+
+
+class TradingCalendar:
+    """
+    When a market trades, as sessions in its own timezone.
+
+    A session opens at `open_time` on each of `weekdays` that is not a holiday, and closes at `close_time`
+    (`early_close_time` on early-close days). A close at or before the open falls on the next day, which
+    covers markets trading overnight.
+
+    Args:
+        name (str): Name shown in logs.
+        timezone (str): IANA timezone of the session times.
+        open_time (time): Local time sessions open at.
+        close_time (time): Local time sessions close at.
+        weekdays (iterable): Days sessions open on, 0 for Monday.
+        holidays (callable): holidays(year) -> dates without a session.
+        early_closes (callable): early_closes(year) -> dates closing at `early_close_time`.
+        early_close_time (time): Local close of early-close days.
+    """
+
+    def __init__(self, name, timezone, open_time, close_time, weekdays=range(MONDAY, SATURDAY), holidays=None,
+                 early_closes=None, early_close_time=None):
+        self.name = name
+        self.timezone = ZoneInfo(timezone)
+        self.open_time = open_time
+        self.close_time = close_time
+        self.weekdays = frozenset(weekdays)
+        self.holidays = holidays or (lambda year: frozenset())
+        self.early_closes = early_closes or (lambda year: frozenset())
+        self.early_close_time = early_close_time
+
+    def __repr__(self):
+        return f"TradingCalendar({self.name!r})"
+
+    def session(self, day):
+        """Returns the (open, close) of the session opening on local date `day`, or None."""
+        if day.weekday() not in self.weekdays or day in self.holidays(day.year):
+            return None
+        close_time = self.close_time
+        if self.early_close_time is not None and day in self.early_closes(day.year):
+            close_time = self.early_close_time
+        close_day = day + timedelta(days=1) if close_time <= self.open_time else day
+        return (datetime.combine(day, self.open_time, self.timezone),
+                datetime.combine(close_day, close_time, self.timezone))
+
+    def _sessions_from(self, moment):
+        """Sessions that close after `moment`, in order, starting with one opened the day before."""
+        day = moment.astimezone(self.timezone).date() - timedelta(days=1)
+        for offset in range(MAX_CLOSED_DAYS + 2):
+            session = self.session(day + timedelta(days=offset))
+            if session is not None and session[1] > moment:
+                yield session
+
+    def is_open(self, moment):
+        """Whether the market trades at tz-aware `moment`."""
+        for open_, close in self._sessions_from(moment):
+            return open_ <= moment < close
+        return False
+
+    def next_open(self, moment):
+        """Returns `moment` if the market is open then, else when its next session opens."""
+        for open_, close in self._sessions_from(moment):
+            return max(open_, moment)
+        raise ValueError(f"{self.name} has no session within {MAX_CLOSED_DAYS} days of {moment}")
+
+
+class AlwaysOpenCalendar(TradingCalendar):
+    """Market trading around the clock, every day (crypto)."""
+
+    def __init__(self, name='24/7'):
+        super().__init__(name, 'UTC', time(0), time(0), weekdays=range(7))
+
+    def is_open(self, moment):
+        return True
+
+    def next_open(self, moment):
+        return moment
+
+
+CALENDARS = {
+    # NYSE/Nasdaq regular hours
+    'XNYS': TradingCalendar(
+        'XNYS', 'America/New_York', time(9, 30), time(16), holidays=nyse_holidays, early_closes=nyse_early_closes,
+        early_close_time=time(13)),
+    # Spot FX trades from Sunday 17:00 to Friday 17:00 New York time
+    'FX': TradingCalendar('FX', 'America/New_York', time(17), time(17), weekdays=SUNDAY_TO_THURSDAY),
+    # CME Globex futures: 18:00 to 17:00 the next day, Sunday to Thursday evenings
+    'CME': TradingCalendar('CME', 'America/New_York', time(18), time(17), weekdays=SUNDAY_TO_THURSDAY),
+    '24/7': AlwaysOpenCalendar(),
+}
+
+# Maps Stock.asset_type values (lower-cased) to CALENDARS; other types trade like US equities
+ASSET_TYPE_CALENDARS = {
+    'stock': 'XNYS',
+    'etf': 'XNYS',
+    'currency pair': 'FX',
+    'commodity': 'CME',
+    'crypto': '24/7',
+}
+
+DEFAULT_CALENDAR = 'XNYS'
+
+
+def get_trading_calendar(asset_type):
+    """
+    Returns the TradingCalendar of a Stock.asset_type.
+
+    With ALERT_MARKET_HOURS_ENABLED off every asset type trades around the clock.
+    """
+    if not getattr(settings, 'ALERT_MARKET_HOURS_ENABLED', True):
+        return CALENDARS['24/7']
+    name = ASSET_TYPE_CALENDARS.get((asset_type or '').strip().lower(), DEFAULT_CALENDAR)
+    return CALENDARS[name]
@@ -0,0 +1,301 @@
+# alerts/chains.py
+
+import operator
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from .bar_store import slice_period
+from .indicators import get_indicator_spec
+from .planner import (
+    estimate_frame_bars,
+    get_chain_conditions,
+    get_chain_data_requirements,
+    get_timeframe_period,
+    get_warmup_bars,
+)
+
+
+# Estimated cost of evaluating a condition, in bar units: a download costs a fixed round trip plus its
+# bars, computing an indicator a fraction of a unit per bar
+FETCH_COST = 2000
+FETCH_COST_PER_BAR = 1.0
+COMPUTE_COST_PER_BAR = 0.05
+
+# IndicatorCondition.condition_operator -> comparison
+CONDITION_OPERATORS = {
+    'GT': operator.gt,
+    'LT': operator.lt,
+    'EQ': operator.eq,
+}
+
+
+def get_indicator_frame(frames, node, requirement):
+    """
+    Returns the bars `node` is computed on: the frame of its timeframe cut to the node's own warm-up period.
+
+    Frames are sized for every chain of a symbol together, so without the cut the value of a recursive or
+    cumulative indicator (EMA, RSI, OBV, ...) would depend on which other chains happen to be due.
+
+    Args:
+        frames (FrameSet): Frames of the current run.
+        node (IndicatorNode): Node to compute.
+        requirement (tuple): (interval, period, base_timeframe) of the node's timeframe.
+    """
+    data = frames.get_timeframe(node.symbol, node.timeframe, requirement)
+    return slice_period(data, node.period) if node.period else data
+
+
+class IndicatorNode:
+    """
+    Last value of one indicator line on one (symbol, timeframe).
+
+    `period` is the yfinance period covering the indicator's warm-up (see get_indicator_frame); None reads
+    the whole frame of the timeframe.
+    """
+
+    def __init__(self, symbol, timeframe, indicator_name, line=None, parameters=None, period=None):
+        spec = get_indicator_spec(indicator_name)
+        params = spec.coerce_parameters(parameters or {})
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.indicator_name = spec.name
+        self.line = spec.resolve_line(line.lower() if line else None)
+        self.parameters = params
+        self.period = period
+        self.key = ('indicator', symbol, timeframe, spec.name, tuple(sorted(params.items())), self.line)
+        self.leaves = (self,)
+
+    def evaluate(self, evaluation):
+        return evaluation.indicator_results.calculate(
+            symbol=self.symbol,
+            timeframe=self.timeframe,
+            indicator_name=self.indicator_name,
+            df=evaluation.get_indicator_frame(self),
+            line=self.line,
+            parameters=self.parameters,
+        )
+
+
+class PriceNode:
+    """Last close of one (symbol, timeframe)."""
+
+    def __init__(self, symbol, timeframe):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.key = ('price', symbol, timeframe)
+        self.leaves = (self,)
+
+    def evaluate(self, evaluation):
+        return float(evaluation.get_frame(self.timeframe)['close'].iloc[-1])
+
+
+class NumberNode:
+    def __init__(self, value):
+        self.value = value
+        self.key = ('number', value)
+        self.leaves = ()
+
+    def evaluate(self, evaluation):
+        return self.value
+
+
+class ComparisonNode:
+    """One chain condition: `left` compared to `right` with a CONDITION_OPERATORS operator."""
+
+    def __init__(self, condition_operator, left, right):
+        self.condition_operator = condition_operator
+        self.left = left
+        self.right = right
+        self.key = ('compare', condition_operator, left.key, right.key)
+        self.leaves = left.leaves + right.leaves
+
+    def evaluate(self, evaluation):
+        left, right = evaluation.value(self.left), evaluation.value(self.right)
+        if left is None or right is None:
+            return False
+        return bool(CONDITION_OPERATORS[self.condition_operator](left, right))
+
+
+class ChainProgram:
+    """
+    Indicator chains of one scheduler run compiled into a DAG of unique nodes.
+
+    Conditions are turned into comparison nodes over indicator, price and number nodes. Nodes with the
+    same (symbol, timeframe, indicator, parameters, line) or the same comparison are shared by every
+    chain using them, so each is evaluated at most once per run. Frames are sized per symbol for all of
+    its chains together and fetched once; each indicator node reads the part covering its own warm-up.
+    """
+
+    def __init__(self):
+        self.nodes = {}  # node key -> node
+        self.chains = {}  # alert id -> comparison nodes in chain order, or None if the chain is invalid
+        self.references = 0
+        self.evaluated = 0
+        self._conditions = {}  # symbol -> conditions of its chains
+        self._requirements = {}
+
+    def _intern(self, node):
+        self.references += 1
+        return self.nodes.setdefault(node.key, node)
+
+    def _compile_condition(self, symbol, condition):
+        main = self._intern(IndicatorNode(
+            symbol, condition.indicator_timeframe, condition.indicator.name,
+            condition.indicator_line, condition.indicator_parameters,
+            period=get_timeframe_period(
+                condition.indicator_timeframe, get_warmup_bars(condition.indicator, condition.indicator_parameters))))
+
+        if condition.value_type == 'NUMBER':
+            value = self._intern(NumberNode(condition.value_number))
+        elif condition.value_type == 'PRICE':
+            value = self._intern(PriceNode(symbol, condition.indicator_timeframe))
+        elif condition.value_type == 'INDICATOR_LINE':
+            if not condition.value_indicator:
+                raise ValueError(f"value_indicator is required but not set for condition {condition.id}")
+            value = self._intern(IndicatorNode(
+                symbol, condition.value_timeframe, condition.value_indicator.name,
+                condition.value_indicator_line, condition.value_indicator_parameters,
+                period=get_timeframe_period(condition.value_timeframe, get_warmup_bars(
+                    condition.value_indicator, condition.value_indicator_parameters))))
+        else:
+            raise ValueError(f"Unknown value_type '{condition.value_type}' for condition {condition.id}")
+
+        if condition.condition_operator not in CONDITION_OPERATORS:
+            raise ValueError(
+                f"Unknown condition operator '{condition.condition_operator}' in condition {condition.id}")
+        return self._intern(ComparisonNode(condition.condition_operator, main, value))
+
+    def add(self, alert):
+        """Compiles the chain of an INDICATOR_CHAIN alert. Invalid chains never trigger."""
+        symbol = alert.stock.symbol
+        try:
+            conditions = get_chain_conditions(alert.indicator_chain)
+        except ObjectDoesNotExist:
+            print(f"[DEBUG] No IndicatorChainAlert associated with alert {alert.id}")
+            self.chains[alert.id] = None
+            return
+
+        # Sized like build_evaluation_plan does, so the frames it prefetched are the ones read here
+        self._conditions.setdefault(symbol, []).extend(conditions)
+        self._requirements.pop(symbol, None)
+        try:
+            self.chains[alert.id] = [self._compile_condition(symbol, condition) for condition in conditions]
+        except Exception as e:
+            print(f"[DEBUG] Indicator chain of alert {alert.id} cannot be evaluated: {e}")
+            self.chains[alert.id] = None
+
+    def get_requirements(self, symbol):
+        """Returns timeframe -> (interval, period, base_timeframe) for every chain of `symbol`."""
+        if symbol not in self._requirements:
+            self._requirements[symbol] = get_chain_data_requirements(self._conditions.get(symbol, []))
+        return self._requirements[symbol]
+
+    def indicator_nodes(self):
+        return [node for node in self.nodes.values() if isinstance(node, IndicatorNode)]
+
+    @property
+    def dedup_ratio(self):
+        """Node references made by the chains per unique node; 1.0 means nothing was shared."""
+        return self.references / len(self.nodes) if self.nodes else 1.0
+
+    def stats(self):
+        return {
+            'chains': len(self.chains),
+            'nodes': len(self.nodes),
+            'references': self.references,
+            'dedup_ratio': round(self.dedup_ratio, 2),
+            'evaluated': self.evaluated,
+        }
+
+    def evaluate(self, symbol, alerts, frames, indicator_results):
+        """
+        Evaluates the chains of `alerts`, all on `symbol`.
+
+        Conditions are ANDed, so each chain evaluates its cheapest remaining condition first (see
+        ChainEvaluation.cost) and stops at the first unmet one. Node values are shared between chains and
+        a timeframe's bars are fetched only when a condition needing them is reached.
+
+        Returns:
+            dict: alert id -> whether every condition of its chain is met.
+        """
+        evaluation = ChainEvaluation(self, symbol, frames, indicator_results)
+        results = {}
+        for alert in alerts:
+            comparisons = self.chains.get(alert.id)
+            results[alert.id] = bool(comparisons) and evaluation.all_met(comparisons)
+        self.evaluated += len(evaluation)
+        return results
+
+
+class ChainEvaluation:
+    """Node values of one symbol during one run."""
+
+    def __init__(self, program, symbol, frames, indicator_results):
+        self.program = program
+        self.symbol = symbol
+        self.frames = frames
+        self.indicator_results = indicator_results
+        self._values = {}
+
+    def get_frame(self, timeframe):
+        requirement = self.program.get_requirements(self.symbol)[timeframe]
+        data = self.frames.get_timeframe(self.symbol, timeframe, requirement)
+        if data.empty:
+            raise ValueError(f"No data returned for {self.symbol} with timeframe {timeframe}")
+        return data
+
+    def get_indicator_frame(self, node):
+        requirement = self.program.get_requirements(self.symbol)[node.timeframe]
+        data = get_indicator_frame(self.frames, node, requirement)
+        if data.empty:
+            raise ValueError(f"No data returned for {self.symbol} with timeframe {node.timeframe}")
+        return data
+
+    def frame_cost(self, timeframe):
+        """Cost of getting the bars of `timeframe`: nothing once fetched or cached, else a download."""
+        requirement = self.program.get_requirements(self.symbol).get(timeframe)
+        if requirement is None:
+            return 0
+        interval, period, base_timeframe = requirement
+        if self.frames.is_available(self.symbol, interval, period):
+            return 0
+        return FETCH_COST + FETCH_COST_PER_BAR * estimate_frame_bars(base_timeframe, period)
+
+    def cost(self, node):
+        """Estimated cost of evaluating `node` given the values and frames already at hand."""
+        if node.key in self._values:
+            return 0
+        leaves = [leaf for leaf in node.leaves if leaf.key not in self._values]
+        cost = sum(self.frame_cost(timeframe) for timeframe in {leaf.timeframe for leaf in leaves})
+        for leaf in leaves:
+            if isinstance(leaf, IndicatorNode):
+                requirement = self.program.get_requirements(self.symbol).get(leaf.timeframe)
+                if requirement is not None:
+                    period = leaf.period or requirement[1]
+                    cost += COMPUTE_COST_PER_BAR * estimate_frame_bars(leaf.timeframe, period)
+        return cost
+
+    def all_met(self, comparisons):
+        """Evaluates ANDed comparisons cheapest first, stopping at the first unmet one."""
+        remaining = list(comparisons)
+        while remaining:
+            # Costs change as frames get fetched, so pick again after every condition; ties keep chain order
+            node = min(remaining, key=self.cost)
+            remaining.remove(node)
+            if not self.value(node):
+                return False
+        return True
+
+    def value(self, node):
+        """Returns the node's value, computing it on first use. Failures evaluate to None."""
+        if node.key not in self._values:
+            try:
+                value = node.evaluate(self)
+            except Exception as e:
+                print(f"[DEBUG] Error evaluating {node.key} for {self.symbol}: {e}")
+                value = None
+            self._values[node.key] = value
+        return self._values[node.key]
+
+    def __len__(self):
+        return len(self._values)
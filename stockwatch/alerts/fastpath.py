@@ -0,0 +1,224 @@
+# alerts/fastpath.py
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# NumPy implementations of the most used indicators
+#
+# Each function takes the OHLCV DataFrame and the coerced parameters and returns the last value (or
+# {line: last value}) exactly as pandas_ta 0.3.14b0 computes it, without building the full result.
+# Windowed indicators only read the bars their last window covers; recursive ones reduce the whole
+# series to its last value with one dot product. They return None when the fast path cannot reproduce
+# pandas_ta (missing values in the input), and the registry falls back to pandas_ta.
+# ─────────────────────────────────────────────────────────────────────────────
+# Rows per block of the blocked EMA recurrence (see ema_series)
+EMA_BLOCK_SIZE = 64
+
+
+def _columns(df, *names):
+    arrays = [np.ascontiguousarray(df[name].to_numpy(dtype=np.float64)) for name in names]
+    if any(np.isnan(array).any() for array in arrays):
+        return None
+    return arrays
+
+
+def _decay_weights(decay, count):
+    """decay ** (count - 1), ..., decay ** 0: weights of the last `count` values of an exponential average."""
+    return decay ** np.arange(count - 1, -1, -1, dtype=np.float64)
+
+
+def ema_last(values, length):
+    """
+    Last value of pandas_ta's ema: the SMA of the first `length` values seeds
+    ewm(span=length, adjust=False) over the rest.
+    """
+    if len(values) < length:
+        return np.nan
+    alpha = 2.0 / (length + 1)
+    tail = values[length:]
+    seed = values[:length].mean()
+    return (1 - alpha) ** len(tail) * seed + alpha * (_decay_weights(1 - alpha, len(tail)) @ tail)
+
+
+def ema_series(values, length):
+    """
+    Full pandas_ta ema series, NaN before the seed.
+
+    The recurrence y[t] = (1 - alpha) * y[t - 1] + alpha * x[t] is evaluated EMA_BLOCK_SIZE values at a
+    time: within a block every output is the carried-in value times a power of the decay plus a
+    lower-triangular matrix product with the block's inputs.
+    """
+    result = np.full(len(values), np.nan)
+    if len(values) < length:
+        return result
+    alpha = 2.0 / (length + 1)
+    decay = 1 - alpha
+
+    block = EMA_BLOCK_SIZE
+    powers = decay ** np.arange(block + 1, dtype=np.float64)
+    offsets = np.subtract.outer(np.arange(block), np.arange(block))
+    kernel = np.where(offsets >= 0, alpha * powers[np.clip(offsets, 0, block)], 0.0)
+
+    previous = values[:length].mean()
+    result[length - 1] = previous
+    for start in range(length, len(values), block):
+        chunk = values[start:start + block]
+        size = len(chunk)
+        result[start:start + size] = powers[1:size + 1] * previous + kernel[:size, :size] @ chunk
+        previous = result[start + size - 1]
+    return result
+
+
+def rma_last(values, length):
+    """Last value of ewm(alpha=1/length, min_periods=length).mean() with pandas' default adjust=True."""
+    if len(values) < length:
+        return np.nan
+    weights = _decay_weights(1 - 1.0 / length, len(values))
+    return (weights @ values) / weights.sum()
+
+
+def _rolling_mean(values, length):
+    return sliding_window_view(values, length).mean(axis=-1)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Indicators
+# ─────────────────────────────────────────────────────────────────────────────
+def sma(df, p):
+    columns = _columns(df.iloc[-p['length']:], 'close')
+    if columns is None:
+        return None
+    close, = columns
+    return close.mean() if len(close) >= p['length'] else np.nan
+
+
+def ema(df, p):
+    columns = _columns(df, 'close')
+    return None if columns is None else ema_last(columns[0], p['length'])
+
+
+def wma(df, p):
+    length = p['length']
+    columns = _columns(df.iloc[-length:], 'close')
+    if columns is None:
+        return None
+    close, = columns
+    if len(close) < length:
+        return np.nan
+    weights = np.arange(1, length + 1, dtype=np.float64)
+    return (close @ weights) / (0.5 * length * (length + 1))
+
+
+def rsi(df, p):
+    columns = _columns(df, 'close')
+    if columns is None:
+        return None
+    change = np.diff(columns[0])
+    average_gain = rma_last(np.maximum(change, 0.0), p['length'])
+    average_loss = rma_last(np.maximum(-change, 0.0), p['length'])
+    return 100.0 * average_gain / (average_gain + average_loss)
+
+
+def macd(df, p):
+    columns = _columns(df, 'close')
+    if columns is None:
+        return None
+    close, = columns
+    line = ema_series(close, p['fast_period']) - ema_series(close, p['slow_period'])
+    valid = np.flatnonzero(~np.isnan(line))
+    # The signal EMA starts at the first MACD value
+    signal = ema_last(line[valid[0]:], p['signal_period']) if len(valid) else np.nan
+    return {'macd_line': line[-1], 'signal_line': signal, 'histogram': line[-1] - signal}
+
+
+def bbands(df, p):
+    columns = _columns(df.iloc[-p['length']:], 'close')
+    if columns is None:
+        return None
+    close, = columns
+    if len(close) < p['length']:
+        return {'upper_band': np.nan, 'middle_band': np.nan, 'lower_band': np.nan}
+    middle = close.mean()
+    deviation = p['stddev'] * close.std(ddof=0)
+    return {'upper_band': middle + deviation, 'middle_band': middle, 'lower_band': middle - deviation}
+
+
+def atr(df, p):
+    columns = _columns(df, 'high', 'low', 'close')
+    if columns is None:
+        return None
+    high, low, close = columns
+    previous_close = close[:-1]
+    true_range = np.maximum(
+        high[1:] - low[1:],
+        np.maximum(np.abs(high[1:] - previous_close), np.abs(low[1:] - previous_close)),
+    )
+    return rma_last(true_range, p['length'])
+
+
+def stoch(df, p):
+    k, d, smooth_k = p['k'], p['d'], p['smooth_k']
+    needed = k + smooth_k + d - 2
+    columns = _columns(df.iloc[-needed:], 'high', 'low', 'close')
+    if columns is None:
+        return None
+    high, low, close = columns
+    if len(close) < needed:
+        return {'k_line': np.nan, 'd_line': np.nan}
+
+    highest = sliding_window_view(high, k).max(axis=-1)
+    lowest = sliding_window_view(low, k).min(axis=-1)
+    value_range = highest - lowest
+    if (value_range == 0).any():
+        # pandas_ta's non_zero_range
+        value_range = value_range + np.finfo(float).eps
+    stoch_line = 100.0 * (close[k - 1:] - lowest) / value_range
+    k_line = _rolling_mean(stoch_line, smooth_k)
+    d_line = _rolling_mean(k_line, d)
+    return {'k_line': k_line[-1], 'd_line': d_line[-1]}
+
+
+def obv(df, p):
+    columns = _columns(df, 'close', 'volume')
+    if columns is None:
+        return None
+    close, volume = columns
+    # signed_series(close, initial=1): the first bar counts as up
+    return volume[0] + np.sign(np.diff(close)) @ volume[1:]
+
+
+def vwap(df, p):
+    if not isinstance(df.index, pd.DatetimeIndex):
+        return None
+    # Anchored daily, like pandas_ta's default anchor='D': only bars of the last bar's day count
+    start = df.index.searchsorted(df.index[-1].normalize())
+    columns = _columns(df.iloc[start:], 'high', 'low', 'close', 'volume')
+    if columns is None:
+        return None
+    high, low, close, volume = columns
+    typical_price = (high + low + close) / 3.0
+    return (typical_price @ volume) / volume.sum()
+
+
+def roc(df, p):
+    length = p['length']
+    columns = _columns(df.iloc[-(length + 1):], 'close')
+    if columns is None:
+        return None
+    close, = columns
+    if len(close) < length + 1:
+        return np.nan
+    return 100.0 * (close[-1] - close[0]) / close[0]
+
+
+def zscore(df, p):
+    columns = _columns(df.iloc[-p['length']:], 'close')
+    if columns is None:
+        return None
+    close, = columns
+    if len(close) < p['length']:
+        return np.nan
+    return (close[-1] - close.mean()) / close.std(ddof=1)
@@ -0,0 +1,319 @@
+# alerts/fetcher.py
+
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from django.conf import settings
+
+from .cache import get_bar_cache
+from .governor import FetchGovernor, RateLimiter, get_fetch_governor
+from .leases import record_run_event
+from .utils import load_stock_data, load_stock_data_many
+
+logger = logging.getLogger(__name__)
+
+
+# Longest the collector sleeps before checking running downloads for timeouts, in seconds
+POLL_INTERVAL = 1.0
+
+
+class FetchDeferred(Exception):
+    """No request budget was available in time; the key is left for a later run."""
+
+
+class FetchRequest:
+    """
+    (symbol, interval, period) keys downloaded together, with the attempts made for them so far.
+
+    Keys of one request share their interval and period; several keys are sent as one multi-ticker
+    download, which may run for `timeout` seconds.
+    """
+
+    def __init__(self, keys, timeout, attempts=0):
+        self.keys = keys
+        self.timeout = timeout
+        self.attempts = attempts
+        self.started = None  # time.monotonic() at which the running attempt was sent
+        self.abandoned = False  # set once a timed-out attempt is given up on; its thread then stops retrying
+
+    @property
+    def symbols(self):
+        return [symbol for symbol, _, _ in self.keys]
+
+    def __str__(self):
+        _, interval, period = self.keys[0]
+        return f"{', '.join(self.symbols)} {interval} {period}"
+
+
+class FetchBatch:
+    """
+    Requests of one MarketDataFetcher.fetch() call, started in order as the governor's concurrency allows.
+
+    Finished downloads start the next queued ones from their own thread, so downloading goes on while the
+    caller is busy with earlier results.
+    """
+
+    def __init__(self, fetcher, requests):
+        self.fetcher = fetcher
+        self.queued = deque(requests)
+        self.running = {}  # future -> FetchRequest
+        self.finished = queue.SimpleQueue()
+        self.outstanding = len(requests)
+        # Reentrant: a future that is already done runs its callback inside start()
+        self._lock = threading.RLock()
+
+    def start(self):
+        with self._lock:
+            while self.queued and len(self.running) < self.fetcher.governor.concurrency:
+                request = self.queued.popleft()
+                future = self.fetcher._executor.submit(self.fetcher._download, request)
+                self.running[future] = request
+                future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            request = self.running.pop(future, None)
+        # Requests abandoned after a timeout are no longer running; their late result is dropped
+        if request is not None:
+            self.finished.put((request, future))
+        self.start()
+
+    def retry(self, request):
+        """Queues another attempt ahead of the requests not started yet."""
+        with self._lock:
+            self.queued.appendleft(request)
+        self.start()
+
+    def expire(self):
+        """Stops waiting for attempts running longer than their timeout and returns their requests."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [(future, request) for future, request in self.running.items()
+                       if request.started and now - request.started >= request.timeout]
+            for future, _ in expired:
+                del self.running[future]
+        if expired:
+            self.start()
+        return [request for _, request in expired]
+
+    def next_deadline(self):
+        with self._lock:
+            deadlines = [request.started + request.timeout for request in self.running.values() if request.started]
+        return min(deadlines, default=None)
+
+
+class MarketDataFetcher:
+    """
+    Downloads (symbol, interval, period) keys on a bounded thread pool.
+
+    Keys missing from the bar cache that share an (interval, period) are downloaded together, up to
+    `batch_size` symbols per multi-ticker download; a key alone in its window uses the single-symbol path.
+    Downloads are started in the order of their first key, at most governor.concurrency at a time, and
+    every symbol takes one request from the governor's rate limit, all those of a download at once; a
+    download that gets no budget within `max_wait` is deferred without taking any. Attempts that raise are retried after a jittered exponential backoff. An
+    attempt still running `timeout` (`batch_timeout` for multi-ticker downloads) seconds after it was sent
+    is abandoned and retried; yfinance's own request timeout is set to the same value, so the abandoned
+    thread does not hold its slot for long, and it makes no further attempts. Empty responses are not retried.
+
+    Deferred, failed and empty fetches come back as an empty DataFrame, like get_stock_data, and are
+    counted in stats() and the scheduler metrics (alerts.leases.get_run_metrics).
+
+    Args:
+        load (callable): load(symbol, period=, interval=, timeout=) -> DataFrame, raising on errors.
+        load_many (callable): load_many(symbols, period=, interval=, timeout=) -> dict of symbol ->
+            DataFrame, raising on errors. Symbols it leaves out count as empty.
+        concurrency (int): Threads in the pool.
+        timeout (float): Seconds an attempt may run.
+        batch_size (int): Most symbols per multi-ticker download, 1 to download every key on its own.
+        batch_timeout (float): Seconds a multi-ticker attempt may run, `timeout` if omitted.
+        retries (int): Attempts made after the first one fails or times out.
+        backoff (float): Delay before the first retry in seconds, doubled for each further one.
+        governor (FetchGovernor): Pacing shared by every download, unlimited if omitted.
+        max_wait (float): Seconds a key may wait for request budget before it is deferred, None to wait.
+    """
+
+    def __init__(self, load=load_stock_data, load_many=load_stock_data_many, concurrency=8, timeout=20.0,
+                 batch_size=1, batch_timeout=None, retries=2, backoff=1.0, governor=None, max_wait=None):
+        self._load = load
+        self._load_many = load_many
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self.batch_timeout = batch_timeout or timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.governor = governor or FetchGovernor(RateLimiter(0), max_rate=0, max_concurrency=concurrency)
+        self.max_wait = max_wait
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='market-data')
+        self._counters = {
+            'requests': 0, 'cache_hits': 0, 'batches': 0, 'retries': 0, 'timeouts': 0, 'empty': 0, 'failed': 0,
+            'deferred': 0,
+        }
+        self._counters_lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._counters_lock:
+            self._counters[counter] += 1
+        if counter in ('empty', 'failed', 'deferred'):
+            record_run_event(f'fetch_{counter}')
+
+    def stats(self):
+        with self._counters_lock:
+            return dict(self._counters, governor=self.governor.stats())
+
+    def retry_delay(self, attempts):
+        """Backoff before attempt `attempts + 1`, jittered so retries of one burst spread out."""
+        return self.backoff * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+
+    def _load_request(self, request):
+        """Returns symbol -> DataFrame for the symbols of `request`, in one download."""
+        symbols = request.symbols
+        _, interval, period = request.keys[0]
+        if len(symbols) == 1:
+            return {symbols[0]: self._load(symbols[0], period=period, interval=interval, timeout=request.timeout)}
+        return self._load_many(symbols, period=period, interval=interval, timeout=request.timeout)
+
+    def _download(self, request):
+        while True:
+            # Every ticker of a multi-ticker download counts against the rate limit; they are taken in one go,
+            # so a deferred download leaves the budget it waited for to other downloads
+            if not self.governor.acquire(timeout=self.max_wait, count=len(request.keys)):
+                raise FetchDeferred(f"no request budget within {self.max_wait}s")
+            request.attempts += 1
+            request.started = time.monotonic()
+            try:
+                frames = self._load_request(request)
+            except Exception as e:
+                self.governor.record('error')
+                if request.attempts > self.retries or request.abandoned:
+                    raise
+                delay = self.retry_delay(request.attempts)
+                logger.info(f"Retrying {request} in {delay:.1f}s after: {e}")
+                self._count('retries')
+                request.started = None
+                time.sleep(delay)
+                if request.abandoned:
+                    raise
+                continue
+
+            frames = {symbol: frames.get(symbol, pd.DataFrame()) for symbol in request.symbols}
+            for data in frames.values():
+                self.governor.record('empty' if data.empty else 'ok')
+            return frames
+
+    def fetch(self, keys):
+        """
+        Starts downloading `keys`, in order, and returns an iterator of (key, frame) in completion order.
+
+        Keys found in the bar cache come first. Downloads run in the background while the caller consumes
+        earlier results.
+        """
+        cache = get_bar_cache()
+        cached = []
+        windows = {}  # (interval, period) -> keys missing from the cache
+        for key in dict.fromkeys(keys):
+            symbol, interval, period = key
+            self._count('requests')
+            data = cache.get(symbol, interval, period)
+            if data is not None:
+                self._count('cache_hits')
+                cached.append((key, data))
+            else:
+                windows.setdefault((interval, period), []).append(key)
+
+        requests = []
+        for window_keys in windows.values():
+            for start in range(0, len(window_keys), self.batch_size):
+                chunk = window_keys[start:start + self.batch_size]
+                requests.append(FetchRequest(chunk, self.timeout if len(chunk) == 1 else self.batch_timeout))
+                if len(chunk) > 1:
+                    self._count('batches')
+        batch = FetchBatch(self, requests)
+        batch.start()
+        return self._collect(cached, batch)
+
+    def _results(self, request, future):
+        """Returns (key, frame) for every key of a finished request."""
+        try:
+            frames = future.result()
+        except FetchDeferred as e:
+            print(f"Deferred fetching {request}: {e}")
+            for _ in request.keys:
+                self._count('deferred')
+            return [(key, pd.DataFrame()) for key in request.keys]
+        except Exception as e:
+            print(f"Error fetching data for {request}: {e}")
+            for _ in request.keys:
+                self._count('failed')
+            return [(key, pd.DataFrame()) for key in request.keys]
+
+        results = []
+        for key in request.keys:
+            symbol, interval, period = key
+            data = frames[symbol]
+            if data.empty:
+                print(f"No data returned for {symbol} {interval} {period}")
+                self._count('empty')
+            results.append((key, data))
+        return results
+
+    def _collect(self, cached, batch):
+        yield from cached
+        while batch.outstanding:
+            deadline = batch.next_deadline()
+            poll = POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, deadline - time.monotonic())
+            try:
+                request, future = batch.finished.get(timeout=max(0.0, poll))
+            except queue.Empty:
+                pass
+            else:
+                batch.outstanding -= 1
+                yield from self._results(request, future)
+
+            for request in batch.expire():
+                request.abandoned = True
+                self._count('timeouts')
+                self.governor.record('timeout')
+                if request.attempts <= self.retries:
+                    # A fresh FetchRequest, so the abandoned thread stops before its next retry
+                    self._count('retries')
+                    batch.retry(FetchRequest(request.keys, request.timeout, attempts=request.attempts))
+                else:
+                    print(f"Error fetching data for {request}: timed out after {request.attempts} attempts")
+                    batch.outstanding -= 1
+                    for key in request.keys:
+                        self._count('failed')
+                        yield key, pd.DataFrame()
+
+    def get_stock_data(self, symbol, period='1mo', interval='1d'):
+        """Same as utils.get_stock_data, with this fetcher's timeout, retries and pacing."""
+        for _, data in self.fetch([(symbol, interval, period)]):
+            return data
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_market_data_fetcher():
+    """Returns the process-wide MarketDataFetcher, built from settings on first use."""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = MarketDataFetcher(
+                    concurrency=getattr(settings, 'ALERT_FETCH_CONCURRENCY', 8),
+                    timeout=getattr(settings, 'ALERT_FETCH_TIMEOUT', 20),
+                    batch_size=getattr(settings, 'ALERT_FETCH_BATCH_SIZE', 50),
+                    batch_timeout=getattr(settings, 'ALERT_FETCH_BATCH_TIMEOUT', 60),
+                    retries=getattr(settings, 'ALERT_FETCH_RETRIES', 2),
+                    backoff=getattr(settings, 'ALERT_FETCH_RETRY_BACKOFF', 1.0),
+                    governor=get_fetch_governor(),
+                    max_wait=getattr(settings, 'ALERT_FETCH_MAX_WAIT', 30),
+                )
+    return _fetcher
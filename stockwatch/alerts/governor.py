@@ -0,0 +1,253 @@
+# alerts/governor.py
+
+import logging
+import threading
+import time
+from collections import deque
+
+import redis
+from django.conf import settings
+
+from .leases import get_lease_client
+
+logger = logging.getLogger(__name__)
+
+
+GOVERNOR_KEY_PREFIX = 'stockwatch:governor'
+
+# Milliseconds an adjusted rate is kept once the bucket is idle; then pacing starts over at the configured rate
+RATE_TTL_MS = 600000
+
+# Takes ARGV[3] tokens at once if the bucket holds them (or is full, for more than a burst) and returns 0, else
+# takes none and returns the milliseconds until it does; the rate it refilled at comes second. Taking more than
+# a burst leaves the bucket in debt, which later requests wait out. The rate is the one FetchGovernor adjusted
+# (ADJUST_RATE_SCRIPT), ARGV[1] until it has, and Redis' clock is used, so every worker refills the bucket
+# at the same pace.
+TOKEN_BUCKET_SCRIPT = f"""
+local burst = tonumber(ARGV[2])
+local count = tonumber(ARGV[3])
+local need = math.min(count, burst)
+local time = redis.call('time')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('hmget', KEYS[1], 'tokens', 'updated', 'rate')
+local rate = tonumber(state[3]) or tonumber(ARGV[1])
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= need then
+    tokens = tokens - count
+else
+    wait = math.ceil((need - tokens) / rate * 1000)
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+local ttl = math.ceil((burst - tokens) / rate * 1000) + 1000
+if state[3] then
+    ttl = math.max(ttl, {RATE_TTL_MS})
+end
+redis.call('pexpire', KEYS[1], ttl)
+return {{wait, tostring(rate)}}
+"""
+
+# Sets the bucket's rate to rate * ARGV[2] + ARGV[3], within [ARGV[4], ARGV[5]], and returns it; ARGV[1] is
+# the rate until one was set.
+ADJUST_RATE_SCRIPT = f"""
+local rate = tonumber(redis.call('hget', KEYS[1], 'rate')) or tonumber(ARGV[1])
+rate = math.max(tonumber(ARGV[4]), math.min(tonumber(ARGV[5]), rate * tonumber(ARGV[2]) + tonumber(ARGV[3])))
+redis.call('hset', KEYS[1], 'rate', tostring(rate))
+redis.call('pexpire', KEYS[1], math.max(redis.call('pttl', KEYS[1]), {RATE_TTL_MS}))
+return tostring(rate)
+"""
+
+
+class RateLimiter:
+    """
+    Token bucket local to the process: `rate` requests per second on average, in bursts of up to `burst`.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = None
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return self.burst or max(1.0, self.rate)
+
+    def try_acquire(self, count=1):
+        """
+        Takes `count` tokens and returns 0, or takes none and returns the seconds until they are available.
+
+        More tokens than a burst are granted once the bucket is full, leaving it in debt.
+        """
+        with self._lock:
+            now = time.monotonic()
+            tokens = self.capacity if self._tokens is None else self._tokens
+            self._tokens = min(self.capacity, tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            need = min(count, self.capacity)
+            if self._tokens >= need:
+                self._tokens -= count
+                return 0
+            return (need - self._tokens) / self.rate
+
+    def acquire(self, timeout=None, count=1):
+        """
+        Blocks until `count` requests may be sent. Returns False, having taken nothing, if that would take
+        longer than `timeout`.
+        """
+        if not self.rate:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(count)
+            if wait <= 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def adjust_rate(self, factor, step, min_rate, max_rate):
+        """Sets the rate to rate * factor + step, within [min_rate, max_rate], and returns it."""
+        with self._lock:
+            self.rate = max(min_rate, min(max_rate, self.rate * factor + step))
+            return self.rate
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    RateLimiter whose bucket lives in Redis, so every worker process draws from the same budget.
+
+    The rate is kept in Redis next to the bucket, so a backoff decided by one process paces all of them;
+    `rate` mirrors the shared value as of the last call. When Redis is unreachable each process falls back
+    to its own bucket at that rate.
+    """
+
+    def __init__(self, name, rate, burst=None, client=None):
+        super().__init__(rate, burst)
+        self.configured_rate = rate
+        self.key = f"{GOVERNOR_KEY_PREFIX}:{name}"
+        self._client = client or get_lease_client()
+        self._shared = True
+
+    def _unavailable(self, e):
+        if self._shared:
+            logger.warning(f"Rate limit {self.key} unavailable, limiting this process only: {e}")
+            self._shared = False
+
+    def try_acquire(self, count=1):
+        try:
+            wait_ms, rate = self._client.eval(
+                TOKEN_BUCKET_SCRIPT, 1, self.key, self.configured_rate, self.capacity, count)
+        except redis.RedisError as e:
+            self._unavailable(e)
+            return super().try_acquire(count)
+        self._shared = True
+        self.rate = float(rate)
+        return int(wait_ms) / 1000
+
+    def adjust_rate(self, factor, step, min_rate, max_rate):
+        try:
+            rate = self._client.eval(
+                ADJUST_RATE_SCRIPT, 1, self.key, self.configured_rate, factor, step, min_rate, max_rate)
+        except redis.RedisError as e:
+            self._unavailable(e)
+            return super().adjust_rate(factor, step, min_rate, max_rate)
+        self._shared = True
+        self.rate = float(rate)
+        return self.rate
+
+
+class FetchGovernor:
+    """
+    Paces downloads to what the provider tolerates.
+
+    Every download outcome is recorded ('ok', 'empty', 'error' or 'timeout'). Once per `window`
+    outcomes, if more than `max_failure_rate` of them were bad, the request rate and the number of
+    downloads in flight are halved; otherwise they grow back, by a tenth of `max_rate` and by one
+    download, up to their configured maxima. Throttled providers tend to answer with errors or empty
+    frames, so both count as bad.
+
+    Args:
+        limiter (RateLimiter): Shared bucket; its rate is adjusted through adjust_rate, in Redis for a
+            RedisRateLimiter.
+        max_rate (float): Requests per second when the provider is healthy, 0 for no limit.
+        max_concurrency (int): Downloads in flight when the provider is healthy.
+        min_rate (float): Lowest rate the governor backs off to.
+        window (int): Outcomes between two adjustments.
+        max_failure_rate (float): Share of bad outcomes above which the governor backs off.
+    """
+
+    BAD_OUTCOMES = ('empty', 'error', 'timeout')
+
+    def __init__(self, limiter, max_rate, max_concurrency, min_rate=0.5, window=20, max_failure_rate=0.2):
+        self.limiter = limiter
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.min_rate = min(min_rate, max_rate) if max_rate else 0
+        self.window = window
+        self.max_failure_rate = max_failure_rate
+        self.concurrency = max_concurrency
+        self.limiter.rate = max_rate
+        self._outcomes = deque(maxlen=window)
+        self._counters = {outcome: 0 for outcome in ('ok',) + self.BAD_OUTCOMES}
+        self._backoffs = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self.limiter.rate
+
+    def acquire(self, timeout=None, count=1):
+        return self.limiter.acquire(timeout=timeout, count=count)
+
+    def record(self, outcome):
+        with self._lock:
+            self._counters[outcome] += 1
+            self._outcomes.append(outcome in self.BAD_OUTCOMES)
+            if len(self._outcomes) < self.window:
+                return
+            failure_rate = sum(self._outcomes) / len(self._outcomes)
+            self._outcomes.clear()
+            if failure_rate > self.max_failure_rate:
+                self._backoffs += 1
+                self.concurrency = max(1, self.concurrency // 2)
+                if self.max_rate:
+                    self.limiter.adjust_rate(0.5, 0, self.min_rate, self.max_rate)
+                logger.warning(
+                    f"{failure_rate:.0%} of recent downloads failed, backing off to {self.limiter.rate:.2f}/s "
+                    f"with {self.concurrency} in flight")
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                if self.max_rate:
+                    self.limiter.adjust_rate(1, self.max_rate / 10, self.min_rate, self.max_rate)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, rate=round(self.rate, 2), concurrency=self.concurrency,
+                        backoffs=self._backoffs)
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_fetch_governor():
+    """Returns the process-wide FetchGovernor pacing market data downloads, built from settings on first use."""
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                rate = getattr(settings, 'ALERT_FETCH_RATE_LIMIT', 5.0)
+                _governor = FetchGovernor(
+                    RedisRateLimiter('market_data', rate),
+                    max_rate=rate,
+                    max_concurrency=getattr(settings, 'ALERT_FETCH_CONCURRENCY', 8),
+                    min_rate=getattr(settings, 'ALERT_FETCH_MIN_RATE', 0.5),
+                    window=getattr(settings, 'ALERT_FETCH_GOVERNOR_WINDOW', 20),
+                    max_failure_rate=getattr(settings, 'ALERT_FETCH_MAX_FAILURE_RATE', 0.2),
+                )
+    return _governor
@@ -0,0 +1,835 @@
+# alerts/indicators.py
+
+import json
+import math
+import os
+
+import pandas as pd
+import pandas_ta as ta  # noqa: F401 - registers the DataFrame.ta accessor
+from django.conf import settings
+
+from . import fastpath
+
+
+# Parameters capped to keep indicator computations bounded
+MAX_LENGTH = 400
+LENGTH_PARAMETERS = ('length', 'lookback')
+
+
+class Param:
+    """
+    An indicator parameter: its name, how to coerce it and its default.
+
+    `aliases` lists other names the parameter is accepted under (e.g. the names used in
+    indicator_definitions.json). `default` may be a callable receiving the parameters coerced so far.
+    """
+
+    def __init__(self, name, cast, default, aliases=()):
+        self.name = name
+        self.cast = cast
+        self.default = default
+        self.aliases = tuple(aliases)
+
+    @property
+    def names(self):
+        return (self.name,) + self.aliases
+
+    def coerce(self, parameters, coerced):
+        for key in self.names:
+            value = parameters.get(key)
+            if value is not None:
+                return self.cast(value)
+        return self.default(coerced) if callable(self.default) else self.default
+
+
+class FastResult(dict):
+    """Last values returned by an indicator's fast path, keyed by line (None for single-line indicators)."""
+
+
+class IndicatorSpec:
+    """
+    Everything needed to compute an indicator and read one of its lines.
+
+    Args:
+        name (str): Registry name, as stored on IndicatorDefinition.
+        label (str): Human readable name used in error messages.
+        compute (callable): compute(df, params) -> pandas_ta Series or DataFrame.
+        params (list): Param instances.
+        column (str | callable): Column template of single-line indicators, formatted with the
+            parameters, or a callable (result, params) -> column name.
+        lines (dict): Line name -> column template, for multi-line indicators.
+        default_line (str): Line used when none is given.
+        strict_lines (bool): Raise on unknown lines instead of falling back to `default_line`.
+        warmup (callable): warmup(params) -> bars needed before the last value is defined, i.e. every
+            window and smoothing stage of the indicator filled once (TA-Lib lookback + 1).
+        requires_volume (bool): Whether the DataFrame must have a volume column.
+        aliases (tuple): Other names the indicator is registered under.
+        fast (callable): fast(df, params) -> last value, or {line: last value} for multi-line indicators,
+            computed with NumPy (alerts.fastpath). Returns None to fall back to `compute`.
+    """
+
+    def __init__(self, name, label, compute, params=(), column=None, lines=None, default_line=None,
+                 strict_lines=True, warmup=None, requires_volume=False, aliases=(), fast=None):
+        self.name = name
+        self.label = label
+        self.compute = compute
+        self.params = list(params)
+        self.column = column
+        self.lines = lines
+        self.default_line = default_line
+        self.strict_lines = strict_lines
+        self.warmup = warmup
+        self.requires_volume = requires_volume
+        self.aliases = tuple(aliases)
+        self.fast = fast
+
+    @property
+    def line_names(self):
+        return list(self.lines) if self.lines else []
+
+    @property
+    def parameter_names(self):
+        return {name for param in self.params for name in param.names}
+
+    def coerce_parameters(self, parameters):
+        coerced = {}
+        for param in self.params:
+            coerced[param.name] = param.coerce(parameters, coerced)
+        return coerced
+
+    def required_length(self, params):
+        return self.warmup(params) if self.warmup else 0
+
+    def has_line(self, line):
+        return self.lines is None or not self.strict_lines or line in self.lines
+
+    def resolve_line(self, line):
+        """Returns the line `line` selects, or None for single-line indicators."""
+        if self.lines is None:
+            return None
+        key = line or self.default_line
+        if key not in self.lines:
+            if self.strict_lines or self.default_line is None:
+                raise ValueError(
+                    f"Unknown line '{line}' for {self.label}. Options: {', '.join(self.line_names)}.")
+            key = self.default_line
+        return key
+
+    def resolve_column(self, line, params, result=None):
+        template = self.column if self.lines is None else self.lines[self.resolve_line(line)]
+        return template(result, params) if callable(template) else template.format(**params)
+
+    def extract(self, result, line, params):
+        if isinstance(result, FastResult):
+            return float(result[self.resolve_line(line)])
+        if self.lines is None and isinstance(result, pd.Series):
+            return float(result.iloc[-1])
+        if not isinstance(result, pd.DataFrame):
+            raise ValueError(f"Unexpected {self.label} result type: {type(result)}")
+        column = self.resolve_column(line, params, result)
+        if column not in result.columns:
+            raise ValueError(f"{self.label} column '{column}' not found. Available: {list(result.columns)}")
+        return float(result[column].iloc[-1])
+
+    def check_frame(self, df, params):
+        """Raises ValueError if `df` lacks the columns or bars needed for coerced `params`."""
+        if self.requires_volume and 'volume' not in df.columns:
+            raise ValueError(f"Volume data is required for {self.label} but not found in DataFrame.")
+        required_length = self.required_length(params)
+        if len(df) < required_length:
+            raise ValueError(
+                f"Not enough data to calculate {self.label}. Required: {required_length}, Available: {len(df)}")
+
+    def compute_result(self, df, params):
+        """
+        Returns the result (all lines) for coerced `params`: the last values from the fast path when the
+        indicator has one and FAST_INDICATORS_ENABLED is on, else the full pandas_ta result.
+        """
+        self.check_frame(df, params)
+        if self.fast is not None and getattr(settings, 'FAST_INDICATORS_ENABLED', True):
+            values = self.fast(df, params)
+            if values is not None:
+                return FastResult(values if isinstance(values, dict) else {None: values})
+        return self.compute(df, params)
+
+    def calculate(self, df, line=None, parameters=None):
+        params = self.coerce_parameters(parameters or {})
+        return self.extract(self.compute_result(df, params), line, params)
+
+
+_REGISTRY = {}
+
+
+def register(spec):
+    """Adds `spec` to the registry under its name and aliases."""
+    for name in (spec.name,) + spec.aliases:
+        _REGISTRY[name] = spec
+    return spec
+
+
+def get_indicator_spec(indicator_name):
+    spec = _REGISTRY.get(indicator_name.lower())
+    if spec is None:
+        raise ValueError(f"Indicator '{indicator_name}' is not supported.")
+    return spec
+
+
+def registered_indicators():
+    return sorted({spec.name for spec in _REGISTRY.values()})
+
+
+class IndicatorResultCache:
+    """
+    Full indicator results for one evaluation pass.
+
+    Results are keyed by (symbol, timeframe, indicator, parameters, last bar, bar count) and hold every
+    line the indicator produces, so comparing e.g. the MACD line to the MACD signal computes MACD once.
+
+    When a StreamingEngine is given, indicators it supports are updated incrementally instead. Values
+    computed ahead of time for many symbols at once (alerts.vectorized) are stored with store_value.
+    """
+
+    def __init__(self, streaming=None):
+        self.streaming = streaming
+        self._results = {}
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(symbol, timeframe, spec, params, df):
+        last_bar = df.index[-1] if len(df) else None
+        return symbol, timeframe, spec.name, tuple(sorted(params.items())), last_bar, len(df)
+
+    def store_value(self, symbol, timeframe, indicator_name, df, line, parameters, value):
+        """Records the value of one line computed elsewhere for these bars."""
+        spec = get_indicator_spec(indicator_name)
+        params = spec.coerce_parameters(parameters or {})
+        self._values[self._key(symbol, timeframe, spec, params, df) + (line.lower() if line else None,)] = value
+
+    def calculate(self, symbol, timeframe, indicator_name, df, line=None, parameters=None):
+        """Same as calculate_indicator, reusing results already computed on the same bars."""
+        spec = get_indicator_spec(indicator_name)
+        line = line.lower() if line else None
+        if self._values:
+            params = spec.coerce_parameters(parameters or {})
+            value = self._values.get(self._key(symbol, timeframe, spec, params, df) + (line,))
+            if value is not None:
+                self.hits += 1
+                return value
+
+        if self.streaming is not None and self.streaming.supports(spec.name):
+            return self.streaming.calculate(symbol, timeframe, spec.name, df, line=line, parameters=parameters)
+
+        params = spec.coerce_parameters(parameters or {})
+        key = self._key(symbol, timeframe, spec, params, df)
+
+        result = self._results.get(key)
+        if result is None:
+            result = spec.compute_result(df, params)
+            self._results[key] = result
+            self.misses += 1
+        else:
+            self.hits += 1
+        return spec.extract(result, line, params)
+
+    def discard(self, symbol):
+        """Drops every result computed for `symbol`."""
+        for entries in (self._results, self._values):
+            for key in [key for key in entries if key[0] == symbol]:
+                del entries[key]
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._results),
+            'precomputed': len(self._values),
+        }
+
+
+def _length_indicator(name, label, default_length, column, method=None, requires_volume=False, aliases=(),
+                      warmup=None, fast=None):
+    """Registers a single-line indicator computed from one `length` parameter."""
+    method = method or name
+    return register(IndicatorSpec(
+        name, label,
+        compute=lambda df, p: getattr(df.ta, method)(length=p['length'], append=False),
+        params=[Param('length', int, default_length)],
+        column=column,
+        warmup=warmup or (lambda p: p['length']),
+        requires_volume=requires_volume,
+        aliases=aliases,
+        fast=fast,
+    ))
+
+
+# pandas_ta defaults for stages we do not expose as parameters, needed for their warm-up
+STC_CYCLE_LENGTH = 10  # stc tclength
+KVO_SIGNAL_LENGTH = 13  # kvo signal
+
+
+def _first_tuple_item(result):
+    # A few pandas_ta indicators return (DataFrame, extra DataFrame)
+    return result[0] if isinstance(result, tuple) else result
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Moving averages
+# ─────────────────────────────────────────────────────────────────────────────
+_length_indicator('moving_average', 'SMA', 14, 'SMA_{length}', method='sma', fast=fastpath.sma)
+_length_indicator('ema', 'EMA', 14, 'EMA_{length}', fast=fastpath.ema)
+_length_indicator('wma', 'WMA', 14, 'WMA_{length}', fast=fastpath.wma)
+_length_indicator('dema', 'DEMA', 14, 'DEMA_{length}', warmup=lambda p: 2 * p['length'] - 1)
+_length_indicator('tema', 'TEMA', 14, 'TEMA_{length}', warmup=lambda p: 3 * p['length'] - 2)
+_length_indicator('hma', 'HMA', 14, 'HMA_{length}', warmup=lambda p: p['length'] + int(math.sqrt(p['length'])) - 1)
+_length_indicator('zlema', 'ZLEMA', 14, 'ZLEMA_{length}', warmup=lambda p: p['length'] + (p['length'] - 1) // 2)
+
+register(IndicatorSpec(
+    'kama', 'KAMA',
+    compute=lambda df, p: df.ta.kama(length=p['length'], fast=p['fast'], slow=p['slow'], append=False),
+    params=[Param('length', int, 10), Param('fast', int, 2), Param('slow', int, 30)],
+    column='KAMA_{length}_{fast}_{slow}',
+    warmup=lambda p: p['length'] + 1,
+))
+
+register(IndicatorSpec(
+    'alma', 'ALMA',
+    compute=lambda df, p: df.ta.alma(length=p['length'], offset=p['offset'], sigma=p['sigma'], append=False),
+    params=[Param('length', int, 10), Param('offset', float, 0.85), Param('sigma', float, 6.0)],
+    column='ALMA_{length}_{offset}_{sigma}',
+    warmup=lambda p: p['length'],
+))
+
+register(IndicatorSpec(
+    't3', 'T3',
+    compute=lambda df, p: df.ta.t3(length=p['length'], b=p['b'], append=False),
+    params=[Param('length', int, 10), Param('b', float, 0.7)],
+    column='T3_{length}_{b}',
+    warmup=lambda p: 6 * p['length'] - 5,
+))
+
+register(IndicatorSpec(
+    'mama', 'MAMA',
+    compute=lambda df, p: df.ta.mama(fastlimit=p['fastlimit'], slowlimit=p['slowlimit'], append=False),
+    params=[Param('fastlimit', float, 0.5), Param('slowlimit', float, 0.05)],
+    lines={
+        'mama_line': 'MAMA_{fastlimit}_{slowlimit}',
+        'fama_line': 'FAMA_{fastlimit}_{slowlimit}',
+    },
+    default_line='mama_line',
+))
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Bands and channels
+# ─────────────────────────────────────────────────────────────────────────────
+register(IndicatorSpec(
+    'bollinger_bands', 'Bollinger Bands',
+    compute=lambda df, p: df.ta.bbands(length=p['length'], std=p['stddev'], append=False),
+    params=[Param('length', int, 20), Param('stddev', float, 2.0)],
+    lines={
+        'upper_band': 'BBU_{length}_{stddev}',
+        'middle_band': 'BBM_{length}_{stddev}',
+        'lower_band': 'BBL_{length}_{stddev}',
+    },
+    warmup=lambda p: p['length'],
+    fast=fastpath.bbands,
+))
+
+register(IndicatorSpec(
+    'bbw', 'BBW',
+    compute=lambda df, p: df.ta.bbw(length=p['length'], std=p['std'], append=False),
+    params=[Param('length', int, 20), Param('std', float, 2.0)],
+    column='BBBw_{length}_{std}',
+    warmup=lambda p: p['length'],
+))
+
+register(IndicatorSpec(
+    'kc', 'Keltner Channels',
+    compute=lambda df, p: df.ta.kc(length=p['length'], scalar=p['scalar'], mamode=p['mamode'], append=False),
+    params=[Param('length', int, 20), Param('scalar', float, 2.0), Param('mamode', lambda v: str(v).lower(), 'ema')],
+    lines={
+        'upper': 'KCU_{length}_{scalar}_{mamode}',
+        'kcu': 'KCU_{length}_{scalar}_{mamode}',
+        'middle': 'KCM_{length}_{scalar}_{mamode}',
+        'kcm': 'KCM_{length}_{scalar}_{mamode}',
+        'lower': 'KCL_{length}_{scalar}_{mamode}',
+        'kcl': 'KCL_{length}_{scalar}_{mamode}',
+    },
+    default_line='middle',
+    warmup=lambda p: p['length'] + 1,
+))
+
+register(IndicatorSpec(
+    'donchian', 'Donchian Channels',
+    compute=lambda df, p: df.ta.donchian(
+        lower_length=p['lower_length'], upper_length=p['upper_length'], append=False),
+    params=[Param('lower_length', int, 20), Param('upper_length', int, lambda p: p['lower_length'])],
+    lines={
+        'upper': 'DCU_{lower_length}_{upper_length}',
+        'lower': 'DCL_{lower_length}_{upper_length}',
+        'middle': 'DCM_{lower_length}_{upper_length}',
+        'median': 'DCM_{lower_length}_{upper_length}',
+    },
+    default_line='middle',
+    warmup=lambda p: max(p['lower_length'], p['upper_length']),
+))
+
+register(IndicatorSpec(
+    'lrc', 'LRC',
+    compute=lambda df, p: df.ta.lrc(length=p['length'], alpha=p['alpha'], append=False),
+    params=[Param('length', int, 100), Param('alpha', float, 2.0)],
+    lines={
+        'regression': 'LRC_{length}',
+        'lrc': 'LRC_{length}',
+        'upper': 'LRCU_{length}_{alpha}',
+        'lower': 'LRCL_{length}_{alpha}',
+    },
+    default_line='regression',
+    warmup=lambda p: p['length'],
+))
+
+register(IndicatorSpec(
+    'ichimoku', 'Ichimoku',
+    compute=lambda df, p: _first_tuple_item(
+        df.ta.ichimoku(tenkan=p['tenkan'], kijun=p['kijun'], senkou=p['senkou'], append=False)),
+    params=[Param('tenkan', int, 9), Param('kijun', int, 26), Param('senkou', int, 52)],
+    lines={
+        'tenkan_sen': 'ITS_{tenkan}_{kijun}_{senkou}',
+        'its': 'ITS_{tenkan}_{kijun}_{senkou}',
+        'kijun_sen': 'IKS_{tenkan}_{kijun}_{senkou}',
+        'iks': 'IKS_{tenkan}_{kijun}_{senkou}',
+        'senkou_a': 'ISA_{tenkan}_{kijun}_{senkou}',
+        'isa': 'ISA_{tenkan}_{kijun}_{senkou}',
+        'senkou_b': 'ISB_{tenkan}_{kijun}_{senkou}',
+        'isb': 'ISB_{tenkan}_{kijun}_{senkou}',
+        'chikou_span': 'ICS_{tenkan}_{kijun}_{senkou}',
+        'ics': 'ICS_{tenkan}_{kijun}_{senkou}',
+    },
+    default_line='tenkan_sen',
+    warmup=lambda p: p['senkou'] + p['kijun'],
+))
+
+register(IndicatorSpec(
+    'psar', 'PSAR',
+    compute=lambda df, p: df.ta.psar(step=p['step'], max_step=p['max_step'], append=False),
+    params=[Param('step', float, 0.02), Param('max_step', float, 0.2)],
+    lines={
+        'psar': 'PSAR_{step}_{max_step}',
+        'psar_line': 'PSAR_{step}_{max_step}',
+        'psarl': 'PSARl_{step}_{max_step}',
+        'psars': 'PSARs_{step}_{max_step}',
+    },
+    default_line='psar',
+    warmup=lambda p: 2,
+))
+
+register(IndicatorSpec(
+    'supertrend', 'SuperTrend',
+    compute=lambda df, p: df.ta.supertrend(length=p['length'], multiplier=p['multiplier'], append=False),
+    params=[Param('length', int, 10), Param('multiplier', float, 3.0)],
+    lines={
+        'trend': 'SUPERT_{length}_{multiplier}',
+        'direction': 'SUPERTd_{length}_{multiplier}',
+        'lower': 'SUPERTl_{length}_{multiplier}',
+    },
+    default_line='trend',
+    strict_lines=False,
+    warmup=lambda p: p['length'] + 1,
+))
+
+register(IndicatorSpec(
+    'gannhilo', 'GANNHiLo',
+    compute=lambda df, p: df.ta.gannhilo(length=p['length'], append=False),
+    params=[Param('length', int, 10)],
+    lines={
+        'hi': 'GANNHi_{length}',
+        'lo': 'GANNLo_{length}',
+    },
+    default_line='hi',
+    warmup=lambda p: p['length'],
+))
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Momentum
+# ─────────────────────────────────────────────────────────────────────────────
+_length_indicator('rsi', 'RSI', 14, 'RSI_{length}', warmup=lambda p: p['length'] + 1, fast=fastpath.rsi)
+_length_indicator('cci', 'CCI', 20, 'CCI_{length}')
+_length_indicator('roc', 'ROC', 10, 'ROC_{length}', warmup=lambda p: p['length'] + 1, fast=fastpath.roc)
+_length_indicator('cmo', 'CMO', 14, 'CMO_{length}', warmup=lambda p: p['length'] + 1)
+_length_indicator('williams', 'Williams %R', 14, 'WILLR_{length}', method='willr', aliases=('williamsr', 'willr'))
+_length_indicator('qstick', 'QSTICK', 10, 'QSTICK_{length}')
+_length_indicator('cvi', 'Choppiness Index (CVI)', 14, 'CVI_{length}', warmup=lambda p: 2 * p['length'])
+_length_indicator('slope', 'Slope', 5, 'SLOPE_{length}', warmup=lambda p: p['length'] + 1)
+_length_indicator('zscore', 'ZScore', 30, 'ZSCORE_{length}', fast=fastpath.zscore)
+_length_indicator('rvi', 'RVI', 14, 'RVI_{length}', warmup=lambda p: 2 * p['length'])
+_length_indicator('tsf', 'TSF', 14, 'TSF_{length}')
+
+register(IndicatorSpec(
+    'macd', 'MACD',
+    compute=lambda df, p: df.ta.macd(
+        fast=p['fast_period'], slow=p['slow_period'], signal=p['signal_period'], append=False),
+    params=[Param('fast_period', int, 12), Param('slow_period', int, 26), Param('signal_period', int, 9)],
+    lines={
+        'macd_line': 'MACD_{fast_period}_{slow_period}_{signal_period}',
+        'signal_line': 'MACDs_{fast_period}_{slow_period}_{signal_period}',
+        'histogram': 'MACDh_{fast_period}_{slow_period}_{signal_period}',
+    },
+    warmup=lambda p: p['slow_period'] + p['signal_period'] - 1,
+    fast=fastpath.macd,
+))
+
+register(IndicatorSpec(
+    'ppo', 'PPO',
+    compute=lambda df, p: df.ta.ppo(fast=p['fast'], slow=p['slow'], signal=p['signal'], append=False),
+    params=[Param('fast', int, 12), Param('slow', int, 26), Param('signal', int, 9)],
+    lines={
+        'ppo_line': 'PPO_{fast}_{slow}_{signal}',
+        'signal_line': 'PPOs_{fast}_{slow}_{signal}',
+        'histogram': 'PPOh_{fast}_{slow}_{signal}',
+    },
+    default_line='ppo_line',
+    warmup=lambda p: p['slow'] + p['signal'] - 1,
+))
+
+register(IndicatorSpec(
+    'adx', 'ADX',
+    compute=lambda df, p: df.ta.adx(length=p['length'], append=False),
+    params=[Param('length', int, 14)],
+    lines={
+        'adx_line': 'ADX_{length}',
+        'diplus_line': 'DMP_{length}',
+        'diminus_line': 'DMN_{length}',
+    },
+    default_line='adx_line',
+    strict_lines=False,
+    warmup=lambda p: p['length'] * 2,
+))
+
+register(IndicatorSpec(
+    'tsi', 'TSI',
+    compute=lambda df, p: df.ta.tsi(fast=p['fast'], slow=p['slow'], append=False),
+    params=[Param('fast', int, 13, aliases=('short_length',)), Param('slow', int, 25, aliases=('long_length',))],
+    column='TSI_{fast}_{slow}',
+    warmup=lambda p: p['slow'] + p['fast'],
+))
+
+register(IndicatorSpec(
+    'stoch', 'Stochastic',
+    compute=lambda df, p: df.ta.stoch(k=p['k'], d=p['d'], smooth_k=p['smooth_k'], append=False),
+    params=[
+        Param('k', int, 14, aliases=('k_length',)),
+        Param('d', int, 3, aliases=('d_length',)),
+        Param('smooth_k', int, 3),
+    ],
+    lines={
+        'k_line': 'STOCHk_{k}_{d}_{smooth_k}',
+        'd_line': 'STOCHd_{k}_{d}_{smooth_k}',
+    },
+    default_line='k_line',
+    strict_lines=False,
+    warmup=lambda p: p['k'] + p['smooth_k'] + p['d'] - 2,
+    fast=fastpath.stoch,
+))
+
+register(IndicatorSpec(
+    'ao', 'AO',
+    compute=lambda df, p: df.ta.ao(fast=p['fast'], slow=p['slow'], append=False),
+    params=[Param('fast', int, 5), Param('slow', int, 34)],
+    column='AO_{fast}_{slow}',
+    warmup=lambda p: p['slow'],
+))
+
+register(IndicatorSpec(
+    'uo', 'Ultimate Oscillator (UO)',
+    compute=lambda df, p: df.ta.uo(s=p['s'], m=p['m'], l=p['l'], append=False),
+    params=[
+        Param('s', int, 7, aliases=('fast',)),
+        Param('m', int, 14, aliases=('medium',)),
+        Param('l', int, 28, aliases=('slow',)),
+    ],
+    column='UO_{s}_{m}_{l}',
+    warmup=lambda p: p['l'] + 1,
+))
+
+register(IndicatorSpec(
+    'aroon', 'AROON',
+    compute=lambda df, p: df.ta.aroon(length=p['length'], append=False),
+    params=[Param('length', int, 14)],
+    lines={
+        'up': 'AROONU_{length}',
+        'aroonu': 'AROONU_{length}',
+        'aroon_up': 'AROONU_{length}',
+        'down': 'AROOND_{length}',
+        'aroond': 'AROOND_{length}',
+        'aroon_down': 'AROOND_{length}',
+    },
+    default_line='up',
+    warmup=lambda p: p['length'] + 1,
+))
+
+register(IndicatorSpec(
+    'trix', 'TRIX',
+    compute=lambda df, p: df.ta.trix(length=p['length'], append=False),
+    params=[Param('length', int, 14)],
+    column='TRIX_{length}',
+    warmup=lambda p: 3 * p['length'] - 1,
+))
+
+register(IndicatorSpec(
+    'stc', 'STC',
+    compute=lambda df, p: df.ta.stc(fast=p['fast'], slow=p['slow'], factor=p['factor'], append=False),
+    params=[Param('fast', int, 23), Param('slow', int, 50), Param('factor', int, 10)],
+    column='STC_{fast}_{slow}_{factor}',
+    warmup=lambda p: p['slow'] + 2 * STC_CYCLE_LENGTH,
+))
+
+register(IndicatorSpec(
+    'vortex', 'Vortex',
+    compute=lambda df, p: df.ta.vortex(length=p['length'], append=False),
+    params=[Param('length', int, 14)],
+    lines={
+        'plus': 'VIP_{length}',
+        'vip': 'VIP_{length}',
+        'minus': 'VIN_{length}',
+        'vin': 'VIN_{length}',
+    },
+    default_line='plus',
+    warmup=lambda p: p['length'] + 1,
+))
+
+register(IndicatorSpec(
+    'fisher', 'Fisher',
+    compute=lambda df, p: df.ta.fisher(length=p['length'], append=False),
+    params=[Param('length', int, 9)],
+    lines={
+        'fisher_line': 'FISHERT_{length}',
+        'signal_line': 'FISHERs_{length}',
+        'fisher_signal': 'FISHERs_{length}',
+    },
+    default_line='fisher_line',
+    warmup=lambda p: p['length'],
+))
+
+register(IndicatorSpec(
+    'ewo', 'EWO',
+    compute=lambda df, p: df.ta.ewo(fast=p['fast'], slow=p['slow'], append=False),
+    params=[Param('fast', int, 5), Param('slow', int, 35)],
+    column='EWO_{fast}_{slow}',
+    warmup=lambda p: p['slow'],
+))
+
+register(IndicatorSpec(
+    'crsi', 'CRSI',
+    compute=lambda df, p: df.ta.crsi(
+        rsi_length=p['rsi_length'], streak_length=p['streak_length'], ma_length=p['ma_length'], append=False),
+    params=[Param('rsi_length', int, 3), Param('streak_length', int, 2), Param('ma_length', int, 100)],
+    column='CRSI_{rsi_length}_{streak_length}_{ma_length}',
+    warmup=lambda p: max(p['rsi_length'], p['streak_length'], p['ma_length']) + 1,
+))
+
+register(IndicatorSpec(
+    'qqe', 'QQE',
+    compute=lambda df, p: df.ta.qqe(length=p['length'], smooth=p['smooth'], append=False),
+    params=[Param('length', int, 14), Param('smooth', int, 5)],
+    lines={
+        'main': 'QQE_{length}_{smooth}',
+        'lower': 'QQEl_{length}_{smooth}',
+        'qqel': 'QQEl_{length}_{smooth}',
+    },
+    default_line='main',
+    warmup=lambda p: 5 * p['length'] + p['smooth'] - 3,
+))
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Volatility
+# ─────────────────────────────────────────────────────────────────────────────
+_length_indicator('atr', 'ATR', 14, 'ATR_{length}', warmup=lambda p: p['length'] + 1, fast=fastpath.atr)
+_length_indicator('natr', 'NATR', 14, 'NATR_{length}', warmup=lambda p: p['length'] + 1)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Volume
+# ─────────────────────────────────────────────────────────────────────────────
+_length_indicator('mfi', 'MFI', 14, 'MFI_{length}', requires_volume=True, warmup=lambda p: p['length'] + 1)
+_length_indicator('cmf', 'CMF', 20, 'CMF_{length}', requires_volume=True)
+_length_indicator('efi', 'EFI', 13, 'EFI_{length}', requires_volume=True, warmup=lambda p: p['length'] + 1)
+
+register(IndicatorSpec(
+    'obv', 'OBV',
+    compute=lambda df, p: df.ta.obv(append=False),
+    column='OBV',
+    requires_volume=True,
+    fast=fastpath.obv,
+))
+
+register(IndicatorSpec(
+    'ad', 'Accum/Dist',
+    compute=lambda df, p: df.ta.ad(append=False),
+    column='AD',
+    requires_volume=True,
+))
+
+register(IndicatorSpec(
+    'wad', 'WAD',
+    compute=lambda df, p: df.ta.wad(append=False),
+    column='WAD',
+    warmup=lambda p: 2,
+))
+
+register(IndicatorSpec(
+    'vwap', 'VWAP',
+    compute=lambda df, p: df.ta.vwap(append=False),
+    # Typically "VWAP"; fall back to the first column if anchored naming is used
+    column=lambda result, p: 'VWAP' if 'VWAP' in result.columns else result.columns[0],
+    requires_volume=True,
+    fast=fastpath.vwap,
+))
+
+register(IndicatorSpec(
+    'bop', 'BOP',
+    compute=lambda df, p: df.ta.bop(length=p['length'], append=False) if p['length'] else df.ta.bop(append=False),
+    params=[Param('length', int, None)],
+    # Possibly "BOP" or "BOP_{length}"
+    column=lambda result, p: next((col for col in result.columns if col.startswith('BOP')), 'BOP'),
+))
+
+register(IndicatorSpec(
+    'pvo', 'PVO',
+    compute=lambda df, p: df.ta.pvo(fast=p['fast'], slow=p['slow'], signal=p['signal'], append=False),
+    params=[Param('fast', int, 12), Param('slow', int, 26), Param('signal', int, 9)],
+    lines={
+        'pvo_line': 'PVO_{fast}_{slow}_{signal}',
+        'signal_line': 'PVOs_{fast}_{slow}_{signal}',
+        'histogram': 'PVOh_{fast}_{slow}_{signal}',
+    },
+    default_line='pvo_line',
+    warmup=lambda p: p['slow'] + p['signal'] - 1,
+    requires_volume=True,
+))
+
+register(IndicatorSpec(
+    'kvo', 'KVO',
+    compute=lambda df, p: df.ta.kvo(fast=p['fast'], slow=p['slow'], append=False),
+    params=[Param('fast', int, 34), Param('slow', int, 55)],
+    lines={
+        'kvo_line': 'KVO_{fast}_{slow}',
+        'signal_line': 'KVOs_{fast}_{slow}',
+    },
+    default_line='kvo_line',
+    warmup=lambda p: p['slow'] + KVO_SIGNAL_LENGTH,
+    requires_volume=True,
+))
+
+register(IndicatorSpec(
+    'eom', 'EOM',
+    compute=lambda df, p: df.ta.eom(length=p['length'], divisor=p['divisor'], append=False),
+    params=[Param('length', int, 14), Param('divisor', float, 100000000.0)],
+    column='EOM_{length}_{divisor}',
+    warmup=lambda p: p['length'] + 1,
+    requires_volume=True,
+))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# indicator_definitions.json
+# ─────────────────────────────────────────────────────────────────────────────
+class IndicatorParameterError(ValueError):
+    """Raised with a {parameter: message} dict when condition parameters do not match a definition."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+_definitions = None
+
+
+def get_indicator_definitions():
+    """Returns indicator_definitions.json keyed by indicator name, loaded once per process."""
+    global _definitions
+    if _definitions is None:
+        file_path = os.path.join(settings.BASE_DIR, 'indicator_definitions.json')
+        with open(file_path, 'r') as file:
+            _definitions = {definition['name']: definition for definition in json.load(file)}
+    return _definitions
+
+
+def check_indicator_definitions(definitions):
+    """
+    Cross-checks indicator definitions against the registry.
+
+    Args:
+        definitions (iterable): Indicator definitions as found in indicator_definitions.json.
+
+    Returns:
+        list: Human readable problems; empty when every definition can be computed.
+    """
+    problems = []
+    for definition in definitions:
+        name = definition['name']
+        spec = _REGISTRY.get(name)
+        if spec is None:
+            problems.append(f"{name}: no registered indicator.")
+            continue
+        for param in definition.get('parameters', []):
+            if param['name'] not in spec.parameter_names:
+                problems.append(f"{name}: parameter '{param['name']}' is not used by the indicator.")
+        for line in definition.get('lines', []):
+            if not spec.has_line(line['name']):
+                problems.append(f"{name}: line '{line['name']}' does not resolve to a column.")
+    return problems
+
+
+def validate_indicator_parameters(indicator_name, parameters):
+    """
+    Validates condition parameters against the indicator's definition and fills in defaults.
+
+    Raises:
+        IndicatorParameterError: If a parameter is missing, of the wrong type or out of range.
+
+    Returns:
+        dict: Validated parameters.
+    """
+    definition = get_indicator_definitions().get(indicator_name)
+    if definition is None:
+        raise IndicatorParameterError({'indicator': f"Unknown indicator '{indicator_name}'."})
+    parameters = parameters or {}
+
+    validated_parameters = {}
+    for param_def in definition.get('parameters', []):
+        param_name = param_def['name']
+        param_type = param_def['param_type']
+        required = param_def.get('required', True)
+        default_value = param_def.get('default_value')
+
+        if param_name in parameters:
+            value = parameters[param_name]
+            # Type validation
+            if param_type == 'int' and not isinstance(value, int):
+                raise IndicatorParameterError({param_name: "Must be an integer."})
+            if param_type == 'float' and not isinstance(value, (int, float)):
+                raise IndicatorParameterError({param_name: "Must be a float."})
+            if param_type == 'string' and not isinstance(value, str):
+                raise IndicatorParameterError({param_name: "Must be a string."})
+            if param_type == 'choice' and value not in (param_def.get('choices') or []):
+                raise IndicatorParameterError(
+                    {param_name: f"Invalid choice. Available choices are: {param_def.get('choices')}"})
+
+            if param_name in LENGTH_PARAMETERS and float(value) > MAX_LENGTH:
+                raise IndicatorParameterError({param_name: f"Maximum allowed length is {MAX_LENGTH}."})
+
+            validated_parameters[param_name] = value
+        elif required:
+            raise IndicatorParameterError({param_name: "This parameter is required."})
+        elif default_value is not None and default_value != '':
+            # Convert default_value to the correct type
+            if param_type == 'int':
+                validated_parameters[param_name] = int(default_value)
+            elif param_type == 'float':
+                validated_parameters[param_name] = float(default_value)
+            else:
+                validated_parameters[param_name] = default_value
+        else:
+            validated_parameters[param_name] = None
+
+    return validated_parameters
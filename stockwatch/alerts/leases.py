@@ -0,0 +1,104 @@
+# alerts/leases.py
+
+import logging
+import threading
+import uuid
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+LEASE_KEY_PREFIX = 'stockwatch:lease'
+RUN_METRICS_KEY = 'stockwatch:alerts:run_metrics'
+
+# Deletes / extends the lease only if it is still ours, so an expired lease re-acquired by another run is
+# never released by the previous holder
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+EXTEND_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class RedisLease:
+    """
+    Distributed lease on a Redis key, held by whoever SET it with their token.
+
+    The lease expires after `ttl` seconds unless extended, so a crashed holder never blocks later runs for
+    longer than that. When Redis is unreachable the lease is granted (fail open): a duplicate evaluation
+    is better than no evaluation.
+    """
+
+    def __init__(self, name, ttl, client=None, token=None):
+        self.key = f"{LEASE_KEY_PREFIX}:{name}"
+        self.ttl = ttl
+        self.token = token or uuid.uuid4().hex
+        self._client = client or get_lease_client()
+
+    def acquire(self):
+        try:
+            return bool(self._client.set(self.key, self.token, nx=True, px=int(self.ttl * 1000)))
+        except redis.RedisError as e:
+            logger.warning(f"Lease {self.key} could not be checked, proceeding without it: {e}")
+            return True
+
+    def extend(self, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            return bool(self._client.eval(EXTEND_SCRIPT, 1, self.key, self.token, int(ttl * 1000)))
+        except redis.RedisError as e:
+            logger.warning(f"Lease {self.key} could not be extended: {e}")
+            return False
+
+    def release(self):
+        try:
+            return bool(self._client.eval(RELEASE_SCRIPT, 1, self.key, self.token))
+        except redis.RedisError as e:
+            logger.warning(f"Lease {self.key} could not be released: {e}")
+            return False
+
+
+def record_run_event(event, count=1):
+    """Increments a scheduler counter, e.g. 'skipped_runs' or 'late_shards'."""
+    try:
+        get_lease_client().hincrby(RUN_METRICS_KEY, event, count)
+    except redis.RedisError as e:
+        logger.warning(f"Run metric {event} could not be recorded: {e}")
+
+
+def get_run_metrics():
+    """Returns the scheduler counters recorded so far."""
+    try:
+        return {key.decode(): int(value) for key, value in get_lease_client().hgetall(RUN_METRICS_KEY).items()}
+    except redis.RedisError as e:
+        logger.warning(f"Run metrics could not be read: {e}")
+        return {}
+
+
+_lease_client = None
+_lease_client_lock = threading.Lock()
+
+
+def get_lease_client():
+    """Returns the process-wide Redis client used for leases and run metrics."""
+    global _lease_client
+    if _lease_client is None:
+        with _lease_client_lock:
+            if _lease_client is None:
+                # Bounded calls, so a stalled Redis fails open instead of hanging the run
+                timeout = getattr(settings, 'ALERT_LEASE_REDIS_TIMEOUT', 1.0)
+                _lease_client = redis.Redis.from_url(
+                    getattr(settings, 'ALERT_LEASE_REDIS_URL', None) or settings.CELERY_BROKER_URL,
+                    socket_connect_timeout=timeout,
+                    socket_timeout=timeout,
+                )
+    return _lease_client
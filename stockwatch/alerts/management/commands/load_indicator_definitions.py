@@ -4,6 +4,7 @@ import json
 import os
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from alerts.indicators import check_indicator_definitions
 from alerts.models import IndicatorDefinition, IndicatorParameter, IndicatorLine
 
 class Command(BaseCommand):
@@ -19,6 +20,10 @@ class Command(BaseCommand):
         with open(file_path, 'r') as file:
             data = json.load(file)
 
+        # Flag definitions the indicator registry cannot compute as declared
+        for problem in check_indicator_definitions(data):
+            self.stdout.write(self.style.WARNING(problem))
+
         for indicator_data in data:
             name = indicator_data['name']
             display_name = indicator_data.get('display_name', name)
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_next_check_at(apps, schema_editor):
+    Alert = apps.get_model('alerts', 'Alert')
+    detail_relations = {
+        'PRICE': 'price_target_alert',
+        'PERCENT_CHANGE': 'percentage_change',
+        'INDICATOR_CHAIN': 'indicator_chain',
+    }
+
+    batch = []
+    alerts = Alert.objects.select_related(*detail_relations.values())
+    for alert in alerts.iterator(chunk_size=2000):
+        relation = detail_relations.get(alert.alert_type)
+        detail = getattr(alert, relation, None) if relation else None
+        check_interval = getattr(detail, 'check_interval', None) or 1
+        last_checked = alert.last_triggered_at or alert.created_at
+        alert.next_check_at = last_checked + timedelta(minutes=check_interval)
+        batch.append(alert)
+        if len(batch) >= 2000:
+            Alert.objects.bulk_update(batch, ['next_check_at'])
+            batch = []
+    if batch:
+        Alert.objects.bulk_update(batch, ['next_check_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0005_alter_percentagechangealert_lookback_period'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_next_check_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['next_check_at'], name='alert_active_next_check_idx'),
+        ),
+    ]
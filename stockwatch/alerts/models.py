@@ -1,7 +1,10 @@
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings  # Import settings to access AUTH_USER_MODEL
 from django.core.exceptions import ValidationError
-from django.db.models import JSONField
+from django.db.models import JSONField, Q
+from django.utils import timezone
 
 
 class Stock(models.Model):
@@ -32,10 +35,27 @@ class Alert(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
     last_triggered_at = models.DateTimeField(null=True, blank=True)
+    # Denormalized from the detail model's check_interval so the scheduler can select due alerts by index
+    next_check_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_check_at'], name='alert_active_next_check_idx', condition=Q(is_active=True)),
+        ]
 
     def __str__(self):
         return f"Alert ({self.get_alert_type_display()}) for {self.user.email} on {self.stock.name}"
 
+    def get_next_check_at(self, check_interval):
+        """Returns when the alert is next due, `check_interval` minutes after it was last checked."""
+        last_checked = self.last_triggered_at or self.created_at or timezone.now()
+        return last_checked + timedelta(minutes=check_interval or 1)
+
+    def schedule_next_check(self, check_interval):
+        """Recomputes next_check_at after the check interval changed and stores it without a full save."""
+        self.next_check_at = self.get_next_check_at(check_interval)
+        Alert.objects.filter(pk=self.pk).update(next_check_at=self.next_check_at)
+
 
 class PriceTargetAlert(models.Model):
     CONDITION_CHOICES = [
@@ -55,6 +75,7 @@ class PriceTargetAlert(models.Model):
         if self.alert.alert_type != 'PRICE':
             raise ValidationError("Alert type must be 'PRICE' for a PriceTargetAlert.")
         super().save(*args, **kwargs)
+        self.alert.schedule_next_check(self.check_interval)
 
 
 class PercentageChangeAlert(models.Model):
@@ -93,6 +114,7 @@ class PercentageChangeAlert(models.Model):
             raise ValidationError("Alert type must be 'PERCENT_CHANGE' for a PercentageChangeAlert.")
         self.full_clean()
         super().save(*args, **kwargs)
+        self.alert.schedule_next_check(self.check_interval)
 
 
 class IndicatorDefinition(models.Model):
@@ -166,6 +188,7 @@ class IndicatorChainAlert(models.Model):
         if self.alert.alert_type != 'INDICATOR_CHAIN':
             raise ValidationError("Alert type must be 'INDICATOR_CHAIN' for an IndicatorChainAlert.")
         super().save(*args, **kwargs)
+        self.alert.schedule_next_check(self.check_interval)
 
 
 class IndicatorCondition(models.Model):
@@ -0,0 +1,509 @@
+# alerts/planner.py
+
+import math
+import zlib
+from datetime import timedelta
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Prefetch
+
+from .bar_store import period_rank
+from .cache import get_bar_cache
+from .calendars import get_trading_calendar
+from .indicators import get_indicator_spec
+from .models import Alert, IndicatorCondition
+from .timeframes import TIMEFRAME_SECONDS, can_derive, derive_timeframe
+from .utils import get_stock_data
+
+
+# Maps IndicatorCondition timeframes to yfinance intervals
+TIMEFRAME_TO_INTERVAL = {
+    '1MIN': '1m',
+    '5MIN': '5m',
+    '15MIN': '15m',
+    '30MIN': '30m',
+    '1H': '60m',
+    '4H': '240m',
+    '1D': '1d',
+}
+
+# Data points per trading day for each timeframe (assuming 6.5 trading hours)
+DATA_POINTS_PER_DAY = {
+    '1MIN': 390,
+    '5MIN': 78,
+    '15MIN': 26,
+    '30MIN': 13,
+    '1H': 6,
+    '4H': 1,
+    '1D': 1,
+}
+
+TRADING_DAYS_PER_WEEK = 5
+
+# Warm-up assumed for conditions whose indicator cannot be resolved
+DEFAULT_WARMUP_BARS = 14
+
+# Maps PercentageChangeAlert lookback periods (TIMEFRAME_CHOICES) to the yfinance (interval, period) covering them
+PERCENT_CHANGE_PERIOD_MAP = {
+    '5MIN': ('1m', '5d'),
+    '15MIN': ('1m', '5d'),
+    '30MIN': ('1m', '5d'),
+    '1H': ('5m', '5d'),
+    '4H': ('5m', '5d'),
+    '1D': ('1d', '5d'),
+    '1W': ('1d', '1mo'),
+    '2W': ('1d', '1mo'),
+    '1MO': ('1d', '3mo'),
+    '3MO': ('1d', '6mo'),
+}
+
+# Length of each PercentageChangeAlert lookback period
+PERCENT_CHANGE_LOOKBACK = {
+    '5MIN': timedelta(minutes=5),
+    '15MIN': timedelta(minutes=15),
+    '30MIN': timedelta(minutes=30),
+    '1H': timedelta(hours=1),
+    '4H': timedelta(hours=4),
+    '1D': timedelta(days=1),
+    '1W': timedelta(weeks=1),
+    '2W': timedelta(weeks=2),
+    '1MO': timedelta(days=30),
+    '3MO': timedelta(days=91),
+}
+
+# Longest period yfinance serves for each intraday interval
+INTERVAL_MAX_PERIOD = {
+    '1m': '5d',
+    '5m': '1mo',
+    '15m': '1mo',
+    '30m': '1mo',
+    '60m': '1y',
+}
+
+# Timeframes yfinance has no interval for, fetched through a finer timeframe and resampled
+DERIVED_ONLY_TIMEFRAMES = {
+    '4H': '1H',
+}
+
+PRICE_DATA_PERIOD = '1d'
+PRICE_DATA_INTERVAL = '1m'
+
+
+# Valid yfinance periods with their approximate day equivalents
+PERIOD_DAYS = [
+    ('1d', 1),
+    ('5d', 5),
+    ('1mo', 30),
+    ('3mo', 90),
+    ('6mo', 180),
+    ('1y', 365),
+    ('2y', 730),
+    ('5y', 1825),
+    ('10y', 3650),
+    ('ytd', None),  # Special case: Year-to-date
+    ('max', None)    # Special case: Maximum available data
+]
+
+
+def get_valid_period(required_days):
+    """
+    Maps the required number of days to the closest valid yfinance period that meets or exceeds the required days.
+
+    Args:
+        required_days (int): The number of days required for the indicator calculation.
+
+    Returns:
+        str: A valid yfinance period string.
+    """
+    for period, days in PERIOD_DAYS:
+        if days and days >= required_days:
+            return period
+    # If required_days exceed the largest defined period, return 'max'
+    return 'max'
+
+
+def get_timeframe_interval(timeframe):
+    """Returns the yfinance interval for a chain timeframe, defaulting to '1d'."""
+    return TIMEFRAME_TO_INTERVAL.get(timeframe, '1d')
+
+
+def get_warmup_bars(indicator, parameters):
+    """
+    Returns the bars an indicator needs before its last value is defined, from its registry warm-up.
+
+    Args:
+        indicator (IndicatorDefinition | None): Indicator of a condition side.
+        parameters (dict | None): Its stored parameters.
+
+    Returns:
+        int: Warm-up bars, DEFAULT_WARMUP_BARS when the indicator or its parameters are unusable.
+    """
+    if indicator is None:
+        return DEFAULT_WARMUP_BARS
+    try:
+        spec = get_indicator_spec(indicator.name)
+        return max(1, spec.required_length(spec.coerce_parameters(parameters or {})))
+    except (TypeError, ValueError):
+        # Evaluation reports the invalid parameters
+        return DEFAULT_WARMUP_BARS
+
+
+def get_timeframe_days(timeframe, length):
+    """
+    Returns the number of calendar days holding `length` bars of `timeframe`, plus a 10% buffer.
+    """
+    points_per_day = DATA_POINTS_PER_DAY.get(timeframe, 390)  # Default to '1MIN' data points
+    trading_days = math.ceil(length / points_per_day)
+    # Weekends: yfinance periods count calendar days
+    required_days = math.ceil(trading_days * 7 / TRADING_DAYS_PER_WEEK)
+    # Add a buffer of 10% to ensure data sufficiency (holidays, partial sessions)
+    buffer_days = max(1, math.ceil(required_days * 0.1))
+    return required_days + buffer_days
+
+
+def estimate_frame_bars(timeframe, period):
+    """Returns roughly how many bars of `timeframe` a yfinance `period` holds."""
+    days = dict(PERIOD_DAYS).get(period) or 365
+    return days * DATA_POINTS_PER_DAY.get(timeframe, 390)
+
+
+def get_timeframe_period(timeframe, length):
+    """
+    Returns the smallest valid yfinance period holding `length` bars of `timeframe`, plus a 10% buffer.
+    """
+    return get_valid_period(get_timeframe_days(timeframe, length))
+
+
+def get_percentage_change_period(lookback_period):
+    """Returns the (interval, period) fetched to evaluate a percentage change over `lookback_period`."""
+    return PERCENT_CHANGE_PERIOD_MAP.get(lookback_period, PERCENT_CHANGE_PERIOD_MAP['1D'])
+
+
+def get_percentage_change(data, lookback_period):
+    """
+    Returns the realized change over `lookback_period`, in %, from the last close at or before the start
+    of the lookback period to the last close.
+
+    Args:
+        data (DataFrame): OHLCV bars covering the lookback period (see get_percentage_change_period).
+        lookback_period (str): PercentageChangeAlert lookback period, e.g. '1H'.
+
+    Returns:
+        float: Percentage change.
+    """
+    closes = data['close']
+    start = closes.index[-1] - PERCENT_CHANGE_LOOKBACK.get(lookback_period, PERCENT_CHANGE_LOOKBACK['1D'])
+    before = closes[closes.index <= start]
+    # Less history than the lookback period: measure from the first open
+    initial_price = before.iloc[-1] if len(before) else data['open'].iloc[0]
+    return float((closes.iloc[-1] - initial_price) / initial_price * 100)
+
+
+def get_chain_data_requirements(conditions):
+    """
+    Determines which (interval, period) frames an indicator chain needs.
+
+    Every timeframe is sized by the longest warm-up (see get_warmup_bars) among the main and value
+    indicators read on it, so the window is the smallest one every condition can use. Coarser timeframes are
+    derived from the finest fetched timeframe whenever its interval can serve enough history, so a
+    multi-timeframe chain usually costs a single download.
+
+    Args:
+        conditions (iterable): IndicatorCondition instances of the chain.
+
+    Returns:
+        dict: timeframe -> (interval, period, base_timeframe), where base_timeframe is the timeframe
+              actually fetched and resampled into `timeframe`.
+    """
+    lengths = {}
+    for condition in conditions:
+        timeframe = condition.indicator_timeframe
+        bars = get_warmup_bars(condition.indicator, condition.indicator_parameters)
+        lengths[timeframe] = max(lengths.get(timeframe, 0), bars)
+
+        if condition.value_type != 'INDICATOR_LINE' or not condition.value_timeframe:
+            continue
+        value_timeframe = condition.value_timeframe
+        bars = get_warmup_bars(condition.value_indicator, condition.value_indicator_parameters)
+        lengths[value_timeframe] = max(lengths.get(value_timeframe, 0), bars)
+
+    # Walk from the finest timeframe up, attaching each one to a finer base when possible
+    base_days = {}
+    sources = {}
+    for timeframe in sorted(lengths, key=lambda tf: TIMEFRAME_SECONDS.get(tf, 0)):
+        days = get_timeframe_days(timeframe, lengths[timeframe])
+        for base in base_days:
+            needed_days = max(base_days[base], days)
+            max_period = INTERVAL_MAX_PERIOD.get(get_timeframe_interval(base))
+            if (can_derive(base, timeframe) and max_period
+                    and period_rank(get_valid_period(needed_days)) <= period_rank(max_period)):
+                base_days[base] = needed_days
+                sources[timeframe] = base
+                break
+        else:
+            base = DERIVED_ONLY_TIMEFRAMES.get(timeframe, timeframe)
+            base_days[base] = max(base_days.get(base, 0), days)
+            sources[timeframe] = base
+
+    return {
+        timeframe: (get_timeframe_interval(base), get_valid_period(base_days[base]), base)
+        for timeframe, base in sources.items()
+    }
+
+
+def get_alert_data_requirements(alert):
+    """
+    Returns the list of (symbol, interval, period) frames needed to evaluate an alert.
+    """
+    symbol = alert.stock.symbol
+    if alert.alert_type == 'PRICE':
+        return [(symbol, PRICE_DATA_INTERVAL, PRICE_DATA_PERIOD)]
+    elif alert.alert_type == 'PERCENT_CHANGE':
+        interval, period = get_percentage_change_period(alert.percentage_change.lookback_period)
+        return [(symbol, interval, period)]
+    elif alert.alert_type == 'INDICATOR_CHAIN':
+        try:
+            conditions = get_chain_conditions(alert.indicator_chain)
+        except ObjectDoesNotExist:
+            return []
+        return list(dict.fromkeys(
+            (symbol, interval, period)
+            for interval, period, _ in get_chain_data_requirements(conditions).values()
+        ))
+    return []
+
+
+def get_alert_query_plans():
+    """
+    select_related / prefetch_related plan per alert type.
+
+    Everything the scheduler and the notifications read is loaded up front: the stock, the user, the
+    type's detail row and, for indicator chains, the ordered conditions with both indicator definitions.
+    """
+    conditions = IndicatorCondition.objects.select_related('indicator', 'value_indicator').order_by('position_in_chain')
+    return {
+        'PRICE': (('price_target_alert',), ()),
+        'PERCENT_CHANGE': (('percentage_change',), ()),
+        'INDICATOR_CHAIN': (('indicator_chain',), (Prefetch('indicator_chain__conditions', queryset=conditions),)),
+    }
+
+
+def load_due_alerts(now, alert_ids=None):
+    """
+    Loads the active alerts due at `now` with one query per alert type, plus one for chain conditions.
+
+    The number of queries does not depend on how many alerts are due.
+
+    Args:
+        now (datetime): Scheduler run time.
+        alert_ids (list): Restricts the load to these alerts (one shard of a run).
+    """
+    due = Alert.objects.filter(is_active=True, next_check_at__lte=now)
+    if alert_ids is not None:
+        due = due.filter(pk__in=alert_ids)
+    alerts = []
+    for alert_type, (related, prefetch) in get_alert_query_plans().items():
+        queryset = due.filter(alert_type=alert_type).select_related('stock', 'user', *related)
+        alerts.extend(queryset.prefetch_related(*prefetch))
+    return alerts
+
+
+def defer_closed_market_alerts(now):
+    """
+    Moves the alerts due at `now` whose market is closed to the next session open, with one UPDATE per
+    asset type, so the run neither fetches nor evaluates bars that cannot have changed.
+
+    Returns:
+        int: Number of alerts deferred.
+    """
+    due = Alert.objects.filter(is_active=True, next_check_at__lte=now)
+    deferred = 0
+    for asset_type in due.values_list('stock__asset_type', flat=True).distinct():
+        calendar = get_trading_calendar(asset_type)
+        if not calendar.is_open(now):
+            deferred += due.filter(stock__asset_type=asset_type).update(next_check_at=calendar.next_open(now))
+    return deferred
+
+
+def get_next_check_at(alert):
+    """Returns when the alert is next due: its check interval after the last check, within its market's hours."""
+    next_check_at = alert.get_next_check_at(get_check_interval(alert))
+    return get_trading_calendar(alert.stock.asset_type).next_open(next_check_at)
+
+
+def get_symbol_shard(symbol, shard_count):
+    """Stable shard of a symbol, identical in every process (unlike hash(), which is salted per process)."""
+    return zlib.crc32(symbol.encode()) % shard_count
+
+
+def partition_due_alerts(now, shard_count):
+    """
+    Splits the alert ids due at `now` into shards by symbol, so all alerts of a symbol share one shard.
+
+    Returns:
+        dict: shard number -> list of alert ids, only for non-empty shards.
+    """
+    shards = {}
+    due = Alert.objects.filter(is_active=True, next_check_at__lte=now).values_list('pk', 'stock__symbol')
+    for alert_id, symbol in due:
+        shards.setdefault(get_symbol_shard(symbol, shard_count), []).append(alert_id)
+    return shards
+
+
+def get_chain_conditions(indicator_chain_alert):
+    """Returns the chain's conditions in evaluation order, using prefetched rows when present."""
+    return sorted(indicator_chain_alert.conditions.all(), key=lambda condition: condition.position_in_chain)
+
+
+def get_check_interval(alert):
+    """Returns the alert's check interval in minutes."""
+    if alert.alert_type == 'PRICE':
+        return alert.price_target_alert.check_interval
+    elif alert.alert_type == 'PERCENT_CHANGE':
+        return alert.percentage_change.check_interval
+    elif alert.alert_type == 'INDICATOR_CHAIN':
+        return alert.indicator_chain.check_interval
+    return 1
+
+
+class SymbolGroup:
+    """
+    Due alerts of one symbol together with the frames they need.
+
+    `frames` maps each (symbol, interval, period) key to the alerts reading it, so every key is fetched once
+    for the whole group.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.alerts = []
+        self.frames = {}
+
+    def add(self, alert, keys):
+        self.alerts.append(alert)
+        for key in keys:
+            self.frames.setdefault(key, []).append(alert)
+
+    def eager_frames(self):
+        """Keys read by price or percentage change alerts; chain frames are fetched only once reached."""
+        return [key for key, alerts in self.frames.items()
+                if any(alert.alert_type != 'INDICATOR_CHAIN' for alert in alerts)]
+
+    def split_by_data(self, frames):
+        """
+        Returns (alerts whose eager frames have bars, alerts reading an eager frame that came back empty).
+        """
+        missing = set()
+        for symbol, interval, period in self.eager_frames():
+            if frames.get(symbol, period=period, interval=interval).empty:
+                missing.update(alert.id for alert in self.frames[(symbol, interval, period)])
+        return ([alert for alert in self.alerts if alert.id not in missing],
+                [alert for alert in self.alerts if alert.id in missing])
+
+
+def build_evaluation_plan(alerts):
+    """
+    Groups due alerts by symbol and by the (symbol, interval, period) frames they require.
+
+    Args:
+        alerts (iterable): Due Alert instances.
+
+    Returns:
+        dict: symbol -> SymbolGroup, in first-seen order.
+    """
+    plan = {}
+    chain_conditions = {}
+    for alert in alerts:
+        symbol = alert.stock.symbol
+        group = plan.get(symbol)
+        if group is None:
+            group = plan[symbol] = SymbolGroup(symbol)
+        if alert.alert_type != 'INDICATOR_CHAIN':
+            group.add(alert, get_alert_data_requirements(alert))
+            continue
+        # Chain frames are sized once per symbol for all of its chains, see alerts.chains.ChainProgram
+        group.add(alert, [])
+        try:
+            chain_conditions.setdefault(symbol, []).extend(get_chain_conditions(alert.indicator_chain))
+        except ObjectDoesNotExist:
+            pass
+
+    for symbol, conditions in chain_conditions.items():
+        group = plan[symbol]
+        chain_alerts = [alert for alert in group.alerts if alert.alert_type == 'INDICATOR_CHAIN']
+        for interval, period, _ in get_chain_data_requirements(conditions).values():
+            group.frames.setdefault((symbol, interval, period), []).extend(chain_alerts)
+    return plan
+
+
+class FrameSet:
+    """
+    OHLCV frames shared by every alert evaluated in one scheduler run.
+
+    Each (symbol, interval, period) key is fetched at most once; later lookups return the same frame.
+    """
+
+    def __init__(self, fetch=get_stock_data):
+        self._fetch = fetch
+        self._frames = {}
+        self.fetch_count = 0
+
+    def get(self, symbol, period, interval):
+        key = (symbol, interval, period)
+        if key not in self._frames:
+            self._frames[key] = self._fetch(symbol, period=period, interval=interval)
+            self.fetch_count += 1
+        return self._frames[key]
+
+    def is_available(self, symbol, interval, period):
+        """Whether a key can be served without a download: already fetched, or in the local bar cache."""
+        return (symbol, interval, period) in self._frames or get_bar_cache().contains(symbol, interval, period)
+
+    def get_timeframe(self, symbol, timeframe, requirement):
+        """
+        Returns bars for an IndicatorCondition timeframe.
+
+        Args:
+            requirement (tuple): (interval, period, base_timeframe) from get_chain_data_requirements.
+        """
+        interval, period, base_timeframe = requirement
+        data = self.get(symbol, period=period, interval=interval)
+        if base_timeframe != timeframe:
+            # Aggregate this timeframe from the finer series fetched for the chain
+            data = derive_timeframe(symbol, data, base_timeframe, timeframe)
+        return data
+
+    def stream(self, keys_per_symbol, fetch_all):
+        """
+        Downloads the keys of every symbol concurrently and yields each symbol once all of its keys are in,
+        so evaluation starts on early symbols while the others are still downloading.
+
+        Args:
+            keys_per_symbol (dict): symbol -> (symbol, interval, period) keys it needs.
+            fetch_all (callable): fetch_all(keys) -> iterator of (key, frame) in completion order, e.g.
+                MarketDataFetcher.fetch.
+        """
+        pending = {}
+        waiting = {}  # key -> symbols needing it
+        for symbol, keys in keys_per_symbol.items():
+            pending[symbol] = {key for key in keys if key not in self._frames}
+            for key in pending[symbol]:
+                waiting.setdefault(key, []).append(symbol)
+
+        # Start every download before handing out the symbols that are ready already
+        results = fetch_all(list(waiting)) if waiting else ()
+        for symbol, keys in pending.items():
+            if not keys:
+                yield symbol
+        for key, frame in results:
+            self._frames[key] = frame
+            self.fetch_count += 1
+            for symbol in waiting[key]:
+                pending[symbol].discard(key)
+                if not pending[symbol]:
+                    yield symbol
+
+    def discard(self, symbol):
+        """Drops every frame of `symbol` once its group has been evaluated."""
+        for key in [key for key in self._frames if key[0] == symbol]:
+            del self._frames[key]
@@ -0,0 +1,292 @@
+# alerts/providers.py
+
+import os
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .bar_store import PERIOD_OFFSETS, slice_period
+from .cache import INTERVAL_SECONDS
+
+
+OHLCV_COLUMNS = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'}
+
+
+class MarketDataProvider:
+    """
+    Source of OHLCV bars behind alerts.utils.get_stock_data.
+
+    Frames have lower-cased open/high/low/close/volume columns and a tz-aware DatetimeIndex. Errors are
+    raised, not swallowed; get_stock_data and the fetcher decide what to do with them.
+    """
+
+    def history(self, symbol, interval, period=None, start=None, timeout=None):
+        """
+        Returns the bars of `symbol`, either for a yfinance `period` or from `start` onwards.
+
+        `timeout` (seconds) bounds each network request, for providers that make any.
+        """
+        raise NotImplementedError
+
+    def history_many(self, symbols, interval, period=None, start=None, timeout=None):
+        """
+        Returns symbol -> bars for the symbols that returned any; the others are left out. Bars are requested
+        as for history(), the same `period` or `start` for every symbol.
+
+        Providers able to serve many tickers per request override this.
+        """
+        frames = {}
+        for symbol in symbols:
+            try:
+                frame = self.history(symbol, interval, period=period, start=start, timeout=timeout)
+            except Exception as e:
+                print(f"Error fetching data for {symbol}: {e}")
+                continue
+            if not frame.empty:
+                frames[symbol] = frame
+        return frames
+
+
+class YFinanceProvider(MarketDataProvider):
+    def history(self, symbol, interval, period=None, start=None, timeout=None):
+        ticker = yf.Ticker(symbol)
+        options = {} if timeout is None else {'timeout': timeout}
+        if start is not None:
+            data = ticker.history(start=start, interval=interval, **options)
+        else:
+            data = ticker.history(period=period, interval=interval, **options)
+        data.rename(columns=OHLCV_COLUMNS, inplace=True)
+        return data
+
+    def history_many(self, symbols, interval, period=None, start=None, timeout=None):
+        options = {} if timeout is None else {'timeout': timeout}
+        if start is not None:
+            options['start'] = start
+        else:
+            options['period'] = period
+        # auto_adjust/actions match the defaults of Ticker.history() used by history()
+        data = yf.download(
+            tickers=list(symbols),
+            interval=interval,
+            group_by='ticker',
+            auto_adjust=True,
+            actions=True,
+            threads=True,
+            progress=False,
+            **options,
+        )
+
+        frames = {}
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                frame = data[symbol]
+            else:
+                # Single-ticker downloads come back with flat columns
+                frame = data
+
+            frame = frame.dropna(how='all').rename(columns=OHLCV_COLUMNS)
+            if not frame.empty:
+                frames[symbol] = frame
+        return frames
+
+
+class LocalProvider(MarketDataProvider):
+    """
+    Offline provider for tests and benchmarks.
+
+    Symbols with a fixture under `root` (<SYMBOL>_<interval>.parquet/.csv, else <SYMBOL>.parquet/.csv)
+    are served from it. Other symbols get a synthetic geometric Brownian motion on a fixed grid of bars
+    from ORIGIN, around the clock. Values depend only on (seed, symbol, interval, bar), so requests made at
+    different times agree bar for bar.
+
+    One stream of daily log-price moves per symbol sets the level at every UTC midnight. Daily and longer
+    bars close on those levels; intraday bars fill each day with a Brownian bridge drawn from that day's
+    own stream, so every interval agrees on the daily closes and a request only generates the days it
+    covers.
+
+    Args:
+        root (str): Directory of CSV/Parquet fixtures, optional.
+        seed (int): Seed of the synthetic series.
+        start_price (float): Price of every synthetic series at ORIGIN.
+        drift (float): Annualized drift of the synthetic series.
+        volatility (float): Annualized volatility of the synthetic series.
+        now (callable): now() -> tz-aware Timestamp the synthetic series end at, the current time by default.
+    """
+
+    ORIGIN = pd.Timestamp('2020-01-01', tz='UTC')
+    TIMEZONE = 'America/New_York'
+    # Bars returned at most per synthetic request ('max' periods on minute bars)
+    MAX_BARS = 100000
+    SECONDS_PER_YEAR = 365 * 86400
+
+    def __init__(self, root=None, seed=0, start_price=100.0, drift=0.05, volatility=0.3, now=None):
+        self.root = root
+        self.seed = seed
+        self.start_price = start_price
+        self.drift = drift
+        self.volatility = volatility
+        self._now = now or (lambda: pd.Timestamp.now(tz='UTC'))
+        self._fixtures = {}  # path -> frame
+        self._lock = threading.Lock()
+
+    def history(self, symbol, interval, period=None, start=None, timeout=None):
+        path = self._fixture_path(symbol, interval)
+        if path is not None:
+            frame = self._read_fixture(path)
+        else:
+            frame = self._synthesize(symbol, interval, self._window_start(period, start))
+        if start is not None:
+            return frame[frame.index >= pd.Timestamp(start).tz_convert(frame.index.tz)]
+        return slice_period(frame, period)
+
+    # Fixtures
+
+    def _fixture_path(self, symbol, interval):
+        if not self.root:
+            return None
+        for name in (f"{symbol}_{interval}", symbol):
+            for extension in ('.parquet', '.csv'):
+                path = os.path.join(self.root, name + extension)
+                if os.path.exists(path):
+                    return path
+        return None
+
+    def _read_fixture(self, path):
+        frame = self._fixtures.get(path)
+        if frame is None:
+            if path.endswith('.parquet'):
+                frame = pd.read_parquet(path)
+            else:
+                frame = pd.read_csv(path, index_col=0)
+            frame.index = pd.to_datetime(frame.index, utc=True).tz_convert(self.TIMEZONE)
+            frame = frame.rename(columns=lambda column: OHLCV_COLUMNS.get(column, column.lower())).sort_index()
+            with self._lock:
+                self._fixtures[path] = frame
+        return frame
+
+    # Synthetic series
+
+    def _window_start(self, period, start):
+        now = self._now()
+        if start is not None:
+            return pd.Timestamp(start)
+        if period and period.endswith('d') and period[:-1].isdigit():
+            return now - pd.Timedelta(days=int(period[:-1]))
+        if period in PERIOD_OFFSETS:
+            return now - PERIOD_OFFSETS[period]
+        if period == 'ytd':
+            return now.normalize().replace(month=1, day=1)
+        return self.ORIGIN
+
+    def _step(self, seconds):
+        """Mean and standard deviation of the log-price move over `seconds`."""
+        dt = seconds / self.SECONDS_PER_YEAR
+        return (self.drift - self.volatility ** 2 / 2) * dt, self.volatility * np.sqrt(dt)
+
+    def _synthesize(self, symbol, interval, start):
+        bar_seconds = INTERVAL_SECONDS.get(interval)
+        if bar_seconds is None:
+            raise ValueError(f"Unsupported interval '{interval}'")
+        now = self._now()
+        origin_seconds = self.ORIGIN.timestamp()
+        first = max(0, int((start.timestamp() - origin_seconds) // bar_seconds))
+        last = int((now.timestamp() - origin_seconds) // bar_seconds)
+        first = max(first, last - self.MAX_BARS + 1)
+        if last < first:
+            return pd.DataFrame(columns=list(OHLCV_COLUMNS.values()))
+
+        bars = np.arange(first, last + 1)
+        series_key = zlib.crc32(symbol.encode())
+
+        if bar_seconds >= 86400:
+            _, day_std = self._step(86400)
+            days_per_bar = bar_seconds // 86400
+            moves = self._daily_moves(series_key, (last + 1) * days_per_bar)
+            levels = np.log(self.start_price) + np.concatenate([[0.0], np.cumsum(moves)])
+            open_, close = levels[bars * days_per_bar], levels[(bars + 1) * days_per_bar]
+            # The bar in progress closes at the latest minute bar, not at the end of its last day
+            close[-1] = np.log(self._synthesize(symbol, '1m', now)['close'].iloc[-1])
+            rng = np.random.default_rng([self.seed, series_key, bar_seconds])
+            # Drawn for every bar from ORIGIN, so a bar's wicks and volume do not depend on the window
+            wick = np.abs(rng.normal(0.0, day_std / 2, (last + 1, 2)))[first:].T
+            volume = rng.integers(1000, 100000, last + 1)[first:].astype(float)
+            # Daily and longer bars are stamped at local midnight, like yfinance
+            days = bars * days_per_bar
+            index = (self.ORIGIN.tz_localize(None) + pd.to_timedelta(days, unit='D')).tz_localize(self.TIMEZONE)
+        else:
+            bars_per_day = 86400 // bar_seconds
+            first_day, last_day = first // bars_per_day, last // bars_per_day
+            moves = self._daily_moves(series_key, last_day + 1)
+            levels = np.log(self.start_price) + np.concatenate([[0.0], np.cumsum(moves)])
+            bar_mean, bar_std = self._step(bar_seconds)
+            steps = np.arange(1, bars_per_day + 1) / bars_per_day
+
+            closes, wicks, volumes = [], [], []
+            for day in range(first_day, last_day + 1):
+                rng = np.random.default_rng([self.seed, series_key, bar_seconds, day])
+                walk = np.cumsum(rng.normal(bar_mean, bar_std, bars_per_day))
+                # Brownian bridge pinned to the day's move, so every interval closes the day at the same level
+                closes.append(levels[day] + walk - steps * walk[-1] + steps * moves[day])
+                wicks.append(np.abs(rng.normal(0.0, bar_std / 2, (2, bars_per_day))))
+                volumes.append(rng.integers(1000, 100000, bars_per_day).astype(float))
+
+            rows = slice(first - first_day * bars_per_day, last - first_day * bars_per_day + 1)
+            all_closes = np.concatenate(closes)
+            open_ = np.concatenate([[levels[first_day]], all_closes[:-1]])[rows]
+            close = all_closes[rows]
+            wick = np.concatenate(wicks, axis=1)[:, rows]
+            volume = np.concatenate(volumes)[rows]
+            index = (self.ORIGIN + pd.to_timedelta(bars * bar_seconds, unit='s')).tz_convert(self.TIMEZONE)
+
+        return pd.DataFrame(
+            {
+                'open': np.exp(open_),
+                'high': np.exp(np.maximum(open_, close) + wick[0]),
+                'low': np.exp(np.minimum(open_, close) - wick[1]),
+                'close': np.exp(close),
+                'volume': volume,
+            },
+            index=index,
+        )
+
+    def _daily_moves(self, series_key, days):
+        """Log-price moves of the first `days` days from ORIGIN, shared by every interval of the symbol."""
+        day_mean, day_std = self._step(86400)
+        return np.random.default_rng([self.seed, series_key]).normal(day_mean, day_std, days)
+
+
+PROVIDERS = {
+    'yfinance': YFinanceProvider,
+    'local': LocalProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def build_provider(name):
+    """Returns a provider for a PROVIDERS name or the dotted path of a MarketDataProvider subclass."""
+    if name == 'local':
+        return LocalProvider(
+            root=getattr(settings, 'MARKET_DATA_LOCAL_ROOT', None),
+            seed=getattr(settings, 'MARKET_DATA_LOCAL_SEED', 0),
+        )
+    provider_class = PROVIDERS.get(name) or import_string(name)
+    return provider_class()
+
+
+def get_market_data_provider():
+    """Returns the process-wide provider selected by MARKET_DATA_PROVIDER."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = build_provider(getattr(settings, 'MARKET_DATA_PROVIDER', 'yfinance'))
+    return _provider
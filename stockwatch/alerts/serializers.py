@@ -17,6 +17,7 @@ from .models import (
     IndicatorDefinition,
     IndicatorParameter
 )
+from .indicators import IndicatorParameterError, validate_indicator_parameters
 
 User = get_user_model()
 
@@ -363,56 +364,14 @@ class IndicatorConditionSerializer(serializers.ModelSerializer):
         ]
 
     def validate(self, data):
-        # Existing validation...
         indicator = data.get('indicator')
         parameters = data.get('indicator_parameters', {})
 
-        # Retrieve parameter definitions from the database
-        param_definitions = indicator.parameters.all()
-
-        validated_parameters = {}
-        for param_def in param_definitions:
-            param_name = param_def.name
-            param_type = param_def.param_type
-            required = param_def.required
-            default_value = param_def.default_value
-
-            if param_name in parameters:
-                value = parameters[param_name]
-                # Type validation
-                if param_type == 'int' and not isinstance(value, int):
-                    raise serializers.ValidationError({param_name: "Must be an integer."})
-                if param_type == 'float' and not isinstance(value, (int, float)):
-                    raise serializers.ValidationError({param_name: "Must be a float."})
-                if param_type == 'string' and not isinstance(value, str):
-                    raise serializers.ValidationError({param_name: "Must be a string."})
-                if param_type == 'choice' and value not in param_def.choices:
-                    raise serializers.ValidationError({param_name: f"Invalid choice. Available choices are: {param_def.choices}"})
-
-                if param_name in ['length', 'lookback']:  # or any param name you want to constrain
-                    if float(value) > 400:  # or int(value) > 400, depending on param_type
-                        raise serializers.ValidationError(
-                            {param_name: "Maximum allowed length is 400."}
-                        )
-
-                validated_parameters[param_name] = value
-            else:
-                if required:
-                    raise serializers.ValidationError({param_name: "This parameter is required."})
-                else:
-                    # Use default value if provided
-                    if default_value:
-                        # Convert default_value to the correct type
-                        if param_type == 'int':
-                            validated_parameters[param_name] = int(default_value)
-                        elif param_type == 'float':
-                            validated_parameters[param_name] = float(default_value)
-                        else:
-                            validated_parameters[param_name] = default_value
-                    else:
-                        validated_parameters[param_name] = None
-
-        data['indicator_parameters'] = validated_parameters
+        # Parameter definitions come from the in-process indicator registry, not the database
+        try:
+            data['indicator_parameters'] = validate_indicator_parameters(indicator.name, parameters)
+        except IndicatorParameterError as e:
+            raise serializers.ValidationError(e.errors)
         return data
 
     def create(self, validated_data):
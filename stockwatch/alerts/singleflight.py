@@ -0,0 +1,227 @@
+# alerts/singleflight.py
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .cache import get_bar_cache
+from .leases import RedisLease
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds between bar cache checks while another process downloads the same key
+POLL_INTERVAL = 0.1
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time in this process. Callers arriving while it runs wait for it
+    and share its result, or its exception.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> _Call in flight
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def do_many(self, keys, fn):
+        """
+        Batched do(): `fn(keys)` is called once with the keys no call is running for and returns key -> result;
+        the other keys share the result of the call already running them.
+
+        Returns:
+            dict: key -> result for every key.
+        """
+        leading, joined = {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    leading[key] = self._calls[key] = _Call()
+                    self.calls += 1
+                else:
+                    joined[key] = call
+                    self.shared += 1
+
+        if leading:
+            results, error = {}, None
+            try:
+                results = fn(list(leading))
+            except Exception as e:
+                error = e
+            with self._lock:
+                for key in leading:
+                    del self._calls[key]
+            for key, call in leading.items():
+                call.result, call.error = results.get(key), error
+                call.done.set()
+            if error is not None:
+                raise error
+
+        for call in joined.values():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+        return {key: call.result for key, call in {**leading, **joined}.items()}
+
+    def stats(self):
+        return {'calls': self.calls, 'shared': self.shared}
+
+
+def _fetch_lease(symbol, interval, period):
+    return RedisLease(f"fetch:{symbol}:{interval}:{period}", ttl=getattr(settings, 'ALERT_FETCH_LOCK_TTL', 30))
+
+
+@contextmanager
+def _kept_alive(leases):
+    """Extends `leases` every third of their TTL until the block exits, however long the download takes."""
+    stop = threading.Event()
+
+    def extend():
+        while not stop.wait(min(lease.ttl for lease in leases) / 3):
+            for lease in leases:
+                lease.extend()
+
+    keeper = threading.Thread(target=extend, name='fetch-lease-keeper', daemon=True)
+    keeper.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        keeper.join()
+
+
+def _load_held(held, interval, period, load_many):
+    """Loads the symbols of `held` (symbol -> RedisLease this process acquired), then releases the leases."""
+    cache = get_bar_cache()
+    frames = {}
+    try:
+        # The previous holders may have cached their bars between our cache miss and the leases
+        for symbol in held:
+            data = cache.get(symbol, interval, period)
+            if data is not None:
+                frames[symbol] = data
+        missing = [symbol for symbol in held if symbol not in frames]
+        if missing:
+            with _kept_alive(list(held.values())):
+                frames.update(load_many(missing))
+    finally:
+        for lease in held.values():
+            lease.release()
+    return frames
+
+
+def _load_many_across_processes(symbols, interval, period, load_many):
+    """
+    Calls `load_many` once for the symbols whose Redis lease this process gets, so one process downloads a
+    key at a time; the leases are extended for as long as the download runs. Symbols whose lease another
+    process holds are waited for together, until their bars show up in the shared bar cache; the ones
+    whose holder gives up without caching anything (failed or empty download) are taken over.
+
+    Waiting stops after the longest an attempt may run (ALERT_FETCH_TIMEOUT or ALERT_FETCH_BATCH_TIMEOUT)
+    plus ALERT_FETCH_LOCK_TTL, by which time a crashed holder's lease has expired too.
+    """
+    cache = get_bar_cache()
+    leases = {symbol: _fetch_lease(symbol, interval, period) for symbol in symbols}
+    held = {symbol: lease for symbol, lease in leases.items() if lease.acquire()}
+    waiting = [symbol for symbol in leases if symbol not in held]
+    frames = _load_held(held, interval, period, load_many) if held else {}
+
+    max_wait = max(getattr(settings, 'ALERT_FETCH_TIMEOUT', 20), getattr(settings, 'ALERT_FETCH_BATCH_TIMEOUT', 60))
+    deadline = time.monotonic() + max_wait + getattr(settings, 'ALERT_FETCH_LOCK_TTL', 30)
+    while waiting:
+        time.sleep(POLL_INTERVAL)
+        held, still_waiting = {}, []
+        for symbol in waiting:
+            data = cache.get(symbol, interval, period)
+            if data is not None:
+                frames[symbol] = data
+            elif leases[symbol].acquire():
+                held[symbol] = leases[symbol]
+            else:
+                still_waiting.append(symbol)
+        if held:
+            frames.update(_load_held(held, interval, period, load_many))
+        waiting = still_waiting
+        if waiting and time.monotonic() > deadline:
+            logger.warning(f"Gave up waiting for another process to fetch {', '.join(waiting)} {interval} {period}")
+            frames.update(load_many(waiting))
+            break
+    return frames
+
+
+def load_once(symbol, interval, period, load):
+    """
+    Calls `load` for (symbol, interval, period) unless the same key is already being loaded, in which case
+    the result of that load is returned instead: in this process through SingleFlight, across processes
+    through a Redis lease and the shared bar cache.
+    """
+    return get_single_flight().do(
+        (symbol, interval, period),
+        lambda: _load_many_across_processes([symbol], interval, period, lambda symbols: {symbol: load()})[symbol])
+
+
+def load_many_once(symbols, interval, period, load_many):
+    """
+    Batched load_once(): `load_many(symbols)`, returning a frame for each of the symbols it is given, is
+    called once for the symbols nobody else is loading for (interval, period); the others get the result of
+    the load running them.
+
+    Returns:
+        dict: symbol -> frame for every symbol.
+    """
+    keys = [(symbol, interval, period) for symbol in symbols]
+
+    def load_keys(leading):
+        frames = _load_many_across_processes([symbol for symbol, _, _ in leading], interval, period, load_many)
+        return {(symbol, interval, period): frames[symbol] for symbol, _, _ in leading}
+
+    results = get_single_flight().do_many(keys, load_keys)
+    return {symbol: results[key] for symbol, key in zip(symbols, keys)}
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight():
+    """Returns the process-wide SingleFlight used for market data downloads."""
+    return _single_flight
@@ -0,0 +1,448 @@
+# alerts/streaming.py
+
+import math
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from .indicators import get_indicator_spec
+
+
+# Each streaming indicator mirrors the pandas_ta 0.3.14b0 definition it replaces:
+#   sma     close.rolling(length).mean()
+#   ema     ewm(span=length, adjust=False) seeded with the SMA of the first `length` closes
+#   rma     ewm(alpha=1/length, min_periods=length) with adjust=True (RSI and ATR smoothing)
+#   bbands  SMA -/+ std * rolling population standard deviation (ddof=0)
+# Bars are (open, high, low, close, volume) tuples. `update` commits a closed bar, `peek` returns the
+# values the indicator would have if `bar` were the next bar, without committing it. `drop(count)` forgets
+# the `count` oldest committed bars, as if the series had started after them; indicators without it are
+# replayed from scratch when the start of the frame moves.
+
+
+class StreamingSMA:
+    def __init__(self, length):
+        self.length = length
+        self.window = deque()
+        self.total = 0.0
+        self.since_resum = 0
+
+    def update(self, bar):
+        close = bar[3]
+        if len(self.window) == self.length:
+            self.total -= self.window.popleft()
+        self.window.append(close)
+        self.total += close
+        # Re-sum once per window so floating point drift of the running total stays bounded
+        self.since_resum += 1
+        if self.since_resum >= self.length:
+            self.total = math.fsum(self.window)
+            self.since_resum = 0
+
+    def peek(self, bar):
+        size = len(self.window) + 1
+        total = self.total + bar[3]
+        if size > self.length:
+            total -= self.window[0]
+            size = self.length
+        return total / self.length if size == self.length else math.nan
+
+    def drop(self, count):
+        # Only the last `length` bars count, and the frame always has that many
+        pass
+
+
+class StreamingEMA:
+    def __init__(self, length):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.decay = 1.0 - self.alpha
+        self.count = 0
+        self.seed_total = 0.0  # sum of the first `length` inputs
+        self.value = math.nan
+        self.inputs = deque()
+        self.since_replay = 0
+
+    def _advance(self, x):
+        count = self.count + 1
+        if count < self.length:
+            return count, self.seed_total + x, math.nan
+        if count == self.length:
+            return count, self.seed_total + x, (self.seed_total + x) / self.length
+        return count, self.seed_total, self.alpha * x + (1 - self.alpha) * self.value
+
+    def push(self, x):
+        self.count, self.seed_total, self.value = self._advance(x)
+        self.inputs.append(x)
+
+    def next_value(self, x):
+        return self._advance(x)[2]
+
+    def update(self, bar):
+        self.push(bar[3])
+
+    def peek(self, bar):
+        return self.next_value(bar[3])
+
+    def drop(self, count):
+        for _ in range(count):
+            if self.count > self.length:
+                # The seed moves one input on and the recursion loses its first step:
+                # value = decay^steps * seed + sum(alpha * decay^(steps - j) * x_j)
+                steps = self.count - self.length
+                seed = self.seed_total / self.length
+                self.seed_total += self.inputs[self.length] - self.inputs[0]
+                self.value += self.decay ** (steps - 1) * (
+                    self.seed_total / self.length - self.alpha * self.inputs[self.length] - self.decay * seed)
+            else:
+                self.seed_total -= self.inputs[0]
+                self.value = math.nan
+            self.inputs.popleft()
+            self.count -= 1
+        # Replay once per window so floating point drift of the adjustments stays bounded
+        self.since_replay += count
+        if self.since_replay >= len(self.inputs):
+            inputs, self.inputs = self.inputs, deque()
+            self.count, self.seed_total, self.value, self.since_replay = 0, 0.0, math.nan, 0
+            for x in inputs:
+                self.push(x)
+
+
+class StreamingRMA:
+    """Wilder smoothing as pandas computes ewm(alpha=1/length, min_periods=length).mean()."""
+
+    def __init__(self, length):
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.count = 0
+        self.numerator = 0.0
+        self.denominator = 0.0
+        self.inputs = deque()
+        self.since_resum = 0
+
+    def _advance(self, x):
+        return self.count + 1, x + self.decay * self.numerator, 1.0 + self.decay * self.denominator
+
+    def push(self, x):
+        self.count, self.numerator, self.denominator = self._advance(x)
+        self.inputs.append(x)
+
+    def next_value(self, x):
+        count, numerator, denominator = self._advance(x)
+        return numerator / denominator if count >= self.length else math.nan
+
+    def drop(self, count):
+        # The oldest input carries weight decay^(count - 1) in both sums
+        for _ in range(count):
+            weight = self.decay ** (self.count - 1)
+            self.numerator -= weight * self.inputs.popleft()
+            self.denominator -= weight
+            self.count -= 1
+        self.since_resum += count
+        if self.since_resum >= len(self.inputs):
+            weights = [self.decay ** age for age in range(len(self.inputs) - 1, -1, -1)]
+            self.numerator = math.fsum(weight * x for weight, x in zip(weights, self.inputs))
+            self.denominator = math.fsum(weights)
+            self.since_resum = 0
+
+
+class StreamingRSI:
+    def __init__(self, length):
+        self.gains = StreamingRMA(length)
+        self.losses = StreamingRMA(length)
+        self.prev_close = None
+
+    def _moves(self, close):
+        change = close - self.prev_close
+        return max(change, 0.0), max(-change, 0.0)
+
+    def update(self, bar):
+        if self.prev_close is not None:
+            gain, loss = self._moves(bar[3])
+            self.gains.push(gain)
+            self.losses.push(loss)
+        self.prev_close = bar[3]
+
+    def peek(self, bar):
+        if self.prev_close is None:
+            return math.nan
+        gain, loss = self._moves(bar[3])
+        avg_gain, avg_loss = self.gains.next_value(gain), self.losses.next_value(loss)
+        if avg_gain + avg_loss == 0:
+            # Flat prices: pandas_ta divides 0 by 0
+            return math.nan
+        return 100.0 * avg_gain / (avg_gain + avg_loss)
+
+    def drop(self, count):
+        # The new first bar has no previous close, so the moves into the dropped bars' successors go too
+        self.gains.drop(count)
+        self.losses.drop(count)
+
+
+class StreamingATR:
+    def __init__(self, length):
+        self.ranges = StreamingRMA(length)
+        self.prev_close = None
+
+    def _true_range(self, bar):
+        high, low = bar[1], bar[2]
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    def update(self, bar):
+        if self.prev_close is not None:
+            self.ranges.push(self._true_range(bar))
+        self.prev_close = bar[3]
+
+    def peek(self, bar):
+        if self.prev_close is None:
+            return math.nan
+        return self.ranges.next_value(self._true_range(bar))
+
+    def drop(self, count):
+        # The first true range of a frame is undefined, as in pandas_ta
+        self.ranges.drop(count)
+
+
+class StreamingOBV:
+    def __init__(self):
+        self.total = 0.0
+        self.prev_close = None
+        self.signed = deque()  # signed volume of each committed bar
+        self.volumes = deque()
+        self.since_resum = 0
+
+    def _signed_volume(self, bar):
+        close, volume = bar[3], bar[4]
+        if self.prev_close is None or close > self.prev_close:
+            return volume
+        if close < self.prev_close:
+            return -volume
+        return 0.0
+
+    def update(self, bar):
+        signed = self._signed_volume(bar)
+        self.total += signed
+        self.signed.append(signed)
+        self.volumes.append(bar[4])
+        self.prev_close = bar[3]
+
+    def peek(self, bar):
+        return self.total + self._signed_volume(bar)
+
+    def drop(self, count):
+        for _ in range(count):
+            self.total -= self.signed.popleft()
+            self.volumes.popleft()
+            # The new first bar has no previous close and counts its whole volume
+            self.total += self.volumes[0] - self.signed[0]
+            self.signed[0] = self.volumes[0]
+        self.since_resum += count
+        if self.since_resum >= len(self.signed):
+            self.total = math.fsum(self.signed)
+            self.since_resum = 0
+
+
+class StreamingMACD:
+    def __init__(self, fast, slow, signal):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal = StreamingEMA(signal)
+
+    def update(self, bar):
+        self.fast.update(bar)
+        self.slow.update(bar)
+        macd = self.fast.value - self.slow.value
+        # The signal EMA starts at the first defined MACD value
+        if not math.isnan(macd):
+            self.signal.push(macd)
+
+    def peek(self, bar):
+        macd = self.fast.peek(bar) - self.slow.peek(bar)
+        signal = self.signal.next_value(macd) if not math.isnan(macd) else math.nan
+        return {'macd_line': macd, 'signal_line': signal, 'histogram': macd - signal}
+
+
+class StreamingBollinger:
+    def __init__(self, length, stddev):
+        self.length = length
+        self.stddev = stddev
+        self.window = deque()
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.since_resum = 0
+
+    def update(self, bar):
+        close = bar[3]
+        if len(self.window) == self.length:
+            dropped = self.window.popleft()
+            self.total -= dropped
+            self.total_squares -= dropped * dropped
+        self.window.append(close)
+        self.total += close
+        self.total_squares += close * close
+        self.since_resum += 1
+        if self.since_resum >= self.length:
+            self.total = math.fsum(self.window)
+            self.total_squares = math.fsum(value * value for value in self.window)
+            self.since_resum = 0
+
+    def peek(self, bar):
+        close = bar[3]
+        size = len(self.window) + 1
+        total, total_squares = self.total + close, self.total_squares + close * close
+        if size > self.length:
+            dropped = self.window[0]
+            total -= dropped
+            total_squares -= dropped * dropped
+            size = self.length
+        if size < self.length:
+            return {'upper_band': math.nan, 'middle_band': math.nan, 'lower_band': math.nan}
+        mean = total / self.length
+        deviation = self.stddev * math.sqrt(max(total_squares / self.length - mean * mean, 0.0))
+        return {'upper_band': mean + deviation, 'middle_band': mean, 'lower_band': mean - deviation}
+
+    def drop(self, count):
+        # Only the last `length` bars count, and the frame always has that many
+        pass
+
+
+# Indicator name -> factory(coerced parameters)
+STREAMING_INDICATORS = {
+    'moving_average': lambda p: StreamingSMA(p['length']),
+    'ema': lambda p: StreamingEMA(p['length']),
+    'rsi': lambda p: StreamingRSI(p['length']),
+    'atr': lambda p: StreamingATR(p['length']),
+    'obv': lambda p: StreamingOBV(),
+    'macd': lambda p: StreamingMACD(p['fast_period'], p['slow_period'], p['signal_period']),
+    'bollinger_bands': lambda p: StreamingBollinger(p['length'], p['stddev']),
+}
+
+
+class StreamingState:
+    def __init__(self, indicator, first):
+        self.indicator = indicator
+        self.first = first  # timestamp of the first bar `indicator` covers
+        self.last_committed = None  # timestamp of the last bar fed to `indicator.update`
+        self.size = 0  # bars `indicator` covers
+        self.updates = 0
+
+
+class StreamingEngine:
+    """
+    Keeps rolling indicator state per (symbol, timeframe, indicator, parameters) between runs.
+
+    The last bar of a frame may still be in progress, so it is only peeked at; it is committed once a newer
+    bar shows up. Each call therefore costs O(new bars). Frames covering a fixed period start later as they
+    gain bars; the bars that left the frame are dropped from the state so values stay those of the frame.
+    A cold start, a frame that no longer contains the last committed bar (a gap, a reset series) or that
+    starts earlier, and an indicator that cannot drop bars (MACD) replay the whole frame.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.cold_starts = 0
+        self.incremental = 0
+        self.rebases = 0
+
+    def supports(self, indicator_name):
+        return indicator_name in STREAMING_INDICATORS
+
+    def calculate(self, symbol, timeframe, indicator_name, df, line=None, parameters=None):
+        """Same as calculate_indicator for streaming indicators, updating the stored state."""
+        spec = get_indicator_spec(indicator_name)
+        factory = STREAMING_INDICATORS.get(spec.name)
+        if factory is None:
+            raise ValueError(f"Indicator '{indicator_name}' has no streaming implementation.")
+        params = spec.coerce_parameters(parameters or {})
+        spec.check_frame(df, params)
+
+        columns = [df[column].to_numpy(dtype=float) if column in df.columns else None
+                   for column in ('open', 'high', 'low', 'close', 'volume')]
+
+        def bar(position):
+            return tuple(values[position] if values is not None else math.nan for values in columns)
+
+        key = (symbol, timeframe, spec.name, tuple(sorted(params.items())))
+        with self._lock:
+            state = self._states.get(key)
+            start = self._resume_position(state, df.index)
+            if start is not None and not self._rebase(state, df.index, start):
+                start = None
+            if start is None:
+                state = StreamingState(factory(params), df.index[0])
+                start = 0
+                self.cold_starts += 1
+            else:
+                self.incremental += 1
+
+            # Commit every closed bar we have not seen yet, keep the last one open
+            for position in range(start, len(df) - 1):
+                state.indicator.update(bar(position))
+                state.size += 1
+                state.updates += 1
+            if len(df) > 1:
+                state.last_committed = df.index[-2]
+
+            values = state.indicator.peek(bar(len(df) - 1))
+
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+
+        if isinstance(values, dict):
+            # Map line names to result columns so line aliases and defaults behave like the full computation
+            by_column = {spec.lines[name].format(**params): value for name, value in values.items()}
+            return float(by_column[spec.resolve_column(line.lower() if line else None, params)])
+        return float(values)
+
+    @staticmethod
+    def _resume_position(state, index):
+        """Position of the first uncommitted bar in `index`, or None when the state cannot be resumed."""
+        if state is None or state.last_committed is None:
+            return None
+        position = index.searchsorted(state.last_committed)
+        if position >= len(index) - 1 or index[position] != state.last_committed:
+            return None
+        return position + 1
+
+    def _rebase(self, state, index, start):
+        """
+        Drops the committed bars that are no longer in the frame. `start` bars of the frame are committed,
+        so the state covers `state.size - start` bars before it.
+
+        Returns:
+            bool: False if the state cannot be rebased onto the frame and must be replayed.
+        """
+        dropped = state.size - start
+        if dropped == 0:
+            return index[0] == state.first
+        if dropped < 0 or not hasattr(state.indicator, 'drop'):
+            return False
+        state.indicator.drop(dropped)
+        state.size = start
+        state.first = index[0]
+        self.rebases += 1
+        return True
+
+    def discard(self, symbol):
+        with self._lock:
+            for key in [key for key in self._states if key[0] == symbol]:
+                del self._states[key]
+
+    def stats(self):
+        with self._lock:
+            return {'cold_starts': self.cold_starts, 'incremental': self.incremental, 'rebases': self.rebases,
+                    'entries': len(self._states)}
+
+
+_engine = StreamingEngine()
+
+
+def get_streaming_engine():
+    """Returns the process-wide StreamingEngine, or None when STREAMING_INDICATORS_ENABLED is off."""
+    if not getattr(settings, 'STREAMING_INDICATORS_ENABLED', False):
+        return None
+    return _engine
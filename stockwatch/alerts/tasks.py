@@ -1,27 +1,38 @@
 # alerts/tasks.py
 import re
-from celery import shared_task
+from celery import chord, group, shared_task
+from celery.signals import before_task_publish
 from django.utils import timezone
-from .utils import get_stock_data, calculate_indicator
-from django.core.exceptions import ObjectDoesNotExist
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from datetime import datetime
 
-import pandas as pd
-import math
-
-from .models import Alert, IndicatorChainAlert, IndicatorCondition, Indicator
 from .notifications import send_sms_notification, send_push_notification
-
-import re
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.conf import settings
-from datetime import datetime
+from .cache import get_bar_cache
+from .chains import ChainProgram, get_indicator_frame
+from .fetcher import get_market_data_fetcher
+from .singleflight import get_single_flight
+from .indicators import IndicatorResultCache
+from .leases import RedisLease, get_run_metrics, record_run_event
+from .streaming import get_streaming_engine
+from .thresholds import PercentChangeIndex, PriceTargetIndex
+from .updates import AlertUpdateBuffer
+from .vectorized import BATCH_MIN_SYMBOLS, SharedIndicatorBatch
+from .planner import (
+    PRICE_DATA_INTERVAL,
+    PRICE_DATA_PERIOD,
+    FrameSet,
+    build_evaluation_plan,
+    defer_closed_market_alerts,
+    get_chain_conditions,
+    get_next_check_at,
+    get_percentage_change,
+    get_percentage_change_period,
+    load_due_alerts,
+    partition_due_alerts,
+)
 
 def send_alert_notification(alert, current_value):
     user = alert.user
@@ -40,7 +51,7 @@ def send_alert_notification(alert, current_value):
         email_context["current_value"] = current_value
         subject = f"Stock Alert Triggered for {stock.symbol}"
     elif alert.alert_type == "PERCENT_CHANGE":
-        percentage_change_alert = alert.percentage_change_alert
+        percentage_change_alert = alert.percentage_change
         email_context["alert_type"] = "PERCENT_CHANGE"
         email_context["percentage_change"] = percentage_change_alert.percentage_change
         email_context["direction"] = "Up" if percentage_change_alert.direction == "UP" else "Down"
@@ -48,7 +59,7 @@ def send_alert_notification(alert, current_value):
         email_context["current_value"] = current_value
         subject = f"Stock Alert: Percentage Change for {stock.symbol}"
     elif alert.alert_type == "INDICATOR_CHAIN":
-        conditions = alert.indicator_chain.conditions.all()
+        conditions = get_chain_conditions(alert.indicator_chain)
         condition_results = []
         for condition in conditions:
             result = {
@@ -134,9 +145,9 @@ def build_sms_content(alert, current_value):
             f"Current Value: {current_value}"
         )
     elif alert.alert_type == "PERCENT_CHANGE":
-        pct = alert.percentage_change_alert.percentage_change
-        direction = "Up" if alert.percentage_change_alert.direction == "UP" else "Down"
-        lookback = alert.percentage_change_alert.lookback_period
+        pct = alert.percentage_change.percentage_change
+        direction = "Up" if alert.percentage_change.direction == "UP" else "Down"
+        lookback = alert.percentage_change.lookback_period
         return (
             f"Stock Alert for {stock.symbol}\n"
             f"{pct}% {direction} over {lookback}.\n"
@@ -155,394 +166,340 @@ def build_sms_content(alert, current_value):
             f"Current Value: {current_value}"
         )
 
-@shared_task
-def process_alerts():
+# Per-shard counters summed into the run totals
+RUN_TOTAL_KEYS = ('alerts', 'symbols', 'fetches', 'triggered', 'saved', 'skipped', 'deferred', 'failed')
+
+RUN_LEASE_NAME = 'alerts:run'
+
+
+def run_is_late(scheduled_at, kind):
+    """Counts a run or shard that started more than ALERT_RUN_LATE_AFTER seconds after it was scheduled."""
+    delay = (timezone.now() - scheduled_at).total_seconds()
+    if delay > getattr(settings, 'ALERT_RUN_LATE_AFTER', 60):
+        print(f"[DEBUG] {kind} started {delay:.0f}s after {scheduled_at}.")
+        record_run_event(f'late_{kind}')
+
+
+def defer_or_skip(task, scheduled_at, kind, retry_kwargs=None):
+    """
+    Applies ALERT_RUN_OVERLAP_POLICY when the lease of a run or shard is still held by an earlier one.
+
+    'queue' retries the task until ALERT_RUN_QUEUE_MAX_WAIT seconds after it was scheduled, 'skip' (and
+    'queue' past that wait) drops it; the alerts stay due and are picked up by the next run.
+    """
+    waited = (timezone.now() - scheduled_at).total_seconds()
+    policy = getattr(settings, 'ALERT_RUN_OVERLAP_POLICY', 'skip')
+    if policy == 'queue' and waited < getattr(settings, 'ALERT_RUN_QUEUE_MAX_WAIT', 60):
+        record_run_event(f'queued_{kind}')
+        raise task.retry(kwargs=retry_kwargs, countdown=getattr(settings, 'ALERT_RUN_QUEUE_RETRY_DELAY', 5),
+                         max_retries=None)
+    print(f"[DEBUG] Skipping {kind} scheduled at {scheduled_at}: the previous one still holds its lease.")
+    record_run_event(f'skipped_{kind}')
+
+
+@before_task_publish.connect(sender='alerts.tasks.process_alerts')
+def stamp_scheduled_at(body=None, **kwargs):
+    """
+    Records when beat (or any other caller) sent a run, so a run picked up late by a busy worker measures its
+    delay from the beat fire time rather than from when it started. Retries keep the time they were given.
+    """
+    # Message protocol 2: body is (args, kwargs, embed)
+    if isinstance(body, (tuple, list)) and len(body) > 1 and isinstance(body[1], dict):
+        body[1].setdefault('scheduled_at', timezone.now().isoformat())
+
+
+@shared_task(bind=True)
+def process_alerts(self, scheduled_at=None):
     print('Processing alerts ...')
     now = timezone.now()
-    active_alerts = Alert.objects.filter(is_active=True)
-
-    for alert in active_alerts:
-        print(f'Alert {alert.id} for {alert.stock.symbol} is active.')
-
-        # Determine check_interval
-        if alert.alert_type == 'PRICE':
-            check_interval = alert.price_target_alert.check_interval
-        elif alert.alert_type == 'PERCENT_CHANGE':
-            check_interval = alert.percentage_change.check_interval
-        elif alert.alert_type == 'INDICATOR_CHAIN':
-            check_interval = alert.indicator_chain.check_interval
-        else:
-            check_interval = 1
+    # Sent runs carry their publish time (see stamp_scheduled_at) or an eta; only direct calls start "on time"
+    scheduled_at = scheduled_at or self.request.eta or now.isoformat()
+    if isinstance(scheduled_at, datetime):
+        scheduled_at = scheduled_at.isoformat()
+
+    # Only one dispatcher at a time; with a chord the lease is held until the last shard has finished
+    run_lease = RedisLease(RUN_LEASE_NAME, getattr(settings, 'ALERT_RUN_LEASE_TTL', 300))
+    if not run_lease.acquire():
+        defer_or_skip(self, datetime.fromisoformat(scheduled_at), 'runs', retry_kwargs={'scheduled_at': scheduled_at})
+        return
+    record_run_event('runs')
+    run_is_late(datetime.fromisoformat(scheduled_at), 'runs')
+
+    # Alerts on closed markets wait for the next session instead of being checked every minute
+    closed = defer_closed_market_alerts(now)
+    if closed:
+        print(f"[DEBUG] Deferred {closed} due alerts to their market's next session.")
+        record_run_event('closed_market_alerts', closed)
+
+    shard_count = max(1, getattr(settings, 'ALERT_SHARD_COUNT', 1))
+    # One range scan for ids and symbols; each shard then loads its own alerts with the full query plan
+    shards = partition_due_alerts(now, shard_count)
+    due_count = sum(len(alert_ids) for alert_ids in shards.values())
+    print(f"[DEBUG] Dispatching {due_count} due alerts to {len(shards)} of {shard_count} shards.")
+    if not shards:
+        run_lease.release()
+        return
 
-        last_checked = alert.last_triggered_at or alert.created_at
-        if (now - last_checked).total_seconds() >= check_interval * 60:
-            print(f"[DEBUG] It's time to process alert {alert.id} (type: {alert.alert_type})")
-            process_single_alert(alert)  # Removed data from here
-            alert.last_triggered_at = now
-            alert.save()
-        else:
-            print(
-                f"[DEBUG] Not time yet to process alert {alert.id}. Last checked: {last_checked}, interval: {check_interval} minutes.")
-
-
-def process_single_alert(alert):
-    print(f"[DEBUG] process_single_alert called for Alert {alert.id}, type: {alert.alert_type}")
-    if alert.alert_type == 'PRICE':
-        # Fetch data with the correct timeframe for PRICE alerts
-        data = get_stock_data(alert.stock.symbol, period='1d', interval='1m')  # Example
-        process_price_target_alert(alert, data)
-    elif alert.alert_type == 'PERCENT_CHANGE':
-        # Fetch data for percentage change alerts
-        data = get_stock_data(alert.stock.symbol, ...) # timeframe based on alert config
-        process_percentage_change_alert(alert, data)
-    elif alert.alert_type == 'INDICATOR_CHAIN':
-        # No data fetched here. Let process_indicator_chain handle it.
-        process_indicator_chain_alert(alert)
-
-
-def process_price_target_alert(alert, data):
-    current_price = data['close'].iloc[-1]
-    target_price = alert.price_target_alert.target_price
-    condition = alert.price_target_alert.condition
-
-    condition_met = (condition == 'GT' and current_price > target_price) or \
-                    (condition == 'LT' and current_price < target_price)
-
-    if condition_met:
-        send_alert_notification(alert, current_price)
-        alert.is_active = False  # Deactivate the alert after triggering
-        alert.save()
-
-
-def process_percentage_change_alert(alert, data):
-    print('Processing percentage change alert ...')
-    percentage_change_alert = alert.percentage_change
-    direction = percentage_change_alert.direction
-    target_change = float(percentage_change_alert.percentage_change)
-    lookback_period = percentage_change_alert.lookback_period
-    custom_days = percentage_change_alert.custom_lookback_days or 1
-
-    # Determine the lookback period in days
-    period_map = {
-        '5Min': '5m', '15Min': '15m', '30Min': '30m', '60Min': '60m',
-        '1D': '1d', '1W': '1wk', '1M': '1mo', '3M': '3mo'
-    }
-    period = period_map.get(lookback_period, '1d')
+    shard_tasks = group(
+        evaluate_alert_shard.s(shard, alert_ids, now.isoformat()) for shard, alert_ids in sorted(shards.items())
+    )
+    if getattr(settings, 'ALERT_SHARD_USE_CHORD', False):
+        chord(shard_tasks)(summarize_alert_run.s(now.isoformat(), run_lease.token))
+    else:
+        shard_tasks.apply_async()
+        # Shards guard themselves with their own leases
+        run_lease.release()
 
-    # Fetch historical data for the lookback period
-    data = get_stock_data(alert.stock.symbol, period=period)
-    print(f'Fetched data : {data}')
 
-    initial_price = data['open'].iloc[0]
-    print(f'Initial Price  : {initial_price}')
+@shared_task(bind=True)
+def evaluate_alert_shard(self, shard, alert_ids, run_at):
+    """Evaluates one shard of a scheduler run: the due alerts of every symbol hashed to `shard`."""
+    now = datetime.fromisoformat(run_at)
+    lease = RedisLease(f"alerts:shard:{shard}", getattr(settings, 'ALERT_SHARD_LEASE_TTL', 300))
+    if not lease.acquire():
+        defer_or_skip(self, now, 'shards')
+        return {'shard': shard, 'skipped': 1}
 
-    current_price = data['close'].iloc[0]
-    print(f'Current Price  : {current_price}')
+    try:
+        run_is_late(now, 'shards')
+        totals = evaluate_alerts(load_due_alerts(now, alert_ids), now, lease=lease)
+    except Exception as e:
+        # A failed shard would keep the chord callback, and with it the run lease release, from running; its
+        # alerts stay due for the next run
+        print(f"[DEBUG] Shard {shard} of run {run_at} failed: {e}")
+        record_run_event('failed_shards')
+        totals = {'failed': 1}
+    finally:
+        lease.release()
+    totals['shard'] = shard
+    print(f"[DEBUG] Shard {shard} of run {run_at}: {totals}")
+    return totals
 
-    actual_change = ((current_price - initial_price) / initial_price) * 100
 
-    condition_met = False
-    if direction == 'UP' and actual_change >= target_change:
-        condition_met = True
-    elif direction == 'DOWN' and actual_change <= -target_change:
-        condition_met = True
+@shared_task
+def summarize_alert_run(shard_totals, run_at, run_lease_token=None):
+    """Chord callback adding up the totals of every shard of a run and releasing the run lease."""
+    if run_lease_token:
+        RedisLease(RUN_LEASE_NAME, getattr(settings, 'ALERT_RUN_LEASE_TTL', 300), token=run_lease_token).release()
 
-    if condition_met:
-        send_alert_notification(alert, actual_change)
-        alert.is_active = False  # Deactivate the alert after triggering
-        alert.save()
+    totals = {key: sum(shard.get(key, 0) for shard in shard_totals) for key in RUN_TOTAL_KEYS}
+    totals['shards'] = len(shard_totals)
+    totals['seconds'] = (timezone.now() - datetime.fromisoformat(run_at)).total_seconds()
+    print(f"[DEBUG] Alert run {run_at} totals: {totals}")
+    print(f"[DEBUG] Scheduler metrics: {get_run_metrics()}")
+    return totals
 
 
-def resample_data(df, timeframe):
+def evaluate_alerts(due_alerts, now, lease=None):
     """
-    Resample the DataFrame according to the specified timeframe.
+    Evaluates `due_alerts` and records the run on each of them.
 
-    Args:
-        df (pd.DataFrame): Original DataFrame with datetime index.
-        timeframe (str): Timeframe string, e.g., '1MIN', '5MIN', '1H', '1D'
+    `lease`, if given, is extended after every symbol so a long shard keeps it.
 
     Returns:
-        pd.DataFrame: Resampled DataFrame.
+        dict: Counters for RUN_TOTAL_KEYS.
     """
-    timeframe_map = {
-        '1MIN': '1min',
-        '5MIN': '5min',
-        '15MIN': '15min',
-        '30MIN': '30min',
-        '1H': '1H',
-        '4H': '4H',
-        '1D': '1D',
+    for alert in due_alerts:
+        print(f"[DEBUG] It's time to process alert {alert.id} for {alert.stock.symbol} (type: {alert.alert_type})")
+
+    # Group due alerts by symbol and required frames so each frame is fetched once per run
+    plan = build_evaluation_plan(due_alerts)
+    fetcher = get_market_data_fetcher()
+    frames = FrameSet(fetch=fetcher.get_stock_data)
+    indicator_results = IndicatorResultCache(streaming=get_streaming_engine())
+    updates = AlertUpdateBuffer()
+    # Every chain of the run compiled into one DAG of unique indicator and comparison nodes
+    chains = ChainProgram()
+    for alert in due_alerts:
+        if alert.alert_type == 'INDICATOR_CHAIN':
+            chains.add(alert)
+    print(f"[DEBUG] Compiled indicator chains: {chains.stats()}")
+    # Indicator configs shared by many symbols are computed once across all of them
+    precomputed = precompute_shared_indicators(chains, frames, indicator_results, fetcher.fetch)
+    print(f"[DEBUG] Precomputed {precomputed} shared indicator values.")
+    # Symbols are evaluated as soon as their frames are in, while the others keep downloading
+    # Symbols with the most due alerts are fetched first
+    by_priority = sorted(plan.items(), key=lambda item: len(item[1].alerts), reverse=True)
+    ready = frames.stream({symbol: group.eager_frames() for symbol, group in by_priority}, fetcher.fetch)
+    deferred = 0
+    for symbol in ready:
+        symbol_group = plan[symbol]
+        alerts, missing_data = symbol_group.split_by_data(frames)
+        if missing_data:
+            # Left due, so the next run checks them again instead of the check being skipped silently
+            print(f"[DEBUG] Deferring {len(missing_data)} alerts for {symbol}: no data could be fetched.")
+            deferred += len(missing_data)
+        print(f"[DEBUG] Evaluating {len(alerts)} alerts for {symbol} against {len(symbol_group.frames)} shared frames.")
+        # Threshold alerts are evaluated through their indexes, chains through the shared chain DAG
+        price_alerts = [alert for alert in alerts if alert.alert_type == 'PRICE']
+        if price_alerts:
+            process_price_target_alerts(symbol, price_alerts, frames, updates)
+        change_alerts = [alert for alert in alerts if alert.alert_type == 'PERCENT_CHANGE']
+        if change_alerts:
+            process_percentage_change_alerts(symbol, change_alerts, frames, updates)
+        chain_alerts = [alert for alert in alerts if alert.alert_type == 'INDICATOR_CHAIN']
+        if chain_alerts:
+            process_indicator_chain_alerts(symbol, chain_alerts, chains, frames, indicator_results, updates)
+        for alert in alerts:
+            alert.last_triggered_at = now
+            alert.next_check_at = get_next_check_at(alert)
+            updates.add(alert, 'last_triggered_at', 'next_check_at')
+        if updates.pending_notifications:
+            # Triggered alerts are written before their users hear about them
+            updates.flush()
+        frames.discard(symbol)
+        indicator_results.discard(symbol)
+        if lease is not None:
+            lease.extend()
+    updates.flush()
+    if deferred:
+        record_run_event('deferred_alerts', deferred)
+
+    print(f"[DEBUG] Saved {updates.flushed_alerts} alerts in {updates.statements} bulk updates.")
+    print(f"[DEBUG] Evaluated {len(due_alerts)} alerts across {len(plan)} symbols with {frames.fetch_count} data fetches.")
+    print(f"[DEBUG] Bar cache stats: {get_bar_cache().stats()}")
+    print(f"[DEBUG] Market data fetcher stats: {fetcher.stats()}")
+    print(f"[DEBUG] Single-flight fetch stats: {get_single_flight().stats()}")
+    print(f"[DEBUG] Indicator result cache stats: {indicator_results.stats()}")
+    print(f"[DEBUG] Indicator chain stats: {chains.stats()}")
+    if indicator_results.streaming is not None:
+        print(f"[DEBUG] Streaming indicator stats: {indicator_results.streaming.stats()}")
+
+    return {
+        'alerts': len(due_alerts),
+        'symbols': len(plan),
+        'fetches': frames.fetch_count,
+        'triggered': sum(1 for alert in due_alerts if not alert.is_active),
+        'saved': updates.flushed_alerts,
+        'deferred': deferred,
     }
-    resample_freq = timeframe_map.get(timeframe)
-    if resample_freq:
-        resampled_data = df.resample(resample_freq).agg({
-            'open': 'first',
-            'high': 'max',
-            'low': 'min',
-            'close': 'last',
-            'volume': 'sum',
-        }).dropna()
-        return resampled_data
-    else:
-        raise ValueError(f"Unknown timeframe: {timeframe}")
 
 
-def get_valid_period(required_days):
+def precompute_shared_indicators(chains, frames, indicator_results, fetch_all):
     """
-    Maps the required number of days to the closest valid yfinance period that meets or exceeds the required days.
+    Computes indicator nodes of `chains` whose config is used by many symbols in one vectorized pass and
+    stores the values in `indicator_results`, where the chain evaluation picks them up.
+
+    The frames of those nodes are downloaded first, concurrently; chain frames are otherwise fetched
+    lazily, only by the chains that reach them.
 
     Args:
-        required_days (int): The number of days required for the indicator calculation.
+        fetch_all (callable): fetch_all(keys) -> iterator of (key, frame), e.g. MarketDataFetcher.fetch.
 
     Returns:
-        str: A valid yfinance period string.
+        int: Number of values precomputed.
     """
-    # Define valid yfinance periods with their approximate day equivalents
-    period_days = [
-        ('1d', 1),
-        ('5d', 5),
-        ('1mo', 30),
-        ('3mo', 90),
-        ('6mo', 180),
-        ('1y', 365),
-        ('2y', 730),
-        ('5y', 1825),
-        ('10y', 3650),
-        ('ytd', None),  # Special case: Year-to-date
-        ('max', None)    # Special case: Maximum available data
-    ]
-
-    for period, days in period_days:
-        if days and days >= required_days:
-            return period
-    # If required_days exceed the largest defined period, return 'max'
-    return 'max'
-
-
-def process_indicator_chain_alert(alert):
-    print(f"[DEBUG] process_indicator_chain_alert called for Alert {alert.id}, Symbol: {alert.stock.symbol}")
+    by_config = {}
+    for node in chains.indicator_nodes():
+        config = (node.timeframe, node.indicator_name, tuple(sorted(node.parameters.items())))
+        by_config.setdefault(config, []).append(node)
+    nodes = [node for config_nodes in by_config.values()
+             if len({node.symbol for node in config_nodes}) >= BATCH_MIN_SYMBOLS for node in config_nodes]
+    if not nodes:
+        return 0
+
+    keys_per_symbol = {}
+    for node in nodes:
+        interval, period, _ = chains.get_requirements(node.symbol)[node.timeframe]
+        keys_per_symbol.setdefault(node.symbol, set()).add((node.symbol, interval, period))
+    for _ in frames.stream(keys_per_symbol, fetch_all):
+        pass
+
+    batch = SharedIndicatorBatch()
+    for node in nodes:
+        try:
+            requirement = chains.get_requirements(node.symbol)[node.timeframe]
+            data = get_indicator_frame(frames, node, requirement)
+            batch.add(node.symbol, node.timeframe, node.indicator_name, data, node.line, node.parameters)
+        except Exception as e:
+            print(f"[DEBUG] Skipping {node.key} in the shared indicator pass: {e}")
+    return batch.run(indicator_results)
 
-    try:
-        indicator_chain_alert = alert.indicator_chain
-    except ObjectDoesNotExist:
-        print(f"[DEBUG] No IndicatorChainAlert associated with alert {alert.id}")
-        return
 
-    conditions = indicator_chain_alert.conditions.all().order_by('position_in_chain')
-    print(f"[DEBUG] Indicator chain has {conditions.count()} conditions for Alert {alert.id}.")
+def trigger_alert(alert, current_value, updates=None):
+    """
+    Deactivates a triggered alert and notifies its user. During a scheduler run the notification is only
+    sent once `updates` has written the deactivation.
+    """
+    deactivate_alert(alert, updates)
+    if updates is None:
+        send_alert_notification(alert, current_value)
+    else:
+        updates.notify(lambda: send_alert_notification(alert, current_value))
 
-    all_conditions_met = True
 
-    # Define data points per day for each timeframe
-    data_points_per_day = {
-        '1MIN': 390,   # Assuming 6.5 trading hours
-        '5MIN': 78,
-        '15MIN': 26,
-        '30MIN': 13,
-        '1H': 6,
-        '4H': 1,
-        '1D': 1
-    }
+def deactivate_alert(alert, updates=None):
+    """Deactivates a triggered alert, buffered in `updates` during a scheduler run."""
+    alert.is_active = False
+    if updates is None:
+        alert.save(update_fields=['is_active'])
+    else:
+        updates.add(alert, 'is_active')
 
-    # Determine maximum required length per timeframe
-    max_length_per_timeframe = {}
-    for condition in conditions:
-        timeframe = condition.indicator_timeframe
-        length = condition.indicator_parameters.get('length', 14)
-        if timeframe in max_length_per_timeframe:
-            if length > max_length_per_timeframe[timeframe]:
-                max_length_per_timeframe[timeframe] = length
-        else:
-            max_length_per_timeframe[timeframe] = length
-
-    # Calculate required number of days per timeframe using the helper function
-    required_data = {}
-    for timeframe, max_length in max_length_per_timeframe.items():
-        points_per_day = data_points_per_day.get(timeframe, 390)  # Default to '1MIN' data points
-        required_days = math.ceil(max_length / points_per_day)
-        # Add a buffer of 10% to ensure data sufficiency
-        buffer_days = max(1, math.ceil(required_days * 0.1))
-        total_days = required_days + buffer_days
-        # Use the helper function to get a valid period
-        valid_period = get_valid_period(total_days)
-        required_data[timeframe] = valid_period
-
-    # Fetch data per timeframe and cache it
-    data_cache = {}
-    for timeframe, period in required_data.items():
-        interval = {
-            '1MIN': '1m',
-            '5MIN': '5m',
-            '15MIN': '15m',
-            '30MIN': '30m',
-            '1H': '60m',
-            '4H': '240m',
-            '1D': '1d'
-        }.get(timeframe, '1d')  # Default to '1d' if timeframe not found
 
-        try:
-            main_data = get_stock_data(alert.stock.symbol, period=period, interval=interval)
-            if main_data.empty:
-                print(f"[DEBUG] No main data returned for {alert.stock.symbol} with timeframe {timeframe}. Condition cannot be met.")
-                all_conditions_met = False
-                break
-            print(f"[DEBUG] Main data fetched for {alert.stock.symbol} with timeframe {timeframe}, period: {period}, tail:")
-            print(main_data.tail())
-            data_cache[timeframe] = main_data
-        except Exception as e:
-            print(f"[DEBUG] Error fetching main data for {alert.stock.symbol} with timeframe {timeframe}: {e}")
-            all_conditions_met = False
-            break
+def process_price_target_alerts(symbol, alerts, frames, updates=None):
+    """
+    Evaluates the due PRICE alerts of `symbol` against its last price in one lookup on a price target
+    index built from them.
 
-    if not data_cache:
-        print(f"[DEBUG] No data fetched for any timeframe. Cannot process alert {alert.id}.")
-        return
+    Args:
+        symbol (str): Ticker shared by `alerts`.
+        alerts (list): Due PRICE alerts of `symbol`.
+        frames (FrameSet): Frames of the current run.
+        updates (AlertUpdateBuffer): Buffer for the deactivations and notifications, if any.
+    """
+    data = frames.get(symbol, period=PRICE_DATA_PERIOD, interval=PRICE_DATA_INTERVAL)
+    current_price = data['close'].iloc[-1]
 
-    # Process each condition using the cached data
-    for condition in conditions:
-        print(f"[DEBUG] Evaluating condition ID: {condition.id}, Position: {condition.position_in_chain}")
-        print(f"[DEBUG] Main indicator: {condition.indicator.display_name} (name: {condition.indicator.name})")
-        print(f"[DEBUG] Main indicator line: {condition.indicator_line}, Timeframe: {condition.indicator_timeframe}")
-        print(f"[DEBUG] Main indicator parameters: {condition.indicator_parameters or {}}")
+    due = {alert.id: alert for alert in alerts}
+    for alert_id in PriceTargetIndex.from_alerts(alerts).triggered(current_price):
+        trigger_alert(due[int(alert_id)], current_price, updates)
 
-        # Retrieve pre-fetched main_data for the condition's timeframe
-        timeframe = condition.indicator_timeframe
-        main_data = data_cache.get(timeframe)
 
-        if main_data is None:
-            print(f"[DEBUG] No data available for timeframe {timeframe}. Condition cannot be met.")
-            all_conditions_met = False
-            break
+def process_percentage_change_alerts(symbol, alerts, frames, updates=None):
+    """
+    Evaluates the due PERCENT_CHANGE alerts of `symbol`: the change is computed once per lookback period
+    and every crossed threshold is found in one lookup on an index of the alerts sharing that period.
 
-        parameters = condition.indicator_parameters or {}
+    Args:
+        symbol (str): Ticker shared by `alerts`.
+        alerts (list): Due PERCENT_CHANGE alerts of `symbol`.
+        frames (FrameSet): Frames of the current run.
+        updates (AlertUpdateBuffer): Buffer for the deactivations and notifications, if any.
+    """
+    by_lookback = {}
+    for alert in alerts:
+        by_lookback.setdefault(alert.percentage_change.lookback_period, {})[alert.id] = alert
 
-        # Calculate the main indicator value (now returning a float directly)
-        try:
-            indicator_value = calculate_indicator(
-                indicator_name=condition.indicator.name,
-                df=main_data,
-                line=condition.indicator_line,
-                parameters=parameters
-            )
-            if indicator_value is None:
-                print("[DEBUG] calculate_indicator returned None for the main indicator. Condition cannot be met.")
-                all_conditions_met = False
-                break
-            print(f"[DEBUG] Main indicator value: {indicator_value}")
-        except Exception as e:
-            print(f"[DEBUG] Error calculating main indicator '{condition.indicator.display_name}': {e}")
-            all_conditions_met = False
-            break
-
-        # Determine the comparison value based on condition's value_type
-        if condition.value_type == 'NUMBER':
-            comparison_value = condition.value_number
-            print(f"[DEBUG] Comparison type: NUMBER, value: {comparison_value}")
-
-        elif condition.value_type == 'PRICE':
-            # Last close value from main_data
-            try:
-                comparison_value = float(main_data['close'].iloc[-1])
-                print(f"[DEBUG] Comparison type: PRICE, last close: {comparison_value}")
-            except (IndexError, ValueError) as e:
-                print(f"[DEBUG] Error retrieving last close price: {e}")
-                all_conditions_met = False
-                break
-
-        elif condition.value_type == 'INDICATOR_LINE':
-            if not condition.value_indicator:
-                print(f"[DEBUG] value_indicator is required but not set for condition {condition.id}")
-                all_conditions_met = False
-                break
-
-            print(f"[DEBUG] Value indicator: {condition.value_indicator.display_name} (name: {condition.value_indicator.name})")
-            print(f"[DEBUG] Value indicator line: {condition.value_indicator_line}, Timeframe: {condition.value_timeframe}")
-            print(f"[DEBUG] Value indicator parameters: {condition.value_indicator_parameters or {}}")
-
-            # Retrieve pre-fetched value_data for the condition's value_timeframe
-            value_timeframe = condition.value_timeframe
-            value_data = data_cache.get(value_timeframe)
-
-            if value_data is None:
-                # Determine the required length for the value_indicator
-                value_length = condition.value_indicator_parameters.get('length', 14)
-                points_per_day_val = data_points_per_day.get(value_timeframe, 390)
-                required_days_val = math.ceil(value_length / points_per_day_val)
-                buffer_days_val = max(1, math.ceil(required_days_val * 0.1))
-                total_days_val = required_days_val + buffer_days_val
-                # Use the helper function to get a valid period
-                valid_period_val = get_valid_period(total_days_val)
-
-                interval_val = {
-                    '1MIN': '1m',
-                    '5MIN': '5m',
-                    '15MIN': '15m',
-                    '30MIN': '30m',
-                    '1H': '60m',
-                    '4H': '240m',
-                    '1D': '1d'
-                }.get(value_timeframe, '1d')  # Default to '1d' if timeframe not found
-
-                try:
-                    value_data = get_stock_data(alert.stock.symbol, period=valid_period_val, interval=interval_val)
-                    if value_data.empty:
-                        print(f"[DEBUG] No value data returned for {alert.stock.symbol} with timeframe {value_timeframe}. Condition cannot be met.")
-                        all_conditions_met = False
-                        break
-                    print(f"[DEBUG] Value indicator data fetched for {alert.stock.symbol} with timeframe {value_timeframe}, period: {valid_period_val}, tail:")
-                    print(value_data.tail())
-                    data_cache[value_timeframe] = value_data  # Cache the fetched value_data
-                except Exception as e:
-                    print(f"[DEBUG] Error fetching value indicator data for {alert.stock.symbol} with timeframe {value_timeframe}: {e}")
-                    all_conditions_met = False
-                    break
-
-            # Calculate the comparison indicator value (also returning a float now)
-            try:
-                comparison_value = calculate_indicator(
-                    indicator_name=condition.value_indicator.name,
-                    df=value_data,
-                    line=condition.value_indicator_line,
-                    parameters=condition.value_indicator_parameters or {}
-                )
-                if comparison_value is None:
-                    print("[DEBUG] calculate_indicator returned None for the comparison indicator. Condition cannot be met.")
-                    all_conditions_met = False
-                    break
-                print(f"[DEBUG] Comparison indicator value: {comparison_value}")
-            except Exception as e:
-                print(f"[DEBUG] Error calculating comparison indicator '{condition.value_indicator.display_name}': {e}")
-                all_conditions_met = False
-                break
-        else:
-            print(f"[DEBUG] Unknown value_type '{condition.value_type}' for condition {condition.id}")
-            all_conditions_met = False
-            break
-
-        # Evaluate the condition based on the operator
-        print(f"[DEBUG] Evaluating condition operator: {condition.condition_operator}")
-        print(f"[DEBUG] Indicator value: {indicator_value}, Comparison value: {comparison_value}")
-
-        if condition.condition_operator == 'GT':
-            condition_met = indicator_value > comparison_value
-        elif condition.condition_operator == 'LT':
-            condition_met = indicator_value < comparison_value
-        elif condition.condition_operator == 'EQ':
-            condition_met = indicator_value == comparison_value
+    for lookback_period, due in by_lookback.items():
+        interval, period = get_percentage_change_period(lookback_period)
+        actual_change = get_percentage_change(frames.get(symbol, period=period, interval=interval), lookback_period)
+        print(f"[DEBUG] {symbol} changed {actual_change:.2f}% over {lookback_period}.")
+        for alert_id in PercentChangeIndex.from_alerts(due.values()).triggered(actual_change):
+            trigger_alert(due[int(alert_id)], actual_change, updates)
+
+
+def process_indicator_chain_alerts(symbol, alerts, chains, frames=None, indicator_results=None, updates=None):
+    """
+    Evaluates the due INDICATOR_CHAIN alerts of `symbol` from the run's compiled ChainProgram.
+
+    Args:
+        symbol (str): Ticker shared by `alerts`.
+        alerts (list): Due INDICATOR_CHAIN alerts of `symbol`, already added to `chains`.
+        chains (ChainProgram): Compiled chains of the current run.
+        frames (FrameSet): Frames of the current run.
+        indicator_results (IndicatorResultCache): Indicator results of the current run.
+        updates (AlertUpdateBuffer): Buffer for the deactivations and notifications, if any.
+    """
+    if frames is None:
+        frames = FrameSet()
+    if indicator_results is None:
+        indicator_results = IndicatorResultCache(streaming=get_streaming_engine())
+
+    results = chains.evaluate(symbol, alerts, frames, indicator_results)
+    for alert in alerts:
+        if results[alert.id]:
+            print(f"[DEBUG] All conditions met for alert {alert.id}, triggering notification.")
+            trigger_alert(alert, "Indicator chain conditions met", updates)
         else:
-            print(f"[DEBUG] Unknown condition operator '{condition.condition_operator}' in condition {condition.id}")
-            all_conditions_met = False
-            break
-
-        print(f"[DEBUG] Condition met: {condition_met}")
-        if not condition_met:
-            all_conditions_met = False
-            break
-
-    if all_conditions_met:
-        print(f"[DEBUG] All conditions met for alert {alert.id}, triggering notification.")
-        send_alert_notification(alert, "Indicator chain conditions met")
-        alert.is_active = False  # Deactivate the alert after triggering
-        alert.save()
-    else:
-        print(f"[DEBUG] Not all conditions were met for alert {alert.id}. No notification triggered.")
+            print(f"[DEBUG] Not all conditions were met for alert {alert.id}. No notification triggered.")
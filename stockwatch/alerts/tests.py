@@ -1,3 +1,1664 @@
-from django.test import TestCase
+import math
+import os
+import tempfile
+from io import StringIO
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import redis
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from .calendars import get_trading_calendar
+from .chains import ChainEvaluation, ChainProgram
+from .fetcher import MarketDataFetcher
+from .bar_store import BarStore, slice_period
+from .cache import BarCache, get_bar_cache, interval_ttl
+from .governor import ADJUST_RATE_SCRIPT, TOKEN_BUCKET_SCRIPT, FetchGovernor, RateLimiter, RedisRateLimiter
+from .leases import EXTEND_SCRIPT, RELEASE_SCRIPT, RedisLease, get_lease_client
+from .indicators import (
+    FastResult,
+    IndicatorParameterError,
+    IndicatorResultCache,
+    check_indicator_definitions,
+    get_indicator_definitions,
+    get_indicator_spec,
+    validate_indicator_parameters,
+)
+from .models import (
+    Alert,
+    IndicatorChainAlert,
+    IndicatorCondition,
+    IndicatorDefinition,
+    PercentageChangeAlert,
+    PriceTargetAlert,
+    Stock,
+)
+from .planner import (
+    FrameSet,
+    defer_closed_market_alerts,
+    get_alert_data_requirements,
+    get_chain_conditions,
+    get_chain_data_requirements,
+    get_check_interval,
+    get_percentage_change,
+    get_symbol_shard,
+    load_due_alerts,
+    partition_due_alerts,
+)
+from .providers import LocalProvider
+from .serializers import IndicatorConditionSerializer
+from .singleflight import SingleFlight, load_many_once
+from .streaming import StreamingEngine
+from .thresholds import PercentChangeIndex, PriceTargetIndex
+from .tasks import (
+    defer_or_skip,
+    evaluate_alert_shard,
+    evaluate_alerts,
+    precompute_shared_indicators,
+    process_alerts,
+    process_percentage_change_alerts,
+    process_price_target_alerts,
+    run_is_late,
+    stamp_scheduled_at,
+    summarize_alert_run,
+    trigger_alert,
+)
+from .timeframes import TimeframeDeriver, resample_data
+from .updates import AlertUpdateBuffer
+from .utils import calculate_indicator, get_stock_data_many
+from .vectorized import BATCH_MIN_SYMBOLS, SharedIndicatorBatch, calculate_batch, rma, rolling_std, stack_frames
+
+
+def make_bars(count=400, seed=7, index=None):
+    """Random-walk OHLCV bars, minute bars from 2024-01-02 09:30 New York time unless `index` is given."""
+    if index is None:
+        index = pd.date_range('2024-01-02 09:30', periods=count, freq='min', tz='America/New_York')
+    count = len(index)
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, count))
+    return pd.DataFrame(
+        {
+            'open': close + rng.normal(0, 0.2, count),
+            'high': close + rng.random(count),
+            'low': close - rng.random(count),
+            'close': close,
+            'volume': rng.integers(100, 10000, count).astype(float),
+        },
+        index=index,
+    )
+
+
+def session_index(days, start='2024-01-02', first_bar='09:30'):
+    """Minute bars of `days` regular US equity sessions, the first one opening at `first_bar`."""
+    sessions = pd.bdate_range(start, periods=days)
+    return pd.DatetimeIndex([
+        minute for day, session in enumerate(sessions)
+        for minute in pd.date_range(f"{session.date()} {first_bar if day == 0 else '09:30'}",
+                                    f"{session.date()} 15:59", freq='min', tz='America/New_York')
+    ])
+
+
+def create_user(username='trader'):
+    return get_user_model().objects.create_user(username=username, email=f"{username}@example.com", password='x')
+
+
+def get_stock(symbol, **fields):
+    return Stock.objects.get_or_create(symbol=symbol, defaults={'name': symbol, **fields})[0]
+
+
+def create_price_alert(user, symbol, target_price=100, condition='GT', check_interval=1):
+    alert = Alert.objects.create(user=user, stock=get_stock(symbol), alert_type='PRICE')
+    PriceTargetAlert.objects.create(
+        alert=alert, target_price=target_price, condition=condition, check_interval=check_interval)
+    return alert
+
+
+def create_percent_change_alert(user, symbol, percentage_change=5, direction='UP', lookback_period='1D',
+                                check_interval=1):
+    alert = Alert.objects.create(user=user, stock=get_stock(symbol), alert_type='PERCENT_CHANGE')
+    PercentageChangeAlert.objects.create(
+        alert=alert, lookback_period=lookback_period, direction=direction, percentage_change=percentage_change,
+        check_interval=check_interval)
+    return alert
+
+
+def create_chain_alert(user, symbol, conditions, check_interval=1):
+    """Creates an INDICATOR_CHAIN alert with one IndicatorCondition per dict of fields in `conditions`."""
+    alert = Alert.objects.create(user=user, stock=get_stock(symbol), alert_type='INDICATOR_CHAIN')
+    chain = IndicatorChainAlert.objects.create(alert=alert, check_interval=check_interval)
+    for position, fields in enumerate(conditions):
+        IndicatorCondition.objects.create(indicator_chain_alert=chain, position_in_chain=position, **fields)
+    return alert
+
+
+STREAMING_CASES = [
+    ('moving_average', None, {'length': 20}),
+    ('ema', None, {'length': 14}),
+    ('rsi', None, {'length': 14}),
+    ('atr', None, {'length': 14}),
+    ('obv', None, {}),
+    ('macd', 'macd_line', {'fast_period': 12, 'slow_period': 26, 'signal_period': 9}),
+    ('macd', 'signal_line', {'fast_period': 12, 'slow_period': 26, 'signal_period': 9}),
+    ('macd', 'histogram', {'fast_period': 12, 'slow_period': 26, 'signal_period': 9}),
+    ('bollinger_bands', 'upper_band', {'length': 20, 'stddev': 2.0}),
+    ('bollinger_bands', 'middle_band', {'length': 20, 'stddev': 2.0}),
+    ('bollinger_bands', 'lower_band', {'length': 20, 'stddev': 2.0}),
+]
+
+
+class StreamingParityTests(SimpleTestCase):
+    def assertParity(self, engine, df, name, line, parameters):
+        expected = calculate_indicator(name, df, line=line, parameters=parameters)
+        actual = engine.calculate('TEST', '1MIN', name, df, line=line, parameters=parameters)
+        if math.isnan(expected):
+            self.assertTrue(math.isnan(actual), msg=f"{name} {line}: {actual}")
+            return
+        self.assertAlmostEqual(actual, expected, delta=1e-6 * max(1.0, abs(expected)), msg=f"{name} {line}")
+
+    def test_incremental_updates_match_full_recompute(self):
+        bars = make_bars()
+        for name, line, parameters in STREAMING_CASES:
+            engine = StreamingEngine()
+            for end in range(300, len(bars) + 1):
+                self.assertParity(engine, bars.iloc[:end], name, line, parameters)
+            self.assertEqual(engine.cold_starts, 1)
+
+    def test_sliding_window_matches_full_recompute(self):
+        # Frames covering a fixed period lose their oldest bars as new ones arrive, one or several at a time
+        bars = make_bars(count=700)
+        for name, line, parameters in STREAMING_CASES:
+            engine = StreamingEngine()
+            start, end = 0, 300
+            while end <= len(bars):
+                self.assertParity(engine, bars.iloc[start:end], name, line, parameters)
+                end += 1 + end % 3
+                start += end % 4
+            if name != 'macd':
+                self.assertEqual(engine.cold_starts, 1, msg=name)
+                self.assertGreater(engine.rebases, 0, msg=name)
+
+    def test_frame_starting_earlier_replays(self):
+        bars = make_bars()
+        engine = StreamingEngine()
+        self.assertParity(engine, bars.iloc[50:300], 'obv', None, {})
+        self.assertParity(engine, bars.iloc[40:301], 'obv', None, {})
+        self.assertEqual(engine.cold_starts, 2)
+
+    def test_flat_prices(self):
+        bars = make_bars()
+        bars[['open', 'high', 'low', 'close']] = 100.0
+        for name, line, parameters in STREAMING_CASES:
+            engine = StreamingEngine()
+            for end in range(300, 310):
+                self.assertParity(engine, bars.iloc[:end], name, line, parameters)
+
+    def test_in_progress_bar_is_not_committed(self):
+        bars = make_bars()
+        engine = StreamingEngine()
+        frame = bars.iloc[:300]
+        self.assertParity(engine, frame, 'rsi', None, {'length': 14})
+
+        # The last bar keeps changing until the next one opens
+        revised = frame.copy()
+        revised.iloc[-1, revised.columns.get_loc('close')] += 5
+        self.assertParity(engine, revised, 'rsi', None, {'length': 14})
+        self.assertParity(engine, bars.iloc[:301], 'rsi', None, {'length': 14})
+
+    def test_gap_falls_back_to_full_recompute(self):
+        bars = make_bars()
+        engine = StreamingEngine()
+        self.assertParity(engine, bars.iloc[:300], 'ema', None, {'length': 14})
+        # A frame that no longer contains the last committed bar replays from scratch
+        self.assertParity(engine, bars.iloc[:250], 'ema', None, {'length': 14})
+        self.assertEqual(engine.cold_starts, 2)
+
+
+class FastPathParityTests(SimpleTestCase):
+    CASES = [
+        ('moving_average', None, {'length': 20}),
+        ('ema', None, {'length': 14}),
+        ('wma', None, {'length': 10}),
+        ('rsi', None, {'length': 14}),
+        ('macd', 'macd_line', {}),
+        ('macd', 'signal_line', {}),
+        ('macd', 'histogram', {'fast_period': 5, 'slow_period': 35, 'signal_period': 5}),
+        ('bollinger_bands', 'upper_band', {'length': 20, 'stddev': 2.0}),
+        ('bollinger_bands', 'lower_band', {'length': 20, 'stddev': 2.5}),
+        ('atr', None, {'length': 14}),
+        ('stoch', 'k_line', {}),
+        ('stoch', 'd_line', {'k': 5, 'd': 3, 'smooth_k': 2}),
+        ('obv', None, {}),
+        ('vwap', None, {}),
+        ('roc', None, {'length': 10}),
+        ('zscore', None, {'length': 30}),
+    ]
+
+    def assertMatchesPandasTa(self, df, name, line, parameters):
+        with override_settings(FAST_INDICATORS_ENABLED=False):
+            expected = calculate_indicator(name, df, line=line, parameters=parameters)
+        actual = calculate_indicator(name, df, line=line, parameters=parameters)
+        self.assertAlmostEqual(actual, expected, delta=1e-9 * max(1.0, abs(expected)), msg=f"{name} {line}")
+
+    def test_fast_path_matches_pandas_ta(self):
+        # 2000 minute bars span two sessions, so VWAP is re-anchored
+        bars = make_bars(2000)
+        for name, line, parameters in self.CASES:
+            spec = get_indicator_spec(name)
+            params = spec.coerce_parameters(parameters)
+            self.assertIsInstance(spec.compute_result(bars, params), FastResult)
+            for end in (spec.required_length(params) or 1, 100, 777, len(bars)):
+                self.assertMatchesPandasTa(bars.iloc[:end], name, line, parameters)
+
+    def test_missing_values_fall_back_to_pandas_ta(self):
+        bars = make_bars(300)
+        bars.iloc[150, bars.columns.get_loc('close')] = np.nan
+        spec = get_indicator_spec('ema')
+        self.assertNotIsInstance(spec.compute_result(bars, {'length': 14}), FastResult)
+
+
+class IndicatorRegistryTests(SimpleTestCase):
+    def test_every_shipped_definition_can_be_computed(self):
+        self.assertEqual(check_indicator_definitions(get_indicator_definitions().values()), [])
+        self.assertEqual(check_indicator_definitions([{'name': 'nope'}]), ['nope: no registered indicator.'])
+
+    def test_lookup_and_parameter_aliases(self):
+        self.assertIs(get_indicator_spec('RSI'), get_indicator_spec('rsi'))
+        self.assertIs(get_indicator_spec('willr'), get_indicator_spec('williams'))
+        with self.assertRaises(ValueError):
+            get_indicator_spec('nope')
+        # indicator_definitions.json names the stochastic lengths k_length and d_length
+        self.assertEqual(get_indicator_spec('stoch').coerce_parameters({'k_length': '5', 'd_length': 2}),
+                         {'k': 5, 'd': 2, 'smooth_k': 3})
+
+    def test_lines_resolve_to_result_columns(self):
+        bars = make_bars(200)
+        macd = get_indicator_spec('macd')
+        self.assertEqual(macd.resolve_column('signal_line', macd.coerce_parameters({})), 'MACDs_12_26_9')
+        with self.assertRaisesMessage(ValueError, "Unknown line 'upper_band' for MACD"):
+            calculate_indicator('macd', bars, line='upper_band')
+        # Lenient indicators fall back to their default line
+        self.assertEqual(calculate_indicator('stoch', bars, line='unknown'), calculate_indicator('stoch', bars))
+        with self.assertRaisesMessage(ValueError, 'Not enough data to calculate RSI. Required: 15, Available: 14'):
+            calculate_indicator('rsi', bars.iloc[:14], parameters={'length': 14})
+
+    def test_parameters_are_validated_against_the_definitions(self):
+        self.assertEqual(validate_indicator_parameters('rsi', {'length': 21}), {'length': 21})
+        for parameters, errors in [
+            ({}, {'length': 'This parameter is required.'}),
+            ({'length': '14'}, {'length': 'Must be an integer.'}),
+            ({'length': 401}, {'length': 'Maximum allowed length is 400.'}),
+        ]:
+            with self.assertRaises(IndicatorParameterError) as raised:
+                validate_indicator_parameters('rsi', parameters)
+            self.assertEqual(raised.exception.errors, errors)
+
+    def test_serializer_validates_without_database_queries(self):
+        # SimpleTestCase fails any query, so the definitions must come from the registry
+        serializer = IndicatorConditionSerializer()
+        rsi = IndicatorDefinition(name='rsi', display_name='RSI')
+        self.assertEqual(serializer.validate({'indicator': rsi, 'indicator_parameters': {'length': 9}}),
+                         {'indicator': rsi, 'indicator_parameters': {'length': 9}})
+        with self.assertRaises(serializers.ValidationError) as raised:
+            serializer.validate({'indicator': rsi, 'indicator_parameters': {'length': 1000}})
+        self.assertEqual(raised.exception.detail, {'length': 'Maximum allowed length is 400.'})
+
+
+class IndicatorResultCacheTests(SimpleTestCase):
+    MACD = {'fast_period': 12, 'slow_period': 26, 'signal_period': 9}
+
+    def test_lines_of_one_indicator_share_one_computation(self):
+        bars = make_bars(300)
+        results = IndicatorResultCache()
+        values = [results.calculate('AAPL', '1H', 'macd', bars, line=line, parameters=self.MACD)
+                  for line in ('macd_line', 'signal_line', 'histogram')]
+        self.assertEqual(values, [calculate_indicator('macd', bars, line=line, parameters=self.MACD)
+                                  for line in ('macd_line', 'signal_line', 'histogram')])
+        self.assertEqual((results.misses, results.hits), (1, 2))
+
+        # Defaults spelled out or left out are the same configuration
+        results.calculate('AAPL', '1H', 'macd', bars, line='macd_line')
+        self.assertEqual(results.misses, 1)
+        # A new bar, another symbol or another timeframe is another result
+        results.calculate('AAPL', '1H', 'macd', make_bars(301), line='macd_line')
+        results.calculate('MSFT', '1H', 'macd', bars, line='macd_line')
+        results.calculate('AAPL', '1D', 'macd', bars, line='macd_line')
+        self.assertEqual(results.misses, 4)
+
+    def test_precomputed_values_are_served_and_discarded_per_symbol(self):
+        bars = make_bars(300)
+        results = IndicatorResultCache()
+        results.store_value('AAPL', '1H', 'rsi', bars, None, {'length': 14}, 42.0)
+        self.assertEqual(results.calculate('AAPL', '1H', 'rsi', bars, parameters={'length': 14}), 42.0)
+        self.assertEqual(results.misses, 0)
+
+        results.calculate('MSFT', '1H', 'rsi', bars, parameters={'length': 14})
+        results.discard('AAPL')
+        self.assertEqual(results.stats()['precomputed'], 0)
+        self.assertEqual(results.stats()['entries'], 1)
+        self.assertEqual(results.calculate('AAPL', '1H', 'rsi', bars, parameters={'length': 14}),
+                         calculate_indicator('rsi', bars, parameters={'length': 14}))
+
+
+class VectorizedParityTests(SimpleTestCase):
+    CASES = [
+        ('moving_average', None, {'length': 20}),
+        ('ema', None, {'length': 14}),
+        ('wma', None, {'length': 10}),
+        ('rsi', None, {'length': 14}),
+        ('roc', None, {'length': 10}),
+        ('zscore', None, {'length': 30}),
+        ('bollinger_bands', 'upper_band', {'length': 20, 'stddev': 2.0}),
+        ('bollinger_bands', 'middle_band', {'length': 20, 'stddev': 2.0}),
+        ('bollinger_bands', 'lower_band', {'length': 20, 'stddev': 2.5}),
+        ('atr', None, {'length': 14}),
+        ('macd', 'macd_line', {'fast_period': 12, 'slow_period': 26, 'signal_period': 9}),
+        ('macd', 'signal_line', {'fast_period': 12, 'slow_period': 26, 'signal_period': 9}),
+        ('macd', 'histogram', {'fast_period': 5, 'slow_period': 35, 'signal_period': 5}),
+    ]
+
+    def setUp(self):
+        # Rows of different lengths, so most of them are padded on the left
+        self.frames = [make_bars(count, seed=seed) for seed, count in enumerate((60, 97, 150, 300, 411))]
+
+    def test_kernels_match_calculate_indicator(self):
+        for name, line, parameters in self.CASES:
+            values = calculate_batch(name, self.frames, line=line, parameters=parameters)
+            for frame, value in zip(self.frames, values):
+                expected = calculate_indicator(name, frame, line=line, parameters=parameters)
+                self.assertAlmostEqual(value, expected, delta=1e-9 * max(1.0, abs(expected)),
+                                       msg=f"{name} {line} ({len(frame)} bars)")
+
+    def test_rolling_std_and_rma_match_pandas(self):
+        matrix = stack_frames(self.frames, 'close')
+        for ddof in (0, 1):
+            stds = rolling_std(matrix, 20, ddof=ddof)
+            for row, frame in enumerate(self.frames):
+                expected = frame['close'].rolling(20).std(ddof=ddof).to_numpy()
+                np.testing.assert_allclose(stds[row, matrix.shape[1] - len(frame):], expected, rtol=1e-9)
+        averages = rma(matrix, 14)
+        for row, frame in enumerate(self.frames):
+            expected = frame['close'].ewm(alpha=1 / 14, min_periods=14).mean().to_numpy()
+            np.testing.assert_allclose(averages[row, matrix.shape[1] - len(frame):], expected, rtol=1e-9)
+
+    def test_batch_takes_precedence_over_streaming(self):
+        results = IndicatorResultCache(streaming=StreamingEngine())
+        batch = SharedIndicatorBatch()
+        frames = [make_bars(300, seed=seed) for seed in range(BATCH_MIN_SYMBOLS)]
+        for symbol, frame in enumerate(frames):
+            batch.add(f"S{symbol}", '1MIN', 'ema', frame, parameters={'length': 14})
+        self.assertEqual(batch.run(results), BATCH_MIN_SYMBOLS)
+
+        for symbol, frame in enumerate(frames):
+            self.assertAlmostEqual(results.calculate(f"S{symbol}", '1MIN', 'ema', frame, parameters={'length': 14}),
+                                   calculate_indicator('ema', frame, parameters={'length': 14}), delta=1e-9)
+        self.assertEqual(results.hits, BATCH_MIN_SYMBOLS)
+        self.assertEqual(results.streaming.stats()['entries'], 0)
+
+
+class LoadIndicatorDefinitionsTests(TestCase):
+    def test_definitions_load_without_warnings_and_reload_in_place(self):
+        definitions = get_indicator_definitions()
+        for _ in range(2):
+            output = StringIO()
+            call_command('load_indicator_definitions', stdout=output)
+            self.assertNotIn('no registered indicator', output.getvalue())
+            self.assertNotIn('is not used', output.getvalue())
+        self.assertEqual(IndicatorDefinition.objects.count(), len(definitions))
+        macd = IndicatorDefinition.objects.get(name='macd')
+        self.assertEqual(sorted(macd.parameters.values_list('name', flat=True)),
+                         ['fast_period', 'signal_period', 'slow_period'])
+        self.assertEqual(macd.lines.count(), 3)
+
+
+class MarketDataFetcherTests(SimpleTestCase):
+    def test_symbols_stream_in_as_their_frames_complete(self):
+        delays = {'FETCH.SLOW': 0.3, 'FETCH.FAST': 0.0}
+
+        def load(symbol, period, interval, timeout):
+            time.sleep(delays[symbol])
+            return make_bars(10)
+
+        fetcher = MarketDataFetcher(load=load, concurrency=4)
+        keys = {symbol: [(symbol, '1d', '1mo'), (symbol, '1m', '5d')] for symbol in delays}
+        frames = FrameSet(fetch=fetcher.get_stock_data)
+        self.assertEqual(list(frames.stream(keys, fetcher.fetch)), ['FETCH.FAST', 'FETCH.SLOW'])
+        self.assertEqual(frames.fetch_count, 4)
+
+    def test_failed_attempts_are_retried(self):
+        calls = []
+
+        def load(symbol, period, interval, timeout):
+            calls.append(symbol)
+            if len(calls) < 3:
+                raise ConnectionError('reset by peer')
+            return make_bars(10)
+
+        fetcher = MarketDataFetcher(load=load, retries=2, backoff=0)
+        data = fetcher.get_stock_data('FETCH.RETRY', period='5d', interval='1m')
+        self.assertEqual(len(data), 10)
+        self.assertEqual(fetcher.stats()['retries'], 2)
+
+    def test_attempts_past_the_timeout_are_abandoned(self):
+        release = threading.Event()
+
+        def load(symbol, period, interval, timeout):
+            release.wait(5)
+            return make_bars(10)
+
+        fetcher = MarketDataFetcher(load=load, timeout=0.1, retries=1, backoff=0)
+        started = time.monotonic()
+        data = fetcher.get_stock_data('FETCH.HUNG', period='5d', interval='1m')
+        release.set()
+        self.assertTrue(data.empty)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(fetcher.stats()['timeouts'], 2)
+
+    def test_abandoned_attempts_stop_retrying(self):
+        release = threading.Event()
+        calls = []
+
+        def load(symbol, period, interval, timeout):
+            calls.append(symbol)
+            if len(calls) == 1:
+                # Hangs past the timeout, then fails once the collector has moved on
+                release.wait(5)
+                raise ConnectionError('reset by peer')
+            return make_bars(10)
+
+        fetcher = MarketDataFetcher(load=load, timeout=0.1, retries=2, backoff=0)
+        data = fetcher.get_stock_data('FETCH.SLOW', period='5d', interval='1m')
+        release.set()
+        fetcher._executor.shutdown(wait=True)
+        self.assertEqual(len(data), 10)
+        self.assertEqual(calls, ['FETCH.SLOW'] * 2)
+        self.assertEqual((fetcher.stats()['timeouts'], fetcher.stats()['retries']), (1, 1))
+
+    def test_keys_without_request_budget_are_deferred(self):
+        governor = FetchGovernor(RateLimiter(0.01), max_rate=0.01, max_concurrency=1)
+        fetcher = MarketDataFetcher(load=lambda symbol, **kwargs: make_bars(10), governor=governor, max_wait=0.05)
+        results = dict(fetcher.fetch([('FETCH.FIRST', '1m', '5d'), ('FETCH.SECOND', '1m', '5d')]))
+        self.assertFalse(results[('FETCH.FIRST', '1m', '5d')].empty)
+        self.assertTrue(results[('FETCH.SECOND', '1m', '5d')].empty)
+        self.assertEqual(fetcher.stats()['deferred'], 1)
+
+    def test_deferred_batches_leave_their_request_budget(self):
+        limiter = RateLimiter(0.01, burst=5)
+        governor = FetchGovernor(limiter, max_rate=0.01, max_concurrency=1)
+        self.assertEqual(limiter.try_acquire(3), 0)
+        fetcher = MarketDataFetcher(load_many=mock.Mock(), governor=governor, batch_size=3, max_wait=0.05)
+        results = dict(fetcher.fetch([(f'BUDGET.{n}', '1m', '5d') for n in range(3)]))
+        self.assertTrue(all(data.empty for data in results.values()))
+        self.assertEqual(fetcher.stats()['deferred'], 3)
+        # The two tokens left in the bucket are still there for single downloads
+        self.assertEqual([limiter.try_acquire() == 0 for _ in range(3)], [True, True, False])
+
+    def test_batches_take_their_tokens_at_once(self):
+        limiter = RateLimiter(1, burst=3)
+        self.assertEqual(limiter.try_acquire(5), 0)
+        # A batch larger than a burst leaves the bucket in debt
+        self.assertAlmostEqual(limiter.try_acquire(), 3, delta=0.1)
+
+    def test_cache_misses_sharing_a_window_are_downloaded_together(self):
+        singles, batches = [], []
+
+        def load(symbol, period, interval, timeout):
+            singles.append((symbol, interval))
+            return make_bars(10)
+
+        def load_many(symbols, period, interval, timeout):
+            batches.append((symbols, interval, timeout))
+            # Symbols the provider does not know are left out
+            return {symbol: make_bars(10) for symbol in symbols if symbol != 'BATCH.GONE'}
+
+        fetcher = MarketDataFetcher(load=load, load_many=load_many, batch_size=3, batch_timeout=45)
+        keys = [(symbol, '1m', '5d') for symbol in ('BATCH.A', 'BATCH.GONE', 'BATCH.B', 'BATCH.C')]
+        keys.append(('BATCH.A', '1d', '1y'))
+        results = dict(fetcher.fetch(keys))
+
+        self.assertEqual(batches, [(['BATCH.A', 'BATCH.GONE', 'BATCH.B'], '1m', 45)])
+        self.assertEqual(sorted(singles), [('BATCH.A', '1d'), ('BATCH.C', '1m')])
+        self.assertEqual(set(results), set(keys))
+        self.assertTrue(results[('BATCH.GONE', '1m', '5d')].empty)
+        self.assertEqual([key for key, data in results.items() if data.empty], [('BATCH.GONE', '1m', '5d')])
+        self.assertEqual((fetcher.stats()['batches'], fetcher.stats()['empty']), (1, 1))
+
+    def test_failed_batches_are_retried_whole(self):
+        calls = []
+
+        def load_many(symbols, period, interval, timeout):
+            calls.append(symbols)
+            if len(calls) == 1:
+                raise ConnectionError('reset by peer')
+            return {symbol: make_bars(10) for symbol in symbols}
+
+        fetcher = MarketDataFetcher(load_many=load_many, batch_size=10, retries=1, backoff=0)
+        results = dict(fetcher.fetch([('RETRY.A', '1m', '5d'), ('RETRY.B', '1m', '5d')]))
+        self.assertEqual(calls, [['RETRY.A', 'RETRY.B']] * 2)
+        self.assertFalse(any(data.empty for data in results.values()))
+        self.assertEqual(fetcher.stats()['retries'], 1)
+
+
+class FetchGovernorTests(SimpleTestCase):
+    def test_pacing_backs_off_on_failures_and_recovers(self):
+        governor = FetchGovernor(RateLimiter(0), max_rate=10, max_concurrency=8, window=10)
+        for outcome in ['ok'] * 7 + ['empty'] * 3:
+            governor.record(outcome)
+        self.assertEqual((governor.rate, governor.concurrency), (5, 4))
+
+        for _ in range(10):
+            governor.record('ok')
+        self.assertEqual((governor.rate, governor.concurrency), (6, 5))
+        self.assertEqual(governor.stats()['backoffs'], 1)
+
+    def test_backoffs_are_shared_through_redis(self):
+        shared = {}
+
+        def eval(script, numkeys, key, configured_rate, *args):
+            rate = shared.get('rate', configured_rate)
+            if script == ADJUST_RATE_SCRIPT:
+                factor, step, min_rate, max_rate = args
+                shared['rate'] = max(min_rate, min(max_rate, rate * factor + step))
+                return str(shared['rate']).encode()
+            self.assertEqual(script, TOKEN_BUCKET_SCRIPT)
+            return [0, str(rate).encode()]
+
+        client = mock.Mock(eval=mock.Mock(side_effect=eval))
+        governors = [
+            FetchGovernor(RedisRateLimiter('test', 10, client=client), max_rate=10, max_concurrency=8, window=10)
+            for _ in range(2)
+        ]
+        for outcome in ['ok'] * 7 + ['empty'] * 3:
+            governors[0].record(outcome)
+        self.assertEqual(shared['rate'], 5)
+
+        # The other process paces from the shared rate, and backs off further from it
+        self.assertTrue(governors[1].acquire())
+        self.assertEqual(governors[1].rate, 5)
+        for outcome in ['error'] * 10:
+            governors[1].record(outcome)
+        self.assertEqual(shared['rate'], 2.5)
+        self.assertTrue(governors[0].acquire())
+        self.assertEqual(governors[0].stats()['rate'], 2.5)
+
+    def test_rate_limiter_falls_back_to_its_last_shared_rate(self):
+        client = mock.Mock()
+        client.eval.side_effect = [b'2.5', redis.ConnectionError('connection refused')]
+        limiter = RedisRateLimiter('test', 10, client=client)
+        self.assertEqual(limiter.adjust_rate(0.5, 0, 0.5, 10), 2.5)
+        self.assertEqual(limiter.try_acquire(), 0)
+        self.assertEqual(limiter.rate, 2.5)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def run_concurrently(self, flight, fn, callers=8):
+        outcomes = []
+        start = threading.Barrier(callers)
+
+        def call():
+            start.wait()
+            try:
+                outcomes.append(flight.do(('AAPL', '1m', '5d'), fn))
+            except Exception as e:
+                outcomes.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_concurrent_callers_share_one_call(self):
+        calls = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.2)
+            return make_bars(10)
+
+        flight = SingleFlight()
+        outcomes = self.run_concurrently(flight, load)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(outcome is outcomes[0] for outcome in outcomes))
+        self.assertEqual(flight.stats(), {'calls': 1, 'shared': 7})
+
+    def test_callers_share_the_error(self):
+        def load():
+            time.sleep(0.2)
+            raise ConnectionError('reset by peer')
+
+        outcomes = self.run_concurrently(SingleFlight(), load)
+        self.assertTrue(all(isinstance(outcome, ConnectionError) for outcome in outcomes))
+
+
+    def test_batched_calls_only_run_keys_nobody_else_is_loading(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+
+        def load():
+            started.set()
+            release.wait(5)
+            return 'single'
+
+        thread = threading.Thread(target=flight.do, args=('AAPL', load))
+        thread.start()
+        started.wait(5)
+        batches = []
+
+        def load_many(keys):
+            batches.append(keys)
+            release.set()
+            return {key: f'batch {key}' for key in keys}
+
+        self.assertEqual(flight.do_many(['AAPL', 'MSFT'], load_many), {'AAPL': 'single', 'MSFT': 'batch MSFT'})
+        thread.join()
+        self.assertEqual(batches, [['MSFT']])
+
+
+@override_settings(ALERT_FETCH_LOCK_TTL=0.3, ALERT_FETCH_TIMEOUT=0.2, ALERT_FETCH_BATCH_TIMEOUT=0.2)
+class CrossProcessLoadTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeLeaseRedis()
+        patcher = mock.patch('alerts.leases.get_lease_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        get_bar_cache().clear()
+        self.addCleanup(get_bar_cache().clear)
+
+    def hold(self, *symbols):
+        """Takes the fetch leases of `symbols` for another process that never finishes."""
+        for symbol in symbols:
+            RedisLease(f"fetch:{symbol}:1m:5d", 30).acquire()
+
+    def test_leases_are_extended_while_the_download_runs(self):
+        def load_many(symbols):
+            time.sleep(0.35)
+            return {symbol: make_bars(10) for symbol in symbols}
+
+        with mock.patch.object(RedisLease, 'extend', autospec=True, return_value=True) as extend:
+            frames = load_many_once(['LEASE.A', 'LEASE.B'], '1m', '5d', load_many)
+        self.assertEqual(set(frames), {'LEASE.A', 'LEASE.B'})
+        # Every third of the 0.3s TTL, for both leases
+        self.assertGreaterEqual(extend.call_count, 4)
+        self.assertEqual(self.redis.values, {})
+
+    def test_symbols_held_elsewhere_are_waited_for_together(self):
+        self.hold('WAIT.A', 'WAIT.B', 'WAIT.C')
+        get_bar_cache().set('WAIT.B', '1m', '5d', make_bars(5))
+        loads = []
+
+        def load_many(symbols):
+            loads.append(symbols)
+            return {symbol: make_bars(10) for symbol in symbols}
+
+        started = time.monotonic()
+        frames = load_many_once(['WAIT.A', 'WAIT.B', 'WAIT.C', 'WAIT.D'], '1m', '5d', load_many)
+        # One deadline of 0.2s + 0.3s for all of them, then one download for those still missing
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(loads, [['WAIT.D'], ['WAIT.A', 'WAIT.C']])
+        self.assertEqual(len(frames['WAIT.B']), 5)
+
+
+class RecordingProvider(LocalProvider):
+    """LocalProvider recording its multi-ticker downloads and leaving out `missing` symbols."""
+
+    def __init__(self, missing=(), **kwargs):
+        super().__init__(**kwargs)
+        self.missing = set(missing)
+        self.downloads = []
+
+    def history_many(self, symbols, interval, period=None, start=None, timeout=None):
+        self.downloads.append((list(symbols), period, start))
+        return super().history_many([symbol for symbol in symbols if symbol not in self.missing], interval,
+                                    period=period, start=start, timeout=timeout)
+
+
+class BatchedDownloadTests(SimpleTestCase):
+    NOW = pd.Timestamp('2024-03-08 15:00', tz='UTC')
+
+    def setUp(self):
+        get_bar_cache().clear()
+        self.addCleanup(get_bar_cache().clear)
+        self.governor = FetchGovernor(RateLimiter(0), max_rate=0, max_concurrency=1)
+
+    def fetch_many(self, provider, symbols, bar_store=None):
+        with mock.patch('alerts.utils.get_market_data_provider', return_value=provider), \
+                mock.patch('alerts.utils.get_fetch_governor', return_value=self.governor), \
+                mock.patch('alerts.utils.get_bar_store', return_value=bar_store):
+            return get_stock_data_many(symbols, period='5d', interval='1m')
+
+    def test_one_download_per_batch_through_the_bar_cache(self):
+        provider = RecordingProvider(missing={'GONE'}, now=lambda: self.NOW)
+        frames, failed = self.fetch_many(provider, ['AAA', 'BBB', 'GONE'])
+        self.assertEqual(provider.downloads, [(['AAA', 'BBB', 'GONE'], '5d', None)])
+        self.assertEqual(failed, ['GONE'])
+        pd.testing.assert_frame_equal(frames['AAA'], provider.history('AAA', '1m', period='5d'))
+        self.assertEqual(self.governor.stats()['ok'], 2)
+        self.assertEqual(self.governor.stats()['empty'], 1)
+
+        # Served from the bar cache; only the symbol without data is downloaded again
+        frames, _ = self.fetch_many(provider, ['AAA', 'BBB', 'GONE'])
+        self.assertEqual(provider.downloads[1:], [(['GONE'], '5d', None)])
+        self.assertIs(frames['AAA'], get_bar_cache().get('AAA', '1m', '5d'))
+
+    def test_bar_store_refreshes_the_batch_incrementally(self):
+        now = self.NOW
+        provider = RecordingProvider(now=lambda: now)
+        with tempfile.TemporaryDirectory() as root:
+            store = BarStore(root, now=lambda: now)
+            self.fetch_many(provider, ['AAA', 'BBB'], bar_store=store)
+            last = store.last_timestamp('AAA', '1m')
+
+            get_bar_cache().clear()
+            now = self.NOW + pd.Timedelta(minutes=5)
+            frames, failed = self.fetch_many(provider, ['AAA', 'BBB'], bar_store=store)
+
+        self.assertEqual(failed, [])
+        self.assertEqual(provider.downloads, [(['AAA', 'BBB'], '5d', None), (['AAA', 'BBB'], None, last)])
+        self.assertEqual(frames['BBB'].index[-1], now.tz_convert('America/New_York'))
+        expected = provider.history('BBB', '1m', period='5d')
+        np.testing.assert_allclose(frames['BBB']['close'].to_numpy(), expected['close'].to_numpy())
+
+
+class FakeRedis:
+    """The subset of redis.Redis used by BarCache, with TTLs read off `clock`."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.values = {}  # key -> (expires_at, value)
+
+    def get(self, key):
+        expires_at, value = self.values.get(key, (0, None))
+        return value if expires_at > self.clock() else None
+
+    def setex(self, key, ttl, value):
+        self.values[key] = (self.clock() + ttl, value)
+
+    def ttl(self, key):
+        expires_at, _ = self.values.get(key, (0, None))
+        return int(expires_at - self.clock()) if expires_at > self.clock() else -2
+
+
+class BarCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1_700_000_000.0
+        patcher = mock.patch('alerts.cache.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.redis = FakeRedis(lambda: self.now)
+
+    def test_ttl_runs_to_the_next_bar_capped_for_coarse_intervals(self):
+        minute = 1_699_999_840.0  # 40s into a minute bar and a 5 minute bar
+        self.assertEqual(interval_ttl('1m', now=minute, max_ttl=60), 20)
+        self.assertEqual(interval_ttl('5m', now=minute, max_ttl=600), 260)
+        self.assertEqual(interval_ttl('1d', now=minute, max_ttl=60), 60)
+        self.assertEqual(interval_ttl('1m', now=1_699_999_839.9, max_ttl=60), 20)
+
+    def test_entries_expire_and_least_recently_used_are_evicted(self):
+        bars = make_bars(50)
+        cache = BarCache(max_bytes=int(2.5 * bars.memory_usage(index=True, deep=True).sum()))
+        cache.set('AAA', '1m', '1d', bars, ttl=30)
+        cache.set('BBB', '1m', '1d', bars, ttl=30)
+        self.assertIs(cache.get('AAA', '1m', '1d'), bars)
+        # BBB is now the least recently used entry
+        cache.set('CCC', '1m', '1d', bars, ttl=30)
+        self.assertIsNone(cache.get('BBB', '1m', '1d'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        self.now += 30
+        self.assertIsNone(cache.get('AAA', '1m', '1d'))
+        self.assertEqual(cache.stats()['entries'], 1)
+
+    def test_redis_shares_frames_between_processes(self):
+        bars = make_bars(50)
+        bars['volume'] = bars['volume'].astype('int64')
+        worker, web = BarCache(1 << 20, client=self.redis), BarCache(1 << 20, client=self.redis)
+        worker.set('AAA', '1m', '1d', bars, ttl=30)
+
+        self.now += 10
+        shared = web.get('AAA', '1m', '1d')
+        pd.testing.assert_frame_equal(shared, bars, check_freq=False)
+        self.assertEqual(web.stats()['redis_hits'], 1)
+        # Kept in the local LRU for what is left of the Redis TTL
+        self.redis.values.clear()
+        self.assertIs(web.get('AAA', '1m', '1d'), shared)
+        self.now += 20
+        self.assertIsNone(web.get('AAA', '1m', '1d'))
+
+    def test_redis_payloads_of_another_format_are_misses(self):
+        cache = BarCache(1 << 20, client=self.redis)
+        self.redis.setex('stockwatch:bars:AAA:1m:1d', 30, b'\x80\x05not a frame')
+        self.assertIsNone(cache.get('AAA', '1m', '1d'))
+        # Frames the format cannot hold stay local
+        labels = make_bars(5).assign(label='x')
+        cache.set('BBB', '1m', '1d', labels, ttl=30)
+        self.assertEqual(self.redis.values.keys(), {'stockwatch:bars:AAA:1m:1d'})
+        self.assertIs(cache.get('BBB', '1m', '1d'), labels)
+
+
+class BarStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.bars = make_bars(400)
+        self.available = 300
+        self.now = self.bars.index[self.available - 1]
+        self.fetches = []
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.store = BarStore(root.name, now=lambda: self.now)
+
+    def fetch(self, symbol, interval, period=None, start=None):
+        self.fetches.append(period or start)
+        bars = self.bars.iloc[:self.available]
+        return bars[bars.index >= start] if start is not None else slice_period(bars, period)
+
+    def load(self, period='1d'):
+        return self.store.load('AAA', '1m', period, self.fetch)
+
+    def advance(self, bars):
+        self.available += bars
+        self.now = self.bars.index[self.available - 1]
+
+    def assertBarsEqual(self, data, expected):
+        # The store keeps nanosecond timestamps whatever the unit of the fetched index
+        self.assertTrue(data.index.equals(expected.index))
+        np.testing.assert_array_equal(data.to_numpy(), expected.to_numpy())
+
+    def test_refresh_appends_new_bars_over_the_in_progress_one(self):
+        self.load()
+        # The last stored bar was still in progress
+        self.bars.iloc[299, self.bars.columns.get_loc('close')] += 1
+        self.advance(10)
+        data = self.load()
+        self.assertEqual(self.fetches, ['1d', self.bars.index[299]])
+        self.assertBarsEqual(data, self.bars.iloc[:310])
+
+    def test_series_is_compacted_to_max_bars(self):
+        self.store.max_bars = 250
+        self.load()
+        self.advance(50)
+        data = self.load()
+        self.assertEqual(len(self.store.read('AAA', '1m')), 250)
+        self.assertBarsEqual(data, self.bars.iloc[100:350])
+
+    def test_wider_period_fetches_the_full_history_again(self):
+        self.load('1d')
+        self.load('1d')
+        self.load('5d')
+        self.assertEqual(self.fetches, ['1d', self.bars.index[299], '5d'])
+
+    def test_stale_series_is_not_served(self):
+        self.load()
+        # Minutes pass with the provider only sending the stored last bar again, or nothing at all
+        self.now += pd.Timedelta(minutes=10)
+        self.assertTrue(self.load().empty)
+        self.available = 295
+        self.assertTrue(self.load().empty)
+        self.advance(10)
+        self.assertEqual(self.load().index[-1], self.bars.index[304])
+
+
+class LocalProviderTests(SimpleTestCase):
+    def test_synthetic_bars_are_deterministic_across_requests(self):
+        now = pd.Timestamp('2024-03-08 15:00', tz='UTC')
+        earlier = LocalProvider(seed=3, now=lambda: now).history('SYNTH', '1m', period='5d')
+        later = LocalProvider(seed=3, now=lambda: now + pd.Timedelta(hours=2)).history('SYNTH', '1m', period='5d')
+
+        self.assertEqual(earlier.index[-1], now.tz_convert('America/New_York'))
+        overlap = later.index.intersection(earlier.index)
+        self.assertGreater(len(overlap), 5000)
+        pd.testing.assert_frame_equal(earlier.loc[overlap], later.loc[overlap])
+        # Bars join up: each one opens at the previous close and stays within its high and low
+        np.testing.assert_allclose(later['open'].iloc[1:].to_numpy(), later['close'].iloc[:-1].to_numpy())
+        self.assertTrue((later['high'] >= later[['open', 'close']].max(axis=1)).all())
+        self.assertTrue((later['low'] <= later[['open', 'close']].min(axis=1)).all())
+
+    def test_fixtures_take_precedence(self):
+        bars = make_bars(50)
+        with tempfile.TemporaryDirectory() as root:
+            bars.rename(columns=str.title).to_csv(os.path.join(root, 'FIXT_1m.csv'))
+            provider = LocalProvider(root=root)
+            data = provider.history('FIXT', '1m', start=bars.index[40])
+            self.assertEqual(list(data.columns), ['open', 'high', 'low', 'close', 'volume'])
+            np.testing.assert_allclose(data['close'].to_numpy(), bars['close'].iloc[40:].to_numpy())
+
+
+class TradingCalendarTests(SimpleTestCase):
+    NEW_YORK = ZoneInfo('America/New_York')
+
+    def at(self, *args):
+        return datetime(*args, tzinfo=self.NEW_YORK)
+
+    def test_us_equities_follow_sessions_holidays_and_early_closes(self):
+        calendar = get_trading_calendar('Stock')
+        self.assertTrue(calendar.is_open(self.at(2024, 6, 12, 10)))
+        # After the close on a Friday: next open is Monday morning
+        self.assertFalse(calendar.is_open(self.at(2024, 6, 14, 16)))
+        self.assertEqual(calendar.next_open(self.at(2024, 6, 14, 16)), self.at(2024, 6, 17, 9, 30))
+        # Good Friday and Independence Day
+        self.assertEqual(calendar.next_open(self.at(2024, 3, 28, 20)), self.at(2024, 4, 1, 9, 30))
+        self.assertEqual(calendar.next_open(self.at(2024, 7, 4, 12)), self.at(2024, 7, 5, 9, 30))
+        # The day after Thanksgiving closes at 13:00
+        self.assertTrue(calendar.is_open(self.at(2024, 11, 29, 12, 59)))
+        self.assertFalse(calendar.is_open(self.at(2024, 11, 29, 13, 30)))
+        # Unknown asset types trade like US equities
+        self.assertIs(get_trading_calendar('Technology'), calendar)
+        self.assertIs(get_trading_calendar(None), calendar)
+
+    def test_overnight_and_round_the_clock_markets(self):
+        fx = get_trading_calendar('Currency Pair')
+        self.assertTrue(fx.is_open(self.at(2024, 6, 12, 3)))
+        self.assertFalse(fx.is_open(self.at(2024, 6, 15, 12)))
+        self.assertEqual(fx.next_open(self.at(2024, 6, 14, 17)), self.at(2024, 6, 16, 17))
+
+        saturday = self.at(2024, 6, 15, 12)
+        self.assertTrue(get_trading_calendar('Crypto').is_open(saturday))
+        self.assertEqual(get_trading_calendar('Crypto').next_open(saturday), saturday)
+        with override_settings(ALERT_MARKET_HOURS_ENABLED=False):
+            self.assertTrue(get_trading_calendar('Stock').is_open(saturday))
+
+
+class DueAlertQueryPlanTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.rsi = IndicatorDefinition.objects.create(name='rsi', display_name='RSI')
+        self.ema = IndicatorDefinition.objects.create(name='ema', display_name='EMA')
+
+    def create_alerts(self, count):
+        for i in range(count):
+            symbol = f"S{Stock.objects.count()}"
+            create_price_alert(self.user, symbol)
+            create_percent_change_alert(self.user, symbol)
+            create_chain_alert(self.user, symbol, [
+                dict(indicator=self.rsi, indicator_timeframe='1H', condition_operator='GT',
+                     value_type='INDICATOR_LINE', value_indicator=self.ema, value_timeframe='1D'),
+            ] * 2)
+
+        Alert.objects.update(next_check_at=timezone.now() - timedelta(minutes=1))
+
+    def load_and_read(self):
+        """Loads the due alerts and reads every relation the scheduler and the notifications touch."""
+        alerts = load_due_alerts(timezone.now())
+        for alert in alerts:
+            alert.stock.symbol, alert.user.email, get_check_interval(alert)
+            if alert.alert_type == 'PERCENT_CHANGE':
+                alert.percentage_change.lookback_period
+            elif alert.alert_type == 'INDICATOR_CHAIN':
+                for condition in get_chain_conditions(alert.indicator_chain):
+                    condition.indicator.name, condition.value_indicator.name
+        return alerts
+
+    def test_query_count_does_not_grow_with_due_alerts(self):
+        self.create_alerts(1)
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.load_and_read()), 3)
+
+        self.create_alerts(10)
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.load_and_read()), 33)
+
+    def test_only_due_active_alerts_are_loaded(self):
+        self.create_alerts(2)
+        Alert.objects.filter(alert_type='PRICE').update(next_check_at=timezone.now() + timedelta(minutes=5))
+        Alert.objects.filter(alert_type='PERCENT_CHANGE').update(is_active=False)
+        self.assertEqual({alert.alert_type for alert in load_due_alerts(timezone.now())}, {'INDICATOR_CHAIN'})
+
+    def test_closed_market_alerts_are_deferred_to_the_next_open(self):
+        self.create_alerts(2)
+        Stock.objects.filter(symbol='S0').update(asset_type='Crypto')
+        Stock.objects.filter(symbol='S1').update(asset_type='Stock')
+        saturday = datetime(2024, 6, 15, 12, tzinfo=ZoneInfo('America/New_York'))
+        Alert.objects.update(next_check_at=saturday - timedelta(minutes=1))
+
+        self.assertEqual(defer_closed_market_alerts(saturday), 3)
+        self.assertEqual(len(load_due_alerts(saturday)), 3)
+        self.assertEqual({alert.stock.symbol for alert in load_due_alerts(saturday)}, {'S0'})
+        monday_open = datetime(2024, 6, 17, 9, 30, tzinfo=ZoneInfo('America/New_York'))
+        self.assertEqual(
+            set(Alert.objects.filter(stock__symbol='S1').values_list('next_check_at', flat=True)), {monday_open})
+
+
+class AlertSchedulingTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.now = timezone.now()
+
+    def test_saving_a_detail_model_schedules_the_next_check(self):
+        rsi = IndicatorDefinition.objects.create(name='rsi', display_name='RSI')
+        alerts = [
+            create_price_alert(self.user, 'AAPL', check_interval=5),
+            create_percent_change_alert(self.user, 'AAPL', check_interval=15),
+            create_chain_alert(self.user, 'AAPL', [dict(indicator=rsi, indicator_timeframe='1H',
+                                                        condition_operator='GT', value_type='NUMBER')],
+                               check_interval=60),
+        ]
+        for alert, minutes in zip(alerts, (5, 15, 60)):
+            alert.refresh_from_db()
+            self.assertEqual(alert.next_check_at, alert.created_at + timedelta(minutes=minutes))
+
+        # A changed check interval moves the next check
+        detail = alerts[0].price_target_alert
+        detail.check_interval = 30
+        detail.save()
+        alerts[0].refresh_from_db()
+        self.assertEqual(alerts[0].next_check_at, alerts[0].created_at + timedelta(minutes=30))
+
+    def test_evaluated_alerts_are_rescheduled_by_their_check_interval(self):
+        alerts = [create_price_alert(self.user, 'BTC-USD', target_price=1000, check_interval=15),
+                  create_percent_change_alert(self.user, 'BTC-USD', percentage_change=50, check_interval=60)]
+        Stock.objects.filter(symbol='BTC-USD').update(asset_type='Crypto')
+        Alert.objects.update(next_check_at=self.now - timedelta(minutes=1))
+
+        with mock.patch('alerts.tasks.get_market_data_fetcher', return_value=CountingFetcher()):
+            evaluate_alerts(load_due_alerts(self.now), self.now)
+        for alert, minutes in zip(alerts, (15, 60)):
+            alert.refresh_from_db()
+            self.assertEqual(alert.last_triggered_at, self.now)
+            self.assertEqual(alert.next_check_at, self.now + timedelta(minutes=minutes))
+        self.assertEqual(load_due_alerts(self.now + timedelta(minutes=14)), [])
+
+    def test_only_active_alerts_whose_check_is_due_are_selected(self):
+        due = create_price_alert(self.user, 'AAPL')
+        on_time = create_price_alert(self.user, 'MSFT')
+        later = create_price_alert(self.user, 'NVDA')
+        inactive = create_price_alert(self.user, 'TSLA')
+        Alert.objects.filter(pk__in=[due.pk, inactive.pk]).update(next_check_at=self.now - timedelta(minutes=5))
+        Alert.objects.filter(pk=on_time.pk).update(next_check_at=self.now)
+        Alert.objects.filter(pk=later.pk).update(next_check_at=self.now + timedelta(seconds=1))
+        Alert.objects.filter(pk=inactive.pk).update(is_active=False)
+
+        expected = {due.pk, on_time.pk}
+        self.assertEqual({alert.pk for alert in load_due_alerts(self.now)}, expected)
+        self.assertEqual({alert_id for ids in partition_due_alerts(self.now, 2).values() for alert_id in ids},
+                         expected)
+
+
+class AlertShardingTests(TestCase):
+    def setUp(self):
+        user = create_user()
+        self.now = timezone.now()
+        for number in range(20):
+            create_price_alert(user, f"S{number}")
+            create_percent_change_alert(user, f"S{number}")
+        Alert.objects.update(next_check_at=self.now - timedelta(minutes=1))
+        self.due = set(Alert.objects.values_list('pk', flat=True))
+
+    def test_shards_cover_every_due_alert_once(self):
+        shards = partition_due_alerts(self.now, 4)
+        alert_ids = [alert_id for ids in shards.values() for alert_id in ids]
+        self.assertEqual(sorted(alert_ids), sorted(self.due))
+        self.assertTrue(set(shards) <= set(range(4)))
+        self.assertTrue(all(shards.values()))
+
+    def test_alerts_of_a_symbol_share_a_shard(self):
+        shards = partition_due_alerts(self.now, 4)
+        shard_of = {alert_id: shard for shard, ids in shards.items() for alert_id in ids}
+        for alert in Alert.objects.select_related('stock'):
+            self.assertEqual(shard_of[alert.pk], get_symbol_shard(alert.stock.symbol, 4))
+
+    def test_only_due_active_alerts_are_partitioned(self):
+        Alert.objects.filter(stock__symbol='S0').update(is_active=False)
+        Alert.objects.filter(stock__symbol='S1').update(next_check_at=self.now + timedelta(minutes=1))
+        expected = set(Alert.objects.exclude(stock__symbol__in=['S0', 'S1']).values_list('pk', flat=True))
+        shards = partition_due_alerts(self.now, 3)
+        self.assertEqual({alert_id for ids in shards.values() for alert_id in ids}, expected)
+
+    def test_run_totals_add_up_every_shard(self):
+        shard_totals = [
+            {'shard': 0, 'alerts': 10, 'symbols': 3, 'fetches': 4, 'triggered': 1, 'saved': 10, 'deferred': 0},
+            {'shard': 2, 'alerts': 5, 'symbols': 2, 'fetches': 2, 'triggered': 0, 'saved': 5, 'deferred': 1},
+            {'shard': 3, 'skipped': 1},
+            {'shard': 4, 'failed': 1},
+        ]
+        with mock.patch('alerts.tasks.get_run_metrics', return_value={}):
+            totals = summarize_alert_run(shard_totals, (self.now - timedelta(seconds=30)).isoformat())
+        self.assertEqual({key: value for key, value in totals.items() if key != 'seconds'}, {
+            'alerts': 15, 'symbols': 5, 'fetches': 6, 'triggered': 1, 'saved': 15, 'skipped': 1, 'deferred': 1,
+            'failed': 1, 'shards': 4,
+        })
+        self.assertGreaterEqual(totals['seconds'], 30)
+
+
+class RetryRequested(Exception):
+    pass
+
+
+class FakeTask:
+    """Celery task stand-in whose retry() raises like the real one."""
+
+    def __init__(self):
+        self.retries = []
+
+    def retry(self, **options):
+        self.retries.append(options)
+        return RetryRequested()
+
+
+class RunOverlapTests(SimpleTestCase):
+    def setUp(self):
+        record = mock.patch('alerts.tasks.record_run_event')
+        self.record = record.start()
+        self.addCleanup(record.stop)
+
+    def events(self):
+        return [call.args[0] for call in self.record.call_args_list]
+
+    @override_settings(ALERT_RUN_OVERLAP_POLICY='queue', ALERT_RUN_QUEUE_MAX_WAIT=60, ALERT_RUN_QUEUE_RETRY_DELAY=5)
+    def test_queue_retries_until_the_max_wait(self):
+        task = FakeTask()
+        with self.assertRaises(RetryRequested):
+            defer_or_skip(task, timezone.now() - timedelta(seconds=10), 'runs', retry_kwargs={'scheduled_at': 'x'})
+        self.assertEqual(task.retries, [{'kwargs': {'scheduled_at': 'x'}, 'countdown': 5, 'max_retries': None}])
+        self.assertEqual(self.events(), ['queued_runs'])
+
+        # Past the wait the run is dropped; its alerts stay due for the next one
+        defer_or_skip(task, timezone.now() - timedelta(seconds=61), 'runs')
+        self.assertEqual(len(task.retries), 1)
+        self.assertEqual(self.events(), ['queued_runs', 'skipped_runs'])
+
+    @override_settings(ALERT_RUN_OVERLAP_POLICY='skip')
+    def test_skip_never_retries(self):
+        task = FakeTask()
+        defer_or_skip(task, timezone.now(), 'shards')
+        self.assertEqual(task.retries, [])
+        self.assertEqual(self.events(), ['skipped_shards'])
+
+    @override_settings(ALERT_RUN_LATE_AFTER=60)
+    def test_late_runs_are_counted(self):
+        run_is_late(timezone.now() - timedelta(seconds=10), 'runs')
+        self.assertEqual(self.events(), [])
+        run_is_late(timezone.now() - timedelta(seconds=90), 'shards')
+        self.assertEqual(self.events(), ['late_shards'])
+
+
+class RedisLeaseTests(SimpleTestCase):
+    def test_lease_fails_open_when_redis_is_down(self):
+        client = mock.Mock()
+        client.set.side_effect = client.eval.side_effect = redis.ConnectionError('connection refused')
+        lease = RedisLease('alerts:test', 30, client=client)
+        self.assertTrue(lease.acquire())
+        self.assertFalse(lease.extend())
+        self.assertFalse(lease.release())
+
+    def test_lease_is_exclusive_until_released(self):
+        client = mock.Mock()
+        client.set.side_effect = [True, None]
+        self.assertTrue(RedisLease('alerts:test', 30, client=client).acquire())
+        self.assertFalse(RedisLease('alerts:test', 30, client=client).acquire())
+        self.assertEqual(client.set.call_args.kwargs, {'nx': True, 'px': 30000})
+
+    @override_settings(ALERT_LEASE_REDIS_URL='redis://leases:6379/1', ALERT_LEASE_REDIS_TIMEOUT=0.25)
+    def test_lease_client_calls_are_bounded(self):
+        with mock.patch('alerts.leases._lease_client', None), mock.patch('redis.Redis.from_url') as from_url:
+            get_lease_client()
+        from_url.assert_called_once_with('redis://leases:6379/1', socket_connect_timeout=0.25, socket_timeout=0.25)
+
+
+class FakeLeaseRedis:
+    """The subset of redis.Redis used by leases and run metrics; keys never expire."""
+
+    def __init__(self):
+        self.values = {}
+        self.metrics = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def eval(self, script, numkeys, key, token, *args):
+        if self.values.get(key) != token:
+            return 0
+        if script == RELEASE_SCRIPT:
+            del self.values[key]
+        return 1
+
+    def hincrby(self, key, field, amount):
+        self.metrics[field] = self.metrics.get(field, 0) + amount
+
+    def hgetall(self, key):
+        return {field.encode(): str(value).encode() for field, value in self.metrics.items()}
+
+
+def run_chord(header):
+    """Runs a chord like a worker would: the callback only once every header task has returned."""
+    def apply(callback):
+        results = [task.apply().get() for task in header.tasks]
+        return callback.apply(args=(results,)).get()
+    return apply
+
+
+@override_settings(ALERT_SHARD_USE_CHORD=True, ALERT_RUN_OVERLAP_POLICY='skip')
+class ShardedRunTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeLeaseRedis()
+        for target, value in [
+            ('alerts.leases.get_lease_client', mock.Mock(return_value=self.redis)),
+            ('alerts.tasks.chord', run_chord),
+            ('alerts.tasks.defer_closed_market_alerts', mock.Mock(return_value=0)),
+            ('alerts.tasks.partition_due_alerts', mock.Mock(return_value={0: [1], 1: [2]})),
+            ('alerts.tasks.load_due_alerts', mock.Mock(side_effect=lambda now, alert_ids: alert_ids)),
+        ]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_failed_shard_releases_the_run_lease(self):
+        def evaluate(alert_ids, now, lease=None):
+            if alert_ids == [2]:
+                raise RuntimeError('database is down')
+            return {'alerts': 1}
+
+        with mock.patch('alerts.tasks.evaluate_alerts', side_effect=evaluate):
+            process_alerts()
+            self.assertEqual(self.redis.values, {})
+            process_alerts()
+        self.assertEqual(self.redis.metrics.get('runs'), 2)
+        self.assertEqual(self.redis.metrics.get('failed_shards'), 2)
+        self.assertNotIn('skipped_runs', self.redis.metrics)
+
+    @override_settings(ALERT_RUN_LATE_AFTER=60)
+    def test_beat_runs_measure_lateness_from_their_publish_time(self):
+        body = ((), {}, {})
+        stamp_scheduled_at(body=body)
+        published = datetime.fromisoformat(body[1]['scheduled_at'])
+        self.assertLess(abs((timezone.now() - published).total_seconds()), 5)
+
+        # A retried run keeps the time it was first scheduled at
+        retried = ((), {'scheduled_at': '2024-01-01T00:00:00+00:00'}, {})
+        stamp_scheduled_at(body=retried)
+        self.assertEqual(retried[1]['scheduled_at'], '2024-01-01T00:00:00+00:00')
+
+        with mock.patch('alerts.tasks.evaluate_alerts', return_value={}):
+            process_alerts(scheduled_at=(timezone.now() - timedelta(minutes=2)).isoformat())
+            process_alerts()
+        self.assertEqual(self.redis.metrics.get('late_runs'), 1)
+
+    def test_failed_shard_is_counted_in_the_run_totals(self):
+        with mock.patch('alerts.tasks.evaluate_alerts', side_effect=RuntimeError('provider error')):
+            totals = evaluate_alert_shard(3, [7], timezone.now().isoformat())
+        self.assertEqual(totals, {'failed': 1, 'shard': 3})
+        # The shard lease is released too
+        self.assertEqual(self.redis.values, {})
+
+
+class AlertUpdateBufferTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.now = timezone.now()
+
+    def buffer_run(self, count):
+        """Buffers the changes of a run over `count` alerts per field set and returns the buffer."""
+        updates = AlertUpdateBuffer()
+        for number in range(count):
+            # Deactivated only, checked only, and triggered (both)
+            deactivated, checked, triggered = (create_price_alert(self.user, f"S{number}") for _ in range(3))
+            deactivated.is_active = triggered.is_active = False
+            updates.add(deactivated, 'is_active')
+            updates.add(triggered, 'is_active')
+            for alert in (checked, triggered):
+                alert.last_triggered_at = self.now
+                alert.next_check_at = self.now + timedelta(minutes=5)
+                updates.add(alert, 'last_triggered_at', 'next_check_at')
+        return updates
+
+    def test_alerts_are_written_in_a_bounded_number_of_statements(self):
+        for count in (2, 20):
+            updates = self.buffer_run(count)
+            # One UPDATE per field set, plus SAVEPOINT and RELEASE for the atomic block inside the test case
+            with self.assertNumQueries(5):
+                updates.flush()
+            self.assertEqual((updates.flushed_alerts, updates.statements), (3 * count, 3))
+
+        self.assertEqual(Alert.objects.filter(is_active=False).count(), 2 * 22)
+        self.assertEqual(Alert.objects.filter(last_triggered_at=self.now).count(), 2 * 22)
+        self.assertEqual(Alert.objects.filter(is_active=True, last_triggered_at=None).count(), 0)
+
+
+class AlertNotificationTests(TestCase):
+    def setUp(self):
+        self.alert = create_price_alert(create_user(), 'AAPL')
+        send = mock.patch('alerts.tasks.send_alert_notification')
+        self.send = send.start()
+        self.addCleanup(send.stop)
+
+    def test_notification_is_sent_after_the_deactivation_commits(self):
+        updates = AlertUpdateBuffer()
+        trigger_alert(self.alert, 101.5, updates)
+        self.assertFalse(self.send.called)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            updates.flush()
+            self.assertFalse(self.send.called)
+        self.assertEqual(len(callbacks), 1)
+        self.send.assert_called_once_with(self.alert, 101.5)
+        self.assertFalse(Alert.objects.get(pk=self.alert.pk).is_active)
+
+    def test_no_notification_when_the_flush_fails(self):
+        updates = AlertUpdateBuffer()
+        trigger_alert(self.alert, 101.5, updates)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with mock.patch.object(Alert.objects, 'bulk_update', side_effect=RuntimeError('database is down')):
+                with self.assertRaises(RuntimeError):
+                    updates.flush()
+        self.assertEqual(callbacks, [])
+        self.assertFalse(self.send.called)
+        self.assertTrue(Alert.objects.get(pk=self.alert.pk).is_active)
+        # Nothing is left to send with a later flush either
+        updates.flush()
+        self.assertEqual(updates.pending_notifications, 0)
+
+
+class ThresholdIndexTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.rng = np.random.default_rng(3)
+
+    def test_price_targets_match_linear_scan(self):
+        targets = {}
+        for _ in range(300):
+            condition, target = str(self.rng.choice(['GT', 'LT'])), round(float(self.rng.uniform(80, 120)), 1)
+            targets[create_price_alert(self.user, 'AAPL', target_price=target, condition=condition).pk] = (
+                condition, target)
+        # Alerts without a condition never trigger
+        create_price_alert(self.user, 'AAPL', condition=None)
+
+        index = PriceTargetIndex.from_alerts(Alert.objects.select_related('price_target_alert'))
+        self.assertEqual(len(index), len(targets))
+        for price in self.rng.uniform(80, 120, 20):
+            expected = {alert_id for alert_id, (condition, target) in targets.items()
+                        if (condition == 'GT' and price > target) or (condition == 'LT' and price < target)}
+            self.assertEqual(set(index.triggered(price).tolist()), expected)
+
+    def test_only_due_alerts_are_triggered(self):
+        crossed, not_due, missed = (create_price_alert(self.user, 'AAPL', target_price=target)
+                                    for target in (90, 95, 110))
+        Alert.objects.exclude(pk=not_due.pk).update(next_check_at=timezone.now() - timedelta(minutes=1))
+        due = load_due_alerts(timezone.now())
+
+        bars = make_bars(100)
+        bars['close'] = 100.0
+        updates = AlertUpdateBuffer()
+        with mock.patch('alerts.tasks.send_alert_notification') as send:
+            process_price_target_alerts('AAPL', due, FrameSet(fetch=lambda symbol, period, interval: bars), updates)
+            with self.captureOnCommitCallbacks(execute=True):
+                updates.flush()
+        send.assert_called_once()
+        self.assertEqual(send.call_args.args[0].pk, crossed.pk)
+        self.assertEqual(set(Alert.objects.filter(is_active=True).values_list('pk', flat=True)),
+                         {not_due.pk, missed.pk})
+
+    def test_percentage_change_thresholds(self):
+        alerts = [create_percent_change_alert(self.user, 'AAPL', percentage_change=threshold, direction=direction)
+                  for direction, threshold in [('UP', 1), ('UP', 2), ('DOWN', 1), ('DOWN', 3)]]
+        index = PercentChangeIndex.from_alerts(Alert.objects.select_related('percentage_change'))
+        up_1, up_2, down_1, down_3 = (alert.pk for alert in alerts)
+
+        bars = make_bars(120)
+        bars['close'] = np.linspace(100, 103, 120)
+        change = get_percentage_change(bars, '1H')
+        self.assertAlmostEqual(change, (103 - bars['close'].iloc[-61]) / bars['close'].iloc[-61] * 100)
+        self.assertEqual(set(index.triggered(change).tolist()), {up_1})
+        self.assertEqual(set(index.triggered(2.0).tolist()), {up_1, up_2})
+        self.assertEqual(set(index.triggered(-3.0).tolist()), {down_1, down_3})
+
+    def test_percentage_change_alerts_use_their_own_lookback(self):
+        over_hour, over_5_minutes = (create_percent_change_alert(self.user, 'AAPL', percentage_change=1,
+                                                                 lookback_period=lookback)
+                                     for lookback in ('1H', '5MIN'))
+        create_percent_change_alert(self.user, 'AAPL', percentage_change=1, direction='DOWN', lookback_period='1H')
+        Alert.objects.update(next_check_at=timezone.now() - timedelta(minutes=1))
+
+        # Up 1.5% over the last hour, 0.1% over the last five minutes
+        bars = make_bars(120)
+        bars['close'] = np.linspace(100, 103, 120)
+        updates = AlertUpdateBuffer()
+        with mock.patch('alerts.tasks.send_alert_notification') as send:
+            process_percentage_change_alerts(
+                'AAPL', load_due_alerts(timezone.now()), FrameSet(fetch=lambda symbol, period, interval: bars),
+                updates)
+            with self.captureOnCommitCallbacks(execute=True):
+                updates.flush()
+        self.assertEqual([call.args[0].pk for call in send.call_args_list], [over_hour.pk])
+        self.assertTrue(Alert.objects.get(pk=over_5_minutes.pk).is_active)
+
+
+class ChainProgramTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.rsi = IndicatorDefinition.objects.create(name='rsi', display_name='RSI')
+        self.ema = IndicatorDefinition.objects.create(name='ema', display_name='EMA')
+
+        self.alerts = [create_chain_alert(self.user, 'AAPL', [
+            dict(indicator=self.rsi, indicator_parameters={'length': 14}, indicator_timeframe='1H',
+                 condition_operator='GT', value_type='NUMBER', value_number=0),
+            dict(indicator=self.ema, indicator_parameters={'length': 20}, indicator_timeframe='1H',
+                 condition_operator='LT', value_type='PRICE'),
+        ]) for _ in range(5)]
+        Alert.objects.update(next_check_at=timezone.now())
+
+    def test_identical_chains_share_every_node(self):
+        chains = ChainProgram()
+        for alert in load_due_alerts(timezone.now()):
+            chains.add(alert)
+        # rsi, 0, rsi > 0, ema, price, ema < price
+        self.assertEqual(len(chains.nodes), 6)
+        self.assertEqual(chains.dedup_ratio, 5)
+
+        bars = make_bars(500)
+        frames = FrameSet(fetch=lambda symbol, period, interval: bars)
+        indicator_results = IndicatorResultCache()
+        results = chains.evaluate('AAPL', self.alerts, frames, indicator_results)
+
+        expected = (calculate_indicator('rsi', bars, parameters={'length': 14}) > 0
+                    and calculate_indicator('ema', bars, parameters={'length': 20}) < bars['close'].iloc[-1])
+        self.assertEqual(results, {alert.id: expected for alert in self.alerts})
+        self.assertEqual(frames.fetch_count, 1)
+        self.assertLessEqual(indicator_results.misses, 2)
+
+    def test_cheap_failing_condition_skips_expensive_fetch(self):
+        # Minute bars first in the chain, but the daily condition can never hold
+        alert = create_chain_alert(self.user, 'MSFT', [
+            dict(indicator=self.rsi, indicator_timeframe='1MIN', condition_operator='GT', value_type='NUMBER',
+                 value_number=0),
+            dict(indicator=self.rsi, indicator_timeframe='1D', condition_operator='LT', value_type='NUMBER',
+                 value_number=-1),
+        ])
+
+        chains = ChainProgram()
+        chains.add(alert)
+        fetched = []
+
+        def fetch(symbol, period, interval):
+            fetched.append(interval)
+            return make_bars(500)
+
+        results = chains.evaluate('MSFT', [alert], FrameSet(fetch=fetch), IndicatorResultCache())
+        self.assertEqual(results, {alert.id: False})
+        self.assertEqual(fetched, ['1d'])
+
+
+    def test_node_value_does_not_depend_on_co_due_chains(self):
+        days = pd.date_range('2019-01-02', '2024-06-28', freq='B', tz='America/New_York')
+        bars = make_bars(index=days)
+        condition = dict(indicator=self.ema, indicator_parameters={'length': 20}, indicator_timeframe='1D',
+                         condition_operator='GT', value_type='NUMBER', value_number=0)
+        # A long warm-up on the same timeframe makes the symbol fetch more history
+        long_condition = dict(condition, indicator_parameters={'length': 200})
+        short_alert = create_chain_alert(self.user, 'MSFT', [condition])
+        long_alert = create_chain_alert(self.user, 'MSFT', [long_condition])
+
+        def node_value(alerts):
+            chains = ChainProgram()
+            for alert in alerts:
+                chains.add(alert)
+            node = chains.chains[short_alert.id][0].left
+            frames = FrameSet(fetch=lambda symbol, period, interval: slice_period(bars, period))
+            evaluation = ChainEvaluation(chains, 'MSFT', frames, IndicatorResultCache())
+            return node, evaluation.value(node)
+
+        node, alone = node_value([short_alert])
+        _, together = node_value([short_alert, long_alert])
+        self.assertEqual(alone, together)
+        self.assertEqual(alone, calculate_indicator('ema', slice_period(bars, node.period), parameters={'length': 20}))
+
+
+class SharedIndicatorPassTests(TestCase):
+    def setUp(self):
+        user = create_user()
+        rsi = IndicatorDefinition.objects.create(name='rsi', display_name='RSI')
+        ema = IndicatorDefinition.objects.create(name='ema', display_name='EMA')
+        shared = dict(indicator=rsi, indicator_parameters={'length': 14}, indicator_timeframe='1H',
+                      condition_operator='GT', value_type='NUMBER', value_number=0)
+        for number in range(BATCH_MIN_SYMBOLS):
+            create_chain_alert(user, f"S{number}", [shared])
+        # A config of one symbol only is left to its chain
+        create_chain_alert(user, 'LONE', [dict(shared, indicator=ema, indicator_timeframe='1D')])
+        Alert.objects.update(next_check_at=timezone.now())
+
+        self.chains = ChainProgram()
+        for alert in load_due_alerts(timezone.now()):
+            self.chains.add(alert)
+
+    def test_shared_frames_are_fetched_before_the_batch(self):
+        bars = make_bars(3000)
+        fetched = []
+
+        def fetch_all(keys):
+            fetched.extend(keys)
+            return ((key, bars) for key in keys)
+
+        frames = FrameSet(fetch=lambda symbol, period, interval: self.fail('fetched outside the batch'))
+        indicator_results = IndicatorResultCache(streaming=StreamingEngine())
+        self.assertEqual(precompute_shared_indicators(self.chains, frames, indicator_results, fetch_all),
+                         BATCH_MIN_SYMBOLS)
+        self.assertEqual({symbol for symbol, _, _ in fetched}, {f"S{number}" for number in range(BATCH_MIN_SYMBOLS)})
+
+        # The chains read the precomputed values
+        node = next(node for node in self.chains.indicator_nodes() if node.symbol == 'S0')
+        evaluation = ChainEvaluation(self.chains, 'S0', frames, indicator_results)
+        data = evaluation.get_indicator_frame(node)
+        self.assertAlmostEqual(evaluation.value(node), calculate_indicator('rsi', data, parameters={'length': 14}),
+                               delta=1e-9)
+        self.assertEqual(indicator_results.hits, 1)
+        self.assertEqual(indicator_results.streaming.stats()['entries'], 0)
+
+
+class CountingFetcher:
+    """MarketDataFetcher stand-in counting the downloads of every (symbol, interval, period) key."""
+
+    def __init__(self):
+        self.downloads = Counter()
+
+    def get_stock_data(self, symbol, period='1mo', interval='1d'):
+        self.downloads[(symbol, interval, period)] += 1
+        return make_bars(3000)
+
+    def fetch(self, keys):
+        for key in dict.fromkeys(keys):
+            self.downloads[key] += 1
+            yield key, make_bars(3000)
+
+    def stats(self):
+        return dict(self.downloads)
+
+
+class EvaluationPlanTests(TestCase):
+    def setUp(self):
+        user = create_user()
+        rsi = IndicatorDefinition.objects.create(name='rsi', display_name='RSI')
+        ema = IndicatorDefinition.objects.create(name='ema', display_name='EMA')
+        conditions = [
+            dict(indicator=rsi, indicator_parameters={'length': 14}, indicator_timeframe='1H',
+                 condition_operator='GT', value_type='NUMBER', value_number=101),
+            dict(indicator=rsi, indicator_parameters={'length': 14}, indicator_timeframe='1H',
+                 condition_operator='LT', value_type='INDICATOR_LINE', value_indicator=ema, value_timeframe='1D'),
+        ]
+        for symbol in ('AAPL', 'MSFT', 'NVDA'):
+            for target in (50, 1000):
+                create_price_alert(user, symbol, target_price=target)
+            for lookback in ('1D', '1D', '1W'):
+                create_percent_change_alert(user, symbol, percentage_change=50, lookback_period=lookback)
+            for _ in range(3):
+                create_chain_alert(user, symbol, conditions)
+        self.now = timezone.now()
+        Alert.objects.update(next_check_at=self.now - timedelta(minutes=1))
+
+    def test_every_frame_is_fetched_once_per_run(self):
+        due = load_due_alerts(self.now)
+        keys = {key for alert in due for key in get_alert_data_requirements(alert)}
+        fetcher = CountingFetcher()
+        with mock.patch('alerts.tasks.get_market_data_fetcher', return_value=fetcher), \
+                mock.patch('alerts.tasks.send_alert_notification'):
+            totals = evaluate_alerts(due, self.now)
+
+        self.assertEqual(len(due), 24)
+        self.assertLess(len(keys), len(due))
+        self.assertEqual(totals['fetches'], len(keys))
+        self.assertEqual(set(fetcher.downloads), keys)
+        self.assertEqual(set(fetcher.downloads.values()), {1})
+
+
+class TimeframeTests(SimpleTestCase):
+    def test_intraday_bins_start_at_the_session_open(self):
+        bars = make_bars(index=session_index(2))
+        hourly = resample_data(bars, '1H')
+        self.assertEqual(hourly.index[0], pd.Timestamp('2024-01-02 09:30', tz='America/New_York'))
+        first = bars.iloc[:60]
+        self.assertEqual(hourly.iloc[0].tolist(), [
+            first['open'].iloc[0], first['high'].max(), first['low'].min(), first['close'].iloc[-1],
+            first['volume'].sum()])
+        # 6.5 hour sessions: the last bin of each day is half an hour
+        self.assertEqual(len(hourly), 14)
+
+    def test_partial_first_session_does_not_shift_the_bins(self):
+        bars = make_bars(index=session_index(3, first_bar='11:07'))
+        hourly = resample_data(bars, '1H')
+        self.assertEqual(hourly.index[0], pd.Timestamp('2024-01-02 10:30', tz='America/New_York'))
+        self.assertTrue((hourly.index.minute == 30).all())
+
+    def test_derived_bars_match_a_full_resample_as_the_base_slides(self):
+        bars = make_bars(index=session_index(4))
+        deriver = TimeframeDeriver()
+        for timeframe in ('5MIN', '1H', '4H', '1D'):
+            for end in range(780, len(bars), 97):
+                # Two sessions worth of bars, so the window starts mid-session most of the time
+                window = bars.iloc[end - 780:end]
+                pd.testing.assert_frame_equal(
+                    deriver.derive('TEST', window, '1MIN', timeframe), resample_data(window, timeframe),
+                    obj=f"{timeframe} bars ending at {window.index[-1]}")
+
+
+class WarmupPlanningTests(SimpleTestCase):
+    def condition(self, indicator, parameters=None, timeframe='1D', value_indicator=None, value_parameters=None,
+                  value_timeframe=None):
+        return SimpleNamespace(
+            indicator=SimpleNamespace(name=indicator), indicator_parameters=parameters, indicator_timeframe=timeframe,
+            value_type='INDICATOR_LINE' if value_indicator else 'NUMBER',
+            value_indicator=SimpleNamespace(name=value_indicator) if value_indicator else None,
+            value_indicator_parameters=value_parameters, value_timeframe=value_timeframe)
+
+    def test_windows_follow_indicator_warmup(self):
+        # MACD has no 'length': 26 + 9 - 1 daily bars need more than a month of calendar days
+        self.assertEqual(get_chain_data_requirements([self.condition('macd')])['1D'], ('1d', '3mo', '1D'))
+        self.assertEqual(get_chain_data_requirements([self.condition('rsi')])['1D'], ('1d', '1mo', '1D'))
+        # Ichimoku's spans are shifted by kijun on top of senkou
+        self.assertEqual(get_chain_data_requirements([self.condition('ichimoku')])['1D'], ('1d', '6mo', '1D'))
+
+    def test_value_indicator_sizes_shared_timeframe(self):
+        conditions = [self.condition('rsi', {'length': 14}, value_indicator='ema', value_parameters=None,
+                                     value_timeframe='1D'),
+                      self.condition('rsi', None, value_indicator='moving_average',
+                                     value_parameters={'length': 200}, value_timeframe='1D')]
+        self.assertEqual(get_chain_data_requirements(conditions)['1D'], ('1d', '1y', '1D'))
@@ -0,0 +1,112 @@
+# alerts/thresholds.py
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class SortedThresholds:
+    """
+    Thresholds keyed by alert id, kept in a sorted NumPy array so every threshold crossed by a value is
+    found with one binary search.
+
+    Args:
+        thresholds (dict): alert id -> threshold.
+    """
+
+    def __init__(self, thresholds):
+        keys = np.fromiter(thresholds.keys(), dtype=np.int64, count=len(thresholds))
+        values = np.fromiter(thresholds.values(), dtype=float, count=len(thresholds))
+        order = np.argsort(values, kind='stable')
+        self._values, self._keys = values[order], keys[order]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def below(self, value, inclusive=False):
+        """Returns the keys whose threshold is below `value` (or equal to it if `inclusive`)."""
+        end = np.searchsorted(self._values, value, side='right' if inclusive else 'left')
+        return self._keys[:end]
+
+    def above(self, value, inclusive=False):
+        """Returns the keys whose threshold is above `value` (or equal to it if `inclusive`)."""
+        start = np.searchsorted(self._values, value, side='left' if inclusive else 'right')
+        return self._keys[start:]
+
+
+class ThresholdIndex(ABC):
+    """
+    Thresholds of one group of alerts, one SortedThresholds per condition.
+
+    Indexes are built by each scheduler run from the due alerts it loaded (see from_alerts), so they never
+    go stale when alerts change in another process.
+
+    Args:
+        entries (iterable): (alert id, condition, threshold) tuples.
+    """
+
+    CONDITIONS = ()
+
+    def __init__(self, entries=()):
+        by_condition = {condition: {} for condition in self.CONDITIONS}
+        for alert_id, condition, threshold in entries:
+            by_condition[condition][alert_id] = float(threshold)
+        self.conditions = {condition: SortedThresholds(thresholds) for condition, thresholds in by_condition.items()}
+
+    def __len__(self):
+        return sum(len(thresholds) for thresholds in self.conditions.values())
+
+    @classmethod
+    def from_alerts(cls, alerts):
+        """Builds the index of `alerts`, e.g. the due alerts of one symbol loaded by a scheduler run."""
+        entries = ((alert.pk, cls.get_entry(alert)) for alert in alerts)
+        return cls((alert_id, *entry) for alert_id, entry in entries if entry is not None)
+
+    @staticmethod
+    @abstractmethod
+    def get_entry(alert):
+        """Returns (condition, threshold) for an alert this index holds, else None."""
+
+    @abstractmethod
+    def triggered(self, value):
+        """Returns the ids of the alerts whose threshold `value` has crossed."""
+
+
+class PriceTargetIndex(ThresholdIndex):
+    """Price targets of one symbol: GT alerts trigger above their target, LT alerts below it."""
+
+    CONDITIONS = ('GT', 'LT')
+
+    @staticmethod
+    def get_entry(alert):
+        detail = getattr(alert, 'price_target_alert', None) if alert.alert_type == 'PRICE' else None
+        if detail is None or detail.condition is None:
+            return None
+        return detail.condition, detail.target_price
+
+    def triggered(self, price):
+        """Returns the ids of the alerts whose target `price` has crossed."""
+        return np.concatenate([self.conditions['GT'].below(price), self.conditions['LT'].above(price)])
+
+
+class PercentChangeIndex(ThresholdIndex):
+    """
+    Percentage change thresholds of one (symbol, lookback period): UP alerts trigger once the change
+    reaches their threshold, DOWN alerts once it falls to minus their threshold.
+    """
+
+    CONDITIONS = ('UP', 'DOWN')
+
+    @staticmethod
+    def get_entry(alert):
+        detail = getattr(alert, 'percentage_change', None) if alert.alert_type == 'PERCENT_CHANGE' else None
+        if detail is None:
+            return None
+        return detail.direction, detail.percentage_change
+
+    def triggered(self, change):
+        """Returns the ids of the alerts whose threshold the realized `change` (in %) has crossed."""
+        return np.concatenate([
+            self.conditions['UP'].below(change, inclusive=True),
+            self.conditions['DOWN'].below(-change, inclusive=True),
+        ])
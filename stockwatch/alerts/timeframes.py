@@ -0,0 +1,139 @@
+# alerts/timeframes.py
+
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# Pandas resample frequencies for IndicatorCondition timeframes
+TIMEFRAME_FREQ = {
+    '1MIN': '1min',
+    '5MIN': '5min',
+    '15MIN': '15min',
+    '30MIN': '30min',
+    '1H': '1h',
+    '4H': '4h',
+    '1D': '1D',
+}
+
+# Bar length in seconds for each timeframe
+TIMEFRAME_SECONDS = {
+    '1MIN': 60,
+    '5MIN': 300,
+    '15MIN': 900,
+    '30MIN': 1800,
+    '1H': 3600,
+    '4H': 14400,
+    '1D': 86400,
+}
+
+OHLCV_AGGREGATION = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+}
+
+
+def can_derive(base_timeframe, timeframe):
+    """True if `timeframe` bars can be aggregated from whole `base_timeframe` bars."""
+    base_seconds = TIMEFRAME_SECONDS.get(base_timeframe)
+    seconds = TIMEFRAME_SECONDS.get(timeframe)
+    if not base_seconds or not seconds:
+        return False
+    return seconds > base_seconds and seconds % base_seconds == 0
+
+
+def session_offset(index, freq):
+    """
+    Returns the bin offset that aligns intraday bins on the first bar of the session.
+
+    yfinance starts US equity hourly bars at 09:30, not 09:00, while 24/7 markets start at midnight.
+    """
+    if freq == '1D' or len(index) == 0:
+        return None
+    # Most common time of the first bar of each day, so a partial first day does not skew the bins
+    day_starts = index.to_series().groupby(index.normalize()).min()
+    offsets = (day_starts - day_starts.index) % pd.Timedelta(freq)
+    return offsets.mode().iloc[0]
+
+
+def resample_data(df, timeframe, offset=None):
+    """
+    Resample the DataFrame according to the specified timeframe.
+
+    Args:
+        df (pd.DataFrame): Original DataFrame with datetime index.
+        timeframe (str): Timeframe string, e.g., '1MIN', '5MIN', '1H', '1D'
+        offset (pd.Timedelta): Bin offset, session_offset() of `df` by default.
+
+    Returns:
+        pd.DataFrame: Resampled DataFrame.
+    """
+    resample_freq = TIMEFRAME_FREQ.get(timeframe)
+    if resample_freq:
+        columns = {column: how for column, how in OHLCV_AGGREGATION.items() if column in df.columns}
+        if offset is None:
+            offset = session_offset(df.index, resample_freq)
+        resampler = df.resample(resample_freq, offset=offset) if offset else df.resample(resample_freq)
+        resampled_data = resampler.agg(columns).dropna()
+        return resampled_data
+    else:
+        raise ValueError(f"Unknown timeframe: {timeframe}")
+
+
+class TimeframeDeriver:
+    """
+    Builds coarser OHLCV bins from a finer base series and keeps them for the next refresh.
+
+    When the base series moves on, bins that lie entirely inside the new base window are reused as they
+    are; the bins at either end, which may have lost bars to the window start or gained bars at the end,
+    are re-aggregated. The result is the same as resample_data() on the whole base series. Bins are only
+    reused while the session offset of the base series stays the same.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._derived = OrderedDict()  # (symbol, base_timeframe, timeframe) -> (offset, DataFrame)
+        self._lock = threading.Lock()
+
+    def derive(self, symbol, base_data, base_timeframe, timeframe):
+        if base_data.empty:
+            return base_data
+        if base_timeframe == timeframe:
+            return base_data
+        if timeframe not in TIMEFRAME_FREQ:
+            raise ValueError(f"Unknown timeframe: {timeframe}")
+
+        offset = session_offset(base_data.index, TIMEFRAME_FREQ[timeframe])
+        key = (symbol, base_timeframe, timeframe)
+        with self._lock:
+            cached_offset, cached = self._derived.get(key, (None, None))
+
+        reusable = None
+        if cached is not None and not cached.empty and cached_offset == offset:
+            reusable = cached[(cached.index >= base_data.index[0]) & (cached.index < cached.index[-1])]
+        if reusable is not None and not reusable.empty:
+            # Re-aggregate the first bin and the last (possibly partial) one onward
+            head = resample_data(base_data[base_data.index < reusable.index[0]], timeframe, offset)
+            tail = resample_data(base_data[base_data.index >= cached.index[-1]], timeframe, offset)
+            derived = pd.concat([head, reusable, tail])
+        else:
+            derived = resample_data(base_data, timeframe, offset)
+
+        with self._lock:
+            self._derived[key] = (offset, derived)
+            self._derived.move_to_end(key)
+            while len(self._derived) > self.max_entries:
+                self._derived.popitem(last=False)
+        return derived
+
+
+_deriver = TimeframeDeriver()
+
+
+def derive_timeframe(symbol, base_data, base_timeframe, timeframe):
+    """Returns `timeframe` bars aggregated from `base_data`, reusing the process-wide derived cache."""
+    return _deriver.derive(symbol, base_data, base_timeframe, timeframe)
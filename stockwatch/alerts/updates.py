@@ -0,0 +1,66 @@
+# alerts/updates.py
+
+from django.db import transaction
+
+from .models import Alert
+
+
+# Alerts written per bulk UPDATE / transaction
+UPDATE_BATCH_SIZE = 500
+
+
+class AlertUpdateBuffer:
+    """
+    Collects the Alert fields changed by one scheduler run and writes them with bulk_update.
+
+    Only the changed fields are written, one transaction per batch of `batch_size` alerts, instead of a
+    full-row save() per alert and per state change.
+
+    Notifications queued with `notify` are sent once the flush that writes them commits, so a triggered
+    alert is never reported while its deactivation can still be lost.
+    """
+
+    def __init__(self, batch_size=UPDATE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._pending = {}  # alert pk -> (alert, changed fields)
+        self._notifications = []
+        self.flushed_alerts = 0
+        self.statements = 0
+
+    def add(self, alert, *fields):
+        """Records that `fields` of `alert` were changed in memory. Flushes once a batch is full."""
+        _, changed = self._pending.setdefault(alert.pk, (alert, set()))
+        changed.update(fields)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def notify(self, send):
+        """Queues `send()` to run after the next flush has committed."""
+        self._notifications.append(send)
+
+    def flush(self):
+        if not self._pending and not self._notifications:
+            return
+        pending, self._pending = list(self._pending.values()), {}
+        notifications, self._notifications = self._notifications, []
+
+        # bulk_update writes one field list for every row, so group alerts by the fields they changed
+        by_fields = {}
+        for alert, fields in pending:
+            by_fields.setdefault(tuple(sorted(fields)), []).append(alert)
+
+        with transaction.atomic():
+            for fields, alerts in by_fields.items():
+                Alert.objects.bulk_update(alerts, fields, batch_size=self.batch_size)
+                self.statements += 1
+            # Dropped with the transaction if the writes fail; the alerts stay active and are checked again
+            for send in notifications:
+                transaction.on_commit(send, robust=True)
+        self.flushed_alerts += len(pending)
+
+    @property
+    def pending_notifications(self):
+        return len(self._notifications)
+
+    def __len__(self):
+        return len(self._pending)
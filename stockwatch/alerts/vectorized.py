@@ -0,0 +1,249 @@
+# alerts/vectorized.py
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .indicators import get_indicator_spec
+
+
+# Minimum number of distinct symbols sharing an indicator config before it is computed in one batch
+BATCH_MIN_SYMBOLS = 8
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# (symbols × bars) kernels
+#
+# Rows are symbols, columns are bars, oldest first. Shorter series are padded on the left with NaN
+# (see stack_frames), so every kernel treats leading NaN as "no data yet" and starts each row at its
+# own first bar, like the per-symbol pandas_ta call would.
+# ─────────────────────────────────────────────────────────────────────────────
+def stack_frames(frames, column):
+    """
+    Builds a right-aligned (len(frames) × longest frame) matrix from one column of each frame.
+
+    Args:
+        frames (list): OHLCV DataFrames, one per row.
+        column (str): Column to stack, e.g. 'close'.
+
+    Returns:
+        np.ndarray: float64 matrix, left-padded with NaN.
+    """
+    width = max((len(frame) for frame in frames), default=0)
+    matrix = np.full((len(frames), width), np.nan)
+    for row, frame in enumerate(frames):
+        if len(frame):
+            matrix[row, width - len(frame):] = frame[column].to_numpy(dtype=float)
+    return matrix
+
+
+def _pad_windows(values, length):
+    """Left-pads the result of a length-`length` window reduction back to the input width."""
+    padded = np.full((values.shape[0], length - 1), np.nan)
+    return np.concatenate([padded, values], axis=1)
+
+
+def _windows(matrix, length):
+    if matrix.shape[1] < length:
+        return None
+    return sliding_window_view(matrix, length, axis=1)
+
+
+def _shift(matrix, periods):
+    shifted = np.full_like(matrix, np.nan)
+    if periods < matrix.shape[1]:
+        shifted[:, periods:] = matrix[:, :-periods]
+    return shifted
+
+
+def sma(close, length):
+    windows = _windows(close, length)
+    if windows is None:
+        return np.full_like(close, np.nan)
+    return _pad_windows(windows.mean(axis=-1), length)
+
+
+def rolling_std(close, length, ddof=0):
+    windows = _windows(close, length)
+    if windows is None:
+        return np.full_like(close, np.nan)
+    return _pad_windows(windows.std(axis=-1, ddof=ddof), length)
+
+
+def wma(close, length):
+    windows = _windows(close, length)
+    if windows is None:
+        return np.full_like(close, np.nan)
+    weights = np.arange(1, length + 1, dtype=float)
+    return _pad_windows(windows @ weights / weights.sum(), length)
+
+
+def ema(close, length):
+    """ewm(span=length, adjust=False) seeded with the SMA of each row's first `length` values."""
+    rows, width = close.shape
+    alpha = 2.0 / (length + 1)
+    valid = ~np.isnan(close)
+    first = np.where(valid.any(axis=1), valid.argmax(axis=1), width)
+    seed_at = first + length - 1
+    seeds = np.full(rows, np.nan)
+    has_seed = seed_at < width
+    seeds[has_seed] = sma(close, length)[has_seed, seed_at[has_seed]]
+
+    result = np.full_like(close, np.nan)
+    previous = np.full(rows, np.nan)
+    for bar in range(width):
+        current = alpha * close[:, bar] + (1 - alpha) * previous
+        current = np.where(bar == seed_at, seeds, np.where(bar > seed_at, current, np.nan))
+        result[:, bar] = current
+        previous = current
+    return result
+
+
+def rma(values, length):
+    """ewm(alpha=1/length, min_periods=length).mean() with pandas' default adjust=True."""
+    rows, width = values.shape
+    decay = 1.0 - 1.0 / length
+    numerator = np.zeros(rows)
+    denominator = np.zeros(rows)
+    count = np.zeros(rows, dtype=int)
+    result = np.full_like(values, np.nan)
+    for bar in range(width):
+        column = values[:, bar]
+        valid = ~np.isnan(column)
+        numerator = np.where(valid, np.where(valid, column, 0.0) + decay * numerator, numerator)
+        denominator = np.where(valid, 1.0 + decay * denominator, denominator)
+        count += valid
+        result[:, bar] = np.where(count >= length, numerator / np.where(denominator > 0, denominator, 1.0), np.nan)
+    return result
+
+
+def rsi(close, length):
+    change = close - _shift(close, 1)
+    gains = np.where(np.isnan(change), np.nan, np.maximum(change, 0.0))
+    losses = np.where(np.isnan(change), np.nan, np.maximum(-change, 0.0))
+    average_gain, average_loss = rma(gains, length), rma(losses, length)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100.0 * average_gain / (average_gain + average_loss)
+
+
+def roc(close, length):
+    previous = _shift(close, length)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100.0 * (close - previous) / previous
+
+
+def zscore(close, length):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (close - sma(close, length)) / rolling_std(close, length, ddof=1)
+
+
+def bbands(close, length, stddev):
+    middle = sma(close, length)
+    deviation = stddev * rolling_std(close, length, ddof=0)
+    return {'upper_band': middle + deviation, 'middle_band': middle, 'lower_band': middle - deviation}
+
+
+def atr(high, low, close, length):
+    previous_close = _shift(close, 1)
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - previous_close), np.abs(low - previous_close)))
+    return rma(true_range, length)
+
+
+def macd(close, fast, slow, signal):
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return {'macd_line': line, 'signal_line': signal_line, 'histogram': line - signal_line}
+
+
+# Indicator name -> kernel(matrices, coerced parameters); matrices maps OHLCV column names to (symbols × bars)
+BATCH_INDICATORS = {
+    'moving_average': lambda m, p: sma(m['close'], p['length']),
+    'ema': lambda m, p: ema(m['close'], p['length']),
+    'wma': lambda m, p: wma(m['close'], p['length']),
+    'rsi': lambda m, p: rsi(m['close'], p['length']),
+    'roc': lambda m, p: roc(m['close'], p['length']),
+    'zscore': lambda m, p: zscore(m['close'], p['length']),
+    'bollinger_bands': lambda m, p: bbands(m['close'], p['length'], p['stddev']),
+    'atr': lambda m, p: atr(m['high'], m['low'], m['close'], p['length']),
+    'macd': lambda m, p: macd(m['close'], p['fast_period'], p['slow_period'], p['signal_period']),
+}
+
+BATCH_COLUMNS = {
+    'atr': ('high', 'low', 'close'),
+}
+
+
+def calculate_batch(indicator_name, frames, line=None, parameters=None):
+    """
+    Computes one indicator config over many frames in a single vectorized pass.
+
+    Args:
+        indicator_name (str): Name of the indicator to calculate.
+        frames (list): OHLCV DataFrames, typically one per symbol.
+        line (str): Specific line of the indicator to return, if applicable.
+        parameters (dict): Parameters for the indicator.
+
+    Returns:
+        np.ndarray: The last value of the requested line for each frame.
+    """
+    spec = get_indicator_spec(indicator_name)
+    kernel = BATCH_INDICATORS.get(spec.name)
+    if kernel is None:
+        raise ValueError(f"Indicator '{indicator_name}' has no vectorized implementation.")
+    params = spec.coerce_parameters(parameters or {})
+    matrices = {column: stack_frames(frames, column) for column in BATCH_COLUMNS.get(spec.name, ('close',))}
+    result = kernel(matrices, params)
+
+    if isinstance(result, dict):
+        # Map line names to result columns so line aliases and defaults behave like the full computation
+        by_column = {spec.lines[name].format(**params): values for name, values in result.items()}
+        result = by_column[spec.resolve_column(line.lower() if line else None, params)]
+    return result[:, -1]
+
+
+class SharedIndicatorBatch:
+    """
+    Collects the indicator evaluations of one scheduler run and computes configs shared by many symbols
+    with calculate_batch, storing the values in the run's IndicatorResultCache.
+
+    Stored values take precedence over the streaming engine, which would otherwise advance one state per
+    symbol for the same config.
+    """
+
+    def __init__(self, min_symbols=BATCH_MIN_SYMBOLS):
+        self.min_symbols = min_symbols
+        self._groups = {}  # (timeframe, indicator, parameters) -> {(symbol, last bar, bar count): (symbol, df, lines)}
+
+    def add(self, symbol, timeframe, indicator_name, df, line=None, parameters=None):
+        spec = get_indicator_spec(indicator_name)
+        if spec.name not in BATCH_INDICATORS or df is None or df.empty:
+            return
+        params = spec.coerce_parameters(parameters or {})
+        try:
+            spec.check_frame(df, params)
+        except ValueError:
+            # Left to the per-alert path, which reports the error
+            return
+        group = self._groups.setdefault((timeframe, spec.name, tuple(sorted(params.items()))), {})
+        _, _, lines = group.setdefault((symbol, df.index[-1], len(df)), (symbol, df, set()))
+        lines.add(line)
+
+    def run(self, indicator_results):
+        """
+        Computes every group shared by at least `min_symbols` symbols.
+
+        Returns:
+            int: Number of values stored in `indicator_results`.
+        """
+        stored = 0
+        for (timeframe, name, params), rows in self._groups.items():
+            if len({symbol for symbol, _, _ in rows}) < self.min_symbols:
+                continue
+            rows = list(rows.values())
+            frames = [df for _, df, _ in rows]
+            for line in set().union(*(lines for _, _, lines in rows)):
+                values = calculate_batch(name, frames, line=line, parameters=dict(params))
+                for (symbol, df, lines), value in zip(rows, values):
+                    if line in lines:
+                        indicator_results.store_value(symbol, timeframe, name, df, line, dict(params), float(value))
+                        stored += 1
+        return stored
@@ -66,9 +66,65 @@ CELERY_BEAT_SCHEDULE = {
     'process-alerts-every-minute': {
         'task': 'alerts.tasks.process_alerts',
         'schedule': 60.0,  # Seconds
+        # Drop dispatches still queued when the next one is due instead of stacking them
+        'options': {'expires': 55},
     },
 }
 CELERY_LOG_LEVEL = 'DEBUG'
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default=CELERY_BROKER_URL)
+CELERY_RESULT_EXPIRES = 3600  # Seconds
+
+# process_alerts dispatches due alerts to this many evaluation tasks, partitioned by symbol hash
+ALERT_SHARD_COUNT = config('ALERT_SHARD_COUNT', default=8, cast=int)
+# Collect shard totals through a chord (needs CELERY_RESULT_BACKEND)
+ALERT_SHARD_USE_CHORD = config('ALERT_SHARD_USE_CHORD', default=True, cast=bool)
+
+# Redis leases keeping scheduler runs and shards from overlapping (alerts.leases)
+ALERT_LEASE_REDIS_URL = config('ALERT_LEASE_REDIS_URL', default=CELERY_BROKER_URL)
+# Connect and read timeout of the lease Redis calls; a stalled Redis grants the lease (fail open)
+ALERT_LEASE_REDIS_TIMEOUT = config('ALERT_LEASE_REDIS_TIMEOUT', default=1.0, cast=float)  # Seconds
+ALERT_RUN_LEASE_TTL = config('ALERT_RUN_LEASE_TTL', default=300, cast=int)  # Seconds
+ALERT_SHARD_LEASE_TTL = config('ALERT_SHARD_LEASE_TTL', default=300, cast=int)  # Seconds
+# 'skip' drops a run or shard whose predecessor still holds the lease, 'queue' retries it for a while
+ALERT_RUN_OVERLAP_POLICY = config('ALERT_RUN_OVERLAP_POLICY', default='skip')
+ALERT_RUN_QUEUE_RETRY_DELAY = config('ALERT_RUN_QUEUE_RETRY_DELAY', default=5, cast=int)  # Seconds
+ALERT_RUN_QUEUE_MAX_WAIT = config('ALERT_RUN_QUEUE_MAX_WAIT', default=60, cast=int)  # Seconds
+ALERT_RUN_LATE_AFTER = config('ALERT_RUN_LATE_AFTER', default=60, cast=int)  # Seconds
+
+# Concurrent market data downloads (alerts.fetcher)
+ALERT_FETCH_CONCURRENCY = config('ALERT_FETCH_CONCURRENCY', default=8, cast=int)
+ALERT_FETCH_TIMEOUT = config('ALERT_FETCH_TIMEOUT', default=20, cast=float)  # Seconds per attempt
+# Cache misses sharing an interval and period are downloaded together, this many tickers per request
+ALERT_FETCH_BATCH_SIZE = config('ALERT_FETCH_BATCH_SIZE', default=50, cast=int)
+ALERT_FETCH_BATCH_TIMEOUT = config('ALERT_FETCH_BATCH_TIMEOUT', default=60, cast=float)  # Seconds per attempt
+ALERT_FETCH_RETRIES = config('ALERT_FETCH_RETRIES', default=2, cast=int)
+ALERT_FETCH_RETRY_BACKOFF = config('ALERT_FETCH_RETRY_BACKOFF', default=1.0, cast=float)  # Seconds, doubled per retry
+# Downloads per second across every worker (Redis token bucket, alerts.governor), 0 = unlimited
+ALERT_FETCH_RATE_LIMIT = config('ALERT_FETCH_RATE_LIMIT', default=5.0, cast=float)
+# Pacing backs off while more than this share of recent downloads fail or come back empty
+ALERT_FETCH_MAX_FAILURE_RATE = config('ALERT_FETCH_MAX_FAILURE_RATE', default=0.2, cast=float)
+ALERT_FETCH_GOVERNOR_WINDOW = config('ALERT_FETCH_GOVERNOR_WINDOW', default=20, cast=int)  # Downloads per adjustment
+ALERT_FETCH_MIN_RATE = config('ALERT_FETCH_MIN_RATE', default=0.5, cast=float)  # Downloads per second
+# Downloads waiting longer for the rate limit are deferred, their alerts stay due for the next run
+ALERT_FETCH_MAX_WAIT = config('ALERT_FETCH_MAX_WAIT', default=30, cast=float)  # Seconds
+# Redis lease held while one process downloads a key the others wait for (alerts.singleflight); it is extended
+# while the download runs, so this only bounds how long a crashed holder blocks the key
+ALERT_FETCH_LOCK_TTL = config('ALERT_FETCH_LOCK_TTL', default=30, cast=int)  # Seconds
+# Alerts are only checked while their market trades (alerts.calendars); off checks every asset type 24/7
+ALERT_MARKET_HOURS_ENABLED = config('ALERT_MARKET_HOURS_ENABLED', default=True, cast=bool)
+
+# Source of OHLCV bars (alerts.providers): 'yfinance', 'local' or the dotted path of a MarketDataProvider
+MARKET_DATA_PROVIDER = config('MARKET_DATA_PROVIDER', default='yfinance')
+# 'local' provider: CSV/Parquet fixtures per symbol, synthetic GBM bars for symbols without one
+MARKET_DATA_LOCAL_ROOT = config('MARKET_DATA_LOCAL_ROOT', default=None)
+MARKET_DATA_LOCAL_SEED = config('MARKET_DATA_LOCAL_SEED', default=0, cast=int)
+
+# Shared OHLCV bar cache (alerts.cache), in-process LRU backed by Redis
+BAR_CACHE_REDIS_URL = config('BAR_CACHE_REDIS_URL', default=CELERY_BROKER_URL)
+BAR_CACHE_MAX_BYTES = config('BAR_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+BAR_CACHE_MAX_TTL = config('BAR_CACHE_MAX_TTL', default=60, cast=int)  # Seconds
+# Connect and read timeout of the bar cache's Redis calls; a stalled Redis counts as a cache miss
+BAR_CACHE_REDIS_TIMEOUT = config('BAR_CACHE_REDIS_TIMEOUT', default=0.5, cast=float)  # Seconds
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -77,6 +133,19 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Load environment variables from .env file
 load_dotenv(os.path.join(BASE_DIR, '.env'))
 
+# On-disk OHLCV history (alerts.bar_store), refreshed incrementally
+BAR_STORE_ENABLED = config('BAR_STORE_ENABLED', default=True, cast=bool)
+BAR_STORE_ROOT = config('BAR_STORE_ROOT', default=os.path.join(BASE_DIR, 'bar_store'))
+BAR_STORE_MAX_BARS = config('BAR_STORE_MAX_BARS', default=200000, cast=int)  # Per (symbol, interval)
+# Bars a stored series may lag behind when a refresh returns nothing before it is no longer served
+BAR_STORE_STALE_AFTER_BARS = config('BAR_STORE_STALE_AFTER_BARS', default=3, cast=int)
+
+# Incremental indicator state kept between alert runs (alerts.streaming)
+STREAMING_INDICATORS_ENABLED = config('STREAMING_INDICATORS_ENABLED', default=True, cast=bool)
+
+# NumPy computation of the most used indicators' last value (alerts.fastpath) instead of pandas_ta
+FAST_INDICATORS_ENABLED = config('FAST_INDICATORS_ENABLED', default=True, cast=bool)
+
 # Twilio Credentials
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')